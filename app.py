@@ -3,6 +3,7 @@ import os
 from datetime import datetime
 from tkinter import filedialog, messagebox
 import logging
+import multiprocessing
 
 # Third-party biblioteker
 import customtkinter as ctk
@@ -15,6 +16,10 @@ from kpi_view import KPIWindow
 from driver_view import DriverWindow
 from settings_view import SettingsWindow
 from logging_config import setup_logging
+from maanedsskema import migrer_alle_maanedsdatabaser
+from noegletal_lager import genberegn_noegletal
+from indstillinger import hent_indstillinger
+from mail_system import hent_mail_forbruger
 
 class ModernRIOMenu:
     def __init__(self):
@@ -387,11 +392,28 @@ class ModernRIOMenu:
             messagebox.showerror("Fatal Fejl", f"Applikationen kunne ikke starte: {str(e)}")
 
 if __name__ == "__main__":
+    # Nødvendig for procespuljen i rapportgenereringen når appen er pakket med PyInstaller
+    multiprocessing.freeze_support()
     try:
         # Initialiser logging
         setup_logging()
         logging.info("=== Applikation starter ===")
         
+        # Konverter ældre månedsdatabaser til det typede skema
+        migrer_alle_maanedsdatabaser()
+        
+        # Indlæs indstillingerne én gang; vinduerne læser dem derefter fra hukommelsen
+        hent_indstillinger().genindlaes()
+        
+        # Opdater gemte nøgletal der mangler eller er beregnet med en ældre formel (i baggrunden)
+        genberegn_noegletal()
+        
+        # Genoptag mails der stadig ligger i udbakken efter sidste kørsel
+        try:
+            hent_mail_forbruger()
+        except Exception as e:
+            logging.error(f"Kunne ikke starte mail udbakken: {str(e)}")
+        
         app = ModernRIOMenu()
         app.run()
         
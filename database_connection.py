@@ -1,7 +1,16 @@
 import sqlite3
 import logging
 import os
+import threading
 from datetime import datetime
+from forbindelser import hent_fra_pulje, aflever_til_pulje
+
+# Skemaversionen gemmes i schema_version tabellen; hæv den når en ny migration tilføjes
+SKEMA_VERSION = 1
+
+# Databaser der allerede er migreret i denne proces (absolutte stier)
+_migrerede_databaser = set()
+_migrering_lock = threading.Lock()
 
 class DatabaseConnection:
     def __init__(self, db_path='databases/settings.db'):
@@ -21,27 +30,67 @@ class DatabaseConnection:
         # Sikrer at databases mappe eksisterer
         os.makedirs('databases', exist_ok=True)
         
-        # Initialiserer database og tabeller først
-        self._initialize_database()
-        
-        # Opret forbindelsen
-        self.connection = sqlite3.connect(self.db_path)
+        # Hent en forbindelse fra trådens pulje
+        self.connection = hent_fra_pulje(self.db_path)
         self.connection.row_factory = sqlite3.Row  # Så vi kan referere til kolonnenavne
         
-        # Udfør migrationer og initialiseringer
-        self.migrate()
+        # Skemaopsætning og migrationer køres kun første gang databasen åbnes i processen
+        self._sikr_skema()
+
+    def _sikr_skema(self):
+        """Kører skemaopsætning og migrationer én gang pr. databasefil pr. proces"""
+        noegle = os.path.abspath(self.db_path)
+        if noegle in _migrerede_databaser:
+            return
         
-        # Sikrer at standardtemplate og andre standarddata findes
+        with _migrering_lock:
+            if noegle in _migrerede_databaser:
+                return
+            
+            version = self._hent_skema_version()
+            if version < SKEMA_VERSION:
+                logging.info(f"Migrerer {self.db_path} fra skemaversion {version} til {SKEMA_VERSION}")
+                # Initialiserer database og tabeller først
+                self._initialize_database()
+                # Udfør migrationer
+                self.migrate()
+                self._gem_skema_version(SKEMA_VERSION)
+            
+            # Sikrer at standardtemplate og andre standarddata findes
+            try:
+                # # DEBUG: Kører datainitialiseringer
+                logging.info("Kører standarddata initialiseringer")
+                self.ensure_default_mail_template()
+                # # DEBUG: Standarddata initialiseringer fuldført
+                logging.info("Standarddata initialiseringer fuldført")
+            except Exception as e:
+                # # DEBUG: Fejl ved standarddata initialisering
+                logging.error(f"Fejl ved standarddata initialisering: {str(e)}")
+                # Vi fortsætter selv ved fejl, da dette ikke er kritisk
+            
+            _migrerede_databaser.add(noegle)
+
+    def _hent_skema_version(self):
+        """Henter databasens skemaversion (0 hvis den aldrig er migreret)"""
         try:
-            # # DEBUG: Kører datainitialiseringer
-            logging.info("Kører standarddata initialiseringer")
-            self.ensure_default_mail_template()
-            # # DEBUG: Standarddata initialiseringer fuldført
-            logging.info("Standarddata initialiseringer fuldført")
-        except Exception as e:
-            # # DEBUG: Fejl ved standarddata initialisering
-            logging.error(f"Fejl ved standarddata initialisering: {str(e)}")
-            # Vi fortsætter selv ved fejl, da dette ikke er kritisk
+            result = self.connection.execute('SELECT version FROM schema_version WHERE id = 1').fetchone()
+            return result[0] if result else 0
+        except sqlite3.OperationalError:
+            return 0
+
+    def _gem_skema_version(self, version):
+        """Gemmer databasens skemaversion"""
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS schema_version(
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''')
+        self.connection.execute('''
+            INSERT OR REPLACE INTO schema_version (id, version, updated_at)
+            VALUES (1, ?, ?)
+        ''', (version, datetime.now().isoformat()))
+        self.connection.commit()
+        logging.info(f"Skemaversion for {self.db_path} sat til {version}")
 
     @property
     def cursor(self):
@@ -62,15 +111,19 @@ class DatabaseConnection:
                 # Der opstod en fejl, rollback ændringer
                 self.connection.rollback()
         finally:
-            # Luk forbindelsen under alle omstændigheder
-            self.connection.close()
+            # Aflever forbindelsen under alle omstændigheder
+            self.close()
 
     def close(self):
-        """Lukker database forbindelsen"""
+        """Afleverer database forbindelsen til puljen"""
+        if self.connection is None:
+            return
         try:
-            self.connection.close()
+            aflever_til_pulje(self.db_path, self.connection)
         except Exception as e:
             logging.error(f"Fejl ved lukning af database forbindelse: {str(e)}")
+        finally:
+            self.connection = None
 
     def _initialize_database(self):
         """Sikrer korrekt databaseopsætning med fejlsikker migration"""
@@ -0,0 +1,406 @@
+# Import nødvendige biblioteker
+import os
+import sqlite3
+import logging
+from forbindelser import laese_forbindelse
+
+# Samlet database med alle uploadede måneder
+VAREHUS_STI = os.path.join('databases', 'datavarehus.db')
+VAREHUS_TABEL = 'chauffør_data'
+
+# Chaufførregister med kørte km pr. chauffør og periode
+REGISTER_TABEL = 'chauffoer_register'
+
+# Præfiks og tabelnavn for de månedlige chauffør databaser
+MAANEDS_PRAEFIKS = 'chauffør_data_'
+MAANEDS_TABEL = 'chauffør_data_data'
+
+# Dansk måned til nummer konvertering
+MAANEDER = {
+    'januar': 1, 'februar': 2, 'marts': 3, 'april': 4,
+    'maj': 5, 'juni': 6, 'juli': 7, 'august': 8,
+    'september': 9, 'oktober': 10, 'november': 11, 'december': 12
+}
+MAANEDER_REVERSE = {v: k for k, v in MAANEDER.items()}
+
+# Den uønskede "chauffør" række som RIO eksporten indeholder
+EXCLUDE_TEXT = "Bemærk venligst, at en præstationsanalyse"
+
+
+def periode_fra_filnavn(filnavn):
+    """
+    Udtrækker periode fra et månedligt databasenavn (chauffør_data_januar_2024.db)
+
+    Returns:
+        tuple: (periode, aar, maaned) hvor periode er aar * 100 + maaned, eller None
+    """
+    parts = os.path.basename(filnavn).replace('.db', '').split('_')
+    if len(parts) < 4:
+        return None
+    maaned = MAANEDER.get(parts[2].lower())
+    if not maaned or not parts[3].isdigit():
+        return None
+    aar = int(parts[3])
+    return aar * 100 + maaned, aar, maaned
+
+
+def periode_tekst(periode):
+    """Returnerer en periode som læsbar tekst, f.eks. 'Januar 2024'"""
+    return f"{MAANEDER_REVERSE[periode % 100].capitalize()} {periode // 100}"
+
+
+def forrige_periode(periode, antal=1):
+    """Returnerer perioden et givet antal måneder før den angivne periode"""
+    maaneder_total = (periode // 100) * 12 + (periode % 100 - 1) - antal
+    return (maaneder_total // 12) * 100 + maaneder_total % 12 + 1
+
+
+class Datavarehus:
+    """
+    Samlet database med alle måneders chauffør data i én indekseret tabel.
+
+    Hver række har en periode kolonne (aar * 100 + maaned), så spørgsmål på tværs
+    af måneder besvares med én forespørgsel i stedet for at åbne hver månedsfil.
+    Varehuset fyldes ved upload og synkroniseres mod de månedlige filer ved behov.
+    """
+
+    def __init__(self, sti=VAREHUS_STI, database_mappe='databases'):
+        self.sti = sti
+        self.database_mappe = database_mappe
+        self._skema_klar = False
+        # Chaufførregistret holdes i hukommelsen efter første opslag (se hent_register)
+        self._register = None
+
+    def _forbind(self):
+        """Opretter forbindelse til varehuset og sikrer at skemaet findes"""
+        os.makedirs(os.path.dirname(self.sti) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.sti)
+        if not self._skema_klar:
+            self._opret_skema(conn)
+            self._skema_klar = True
+        return conn
+
+    def _laes(self):
+        """
+        Returnerer trådens cachede skrivebeskyttede forbindelse til varehuset
+
+        Varehuset skrives af upload og synkronisering mens det læses.
+        Forbindelsen må ikke lukkes af kalderen.
+        """
+        if not self._skema_klar:
+            self._forbind().close()
+        return laese_forbindelse(self.sti)
+
+    def _opret_skema(self, conn):
+        """Opretter varehusets tabeller og indekser hvis de ikke eksisterer"""
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS "{VAREHUS_TABEL}" (
+                periode INTEGER NOT NULL,
+                aar INTEGER NOT NULL,
+                maaned INTEGER NOT NULL,
+                "Chauffør" TEXT,
+                "Kørestrækning [km]" REAL
+            )
+        ''')
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_varehus_chauffoer_periode
+            ON "{VAREHUS_TABEL}" ("Chauffør", periode)
+        ''')
+        cursor.execute(f'''
+            CREATE INDEX IF NOT EXISTS idx_varehus_periode_km
+            ON "{VAREHUS_TABEL}" (periode, "Kørestrækning [km]")
+        ''')
+        # Holder styr på hvilke månedsfiler der er indlæst og deres ændringstidspunkt
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS perioder (
+                periode INTEGER PRIMARY KEY,
+                aar INTEGER NOT NULL,
+                maaned INTEGER NOT NULL,
+                kilde_sti TEXT NOT NULL,
+                kilde_mtime REAL NOT NULL,
+                antal_raekker INTEGER DEFAULT 0,
+                indlaest TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        # Chaufførregister: én række pr. chauffør og periode med samlet og største række-km
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS "{REGISTER_TABEL}" (
+                "Chauffør" TEXT NOT NULL,
+                periode INTEGER NOT NULL,
+                km REAL,
+                max_km REAL,
+                PRIMARY KEY ("Chauffør", periode)
+            )
+        ''')
+        conn.commit()
+
+        # Byg registret for perioder indlæst før registret fandtes
+        mangler = conn.execute(f'''
+            SELECT periode FROM perioder
+            WHERE periode NOT IN (SELECT DISTINCT periode FROM "{REGISTER_TABEL}")
+        ''').fetchall()
+        if mangler:
+            with conn:
+                for (periode,) in mangler:
+                    self._opdater_register(conn, periode)
+            logging.info(f"Chaufførregister bygget for {len(mangler)} perioder")
+
+    def _opdater_register(self, conn, periode):
+        """Genopbygger registrets rækker for en periode ud fra varehuset (kaldes i en transaktion)"""
+        conn.execute(f'DELETE FROM "{REGISTER_TABEL}" WHERE periode = ?', (periode,))
+        conn.execute(f'''
+            INSERT INTO "{REGISTER_TABEL}" ("Chauffør", periode, km, max_km)
+            SELECT "Chauffør", periode, SUM("Kørestrækning [km]"), MAX("Kørestrækning [km]")
+            FROM "{VAREHUS_TABEL}"
+            WHERE periode = ? AND "Chauffør" IS NOT NULL AND "Chauffør" NOT LIKE ?
+            GROUP BY "Chauffør"
+        ''', (periode, EXCLUDE_TEXT + '%'))
+        self._register = None
+
+    def _kolonner(self, conn, tabel, skema='main'):
+        """Returnerer kolonnenavne for en tabel i rækkefølge"""
+        cursor = conn.execute(f'PRAGMA {skema}.table_info("{tabel}")')
+        return [row[1] for row in cursor.fetchall()]
+
+    def indlaes_maanedsfil(self, db_sti, conn=None):
+        """
+        Indlæser (eller genindlæser) en månedlig database i varehuset
+
+        Args:
+            db_sti: Sti til den månedlige database
+            conn: Eksisterende varehus forbindelse (valgfri)
+
+        Returns:
+            int: Antal indlæste rækker
+        """
+        periode_info = periode_fra_filnavn(db_sti)
+        if not periode_info:
+            raise ValueError(f"Kan ikke udlede periode fra filnavn: {db_sti}")
+        periode, aar, maaned = periode_info
+
+        egen_forbindelse = conn is None
+        if egen_forbindelse:
+            conn = self._forbind()
+
+        try:
+            conn.execute('ATTACH DATABASE ? AS kilde', (db_sti,))
+            try:
+                kilde_kolonner = self._kolonner(conn, MAANEDS_TABEL, 'kilde')
+                if not kilde_kolonner:
+                    logging.warning(f"Ingen {MAANEDS_TABEL} tabel i {db_sti}")
+                    return 0
+
+                # Tilføj nye kolonner fra RIO eksporten til varehuset
+                varehus_kolonner = set(self._kolonner(conn, VAREHUS_TABEL))
+                for kolonne in kilde_kolonner:
+                    if kolonne not in varehus_kolonner:
+                        conn.execute(f'ALTER TABLE "{VAREHUS_TABEL}" ADD COLUMN "{kolonne}"')
+
+                kolonne_liste = ', '.join(f'"{k}"' for k in kilde_kolonner)
+                with conn:
+                    conn.execute(f'DELETE FROM "{VAREHUS_TABEL}" WHERE periode = ?', (periode,))
+                    cursor = conn.execute(f'''
+                        INSERT INTO "{VAREHUS_TABEL}" (periode, aar, maaned, {kolonne_liste})
+                        SELECT ?, ?, ?, {kolonne_liste} FROM kilde."{MAANEDS_TABEL}"
+                    ''', (periode, aar, maaned))
+                    antal = cursor.rowcount
+                    self._opdater_register(conn, periode)
+                    conn.execute('''
+                        INSERT OR REPLACE INTO perioder
+                        (periode, aar, maaned, kilde_sti, kilde_mtime, antal_raekker)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', (periode, aar, maaned, os.path.normpath(db_sti),
+                          os.path.getmtime(db_sti), antal))
+
+                logging.info(f"Indlæst {antal} rækker fra {db_sti} i datavarehus ({periode})")
+                return antal
+            finally:
+                conn.execute('DETACH DATABASE kilde')
+        finally:
+            if egen_forbindelse:
+                conn.close()
+
+    def synkroniser(self):
+        """
+        Sikrer at varehuset svarer til de månedlige databaser på disken.
+
+        Nye eller ændrede månedsfiler indlæses, og perioder hvis fil er fjernet slettes.
+        Uændrede filer koster kun et os.stat kald.
+        """
+        if not os.path.exists(self.database_mappe):
+            return
+
+        conn = self._forbind()
+        try:
+            kendte = {
+                row[0]: (row[1], row[2])
+                for row in conn.execute('SELECT periode, kilde_sti, kilde_mtime FROM perioder')
+            }
+
+            fundne = set()
+            for fil in os.listdir(self.database_mappe):
+                if not (fil.startswith(MAANEDS_PRAEFIKS) and fil.endswith('.db')):
+                    continue
+                periode_info = periode_fra_filnavn(fil)
+                if not periode_info:
+                    continue
+                periode = periode_info[0]
+                db_sti = os.path.join(self.database_mappe, fil)
+                fundne.add(periode)
+
+                kendt = kendte.get(periode)
+                if kendt and kendt[0] == os.path.normpath(db_sti) and kendt[1] == os.path.getmtime(db_sti):
+                    continue
+                try:
+                    self.indlaes_maanedsfil(db_sti, conn)
+                except Exception as e:
+                    logging.error(f"Fejl ved indlæsning af {fil} i datavarehus: {str(e)}")
+
+            # Fjern perioder hvis månedsfil ikke længere findes
+            fjernede = set(kendte) - fundne
+            if fjernede:
+                with conn:
+                    for periode in fjernede:
+                        conn.execute(f'DELETE FROM "{VAREHUS_TABEL}" WHERE periode = ?', (periode,))
+                        conn.execute('DELETE FROM perioder WHERE periode = ?', (periode,))
+                        conn.execute(f'DELETE FROM "{REGISTER_TABEL}" WHERE periode = ?', (periode,))
+                self._register = None
+                logging.info(f"Fjernet {len(fjernede)} perioder uden månedsfil fra datavarehus")
+        finally:
+            conn.close()
+
+    def hent_perioder(self):
+        """
+        Henter alle indlæste perioder, nyeste først
+
+        Returns:
+            list: Dicts med path, month, year, month_num, periode og display_date
+        """
+        conn = self._laes()
+        cursor = conn.execute('''
+            SELECT periode, aar, maaned, kilde_sti FROM perioder
+            ORDER BY periode DESC
+        ''')
+        return [{
+            'path': kilde_sti,
+            'month': MAANEDER_REVERSE[maaned],
+            'year': aar,
+            'month_num': maaned,
+            'periode': periode,
+            'display_date': periode_tekst(periode)
+        } for periode, aar, maaned, kilde_sti in cursor.fetchall()]
+
+    def hent_register(self):
+        """
+        Henter chaufførregistret; indlæses med én forespørgsel og holdes derefter i hukommelsen
+
+        Returns:
+            dict: {chauffør: {'foerste': periode, 'sidste': periode,
+                              'perioder': {periode: (km, max_km)}}}
+        """
+        if self._register is not None:
+            return self._register
+
+        conn = self._laes()
+        register = {}
+        for chauffoer, periode, km, max_km in conn.execute(f'''
+            SELECT "Chauffør", periode, km, max_km FROM "{REGISTER_TABEL}"
+            ORDER BY "Chauffør", periode
+        '''):
+            post = register.get(chauffoer)
+            if post is None:
+                post = register[chauffoer] = {'foerste': periode, 'sidste': periode, 'perioder': {}}
+            post['sidste'] = periode
+            post['perioder'][periode] = (km, max_km)
+
+        self._register = register
+        logging.info(f"Chaufførregister indlæst med {len(register)} chauffører")
+        return register
+
+    def hent_chauffoerer(self, min_km=None, periode=None):
+        """
+        Henter unikke chauffører fra registret, evt. begrænset til en periode
+
+        Args:
+            min_km: Kræv mindst én række med denne kørestrækning (None giver alle chauffører)
+            periode: Kun chauffører med data i denne periode
+
+        Returns:
+            list: Sorteret liste af chauffør navne
+        """
+        resultat = []
+        for chauffoer, post in self.hent_register().items():
+            perioder = post['perioder']
+            if periode is not None:
+                perioder = {periode: perioder[periode]} if periode in perioder else {}
+            if not perioder:
+                continue
+            if min_km is None or any(max_km is not None and max_km >= min_km
+                                     for _, max_km in perioder.values()):
+                resultat.append(chauffoer)
+        return sorted(resultat)
+
+    def hent_chauffoer_historik(self, chauffoer, min_km):
+        """
+        Henter alle måneders rækker for en chauffør i kronologisk rækkefølge
+
+        Returns:
+            tuple: (kolonner, rækker) med de originale RIO kolonner
+        """
+        conn = self._laes()
+        kolonner = [k for k in self._kolonner(conn, VAREHUS_TABEL)
+                    if k not in ('periode', 'aar', 'maaned')]
+        kolonne_liste = ', '.join(f'"{k}"' for k in kolonner)
+        cursor = conn.execute(f'''
+            SELECT {kolonne_liste} FROM "{VAREHUS_TABEL}"
+            WHERE "Chauffør" = ? AND "Kørestrækning [km]" >= ?
+            ORDER BY periode, rowid
+        ''', (chauffoer, min_km))
+        return kolonner, cursor.fetchall()
+
+    def hent_tidligere_raekker(self, periode, max_maaneder_tilbage=12):
+        """
+        Finder alle chaufførers seneste række før den angivne periode med én forespørgsel
+
+        Returns:
+            dict: {chauffør: (data_dict, periode)}
+        """
+        conn = self._laes()
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row
+        # Vælg den nyeste række pr. chauffør i SQL, så kun de rækker der bruges bygges i Python
+        cursor.execute(f'''
+            SELECT * FROM "{VAREHUS_TABEL}"
+            WHERE rowid IN (
+                SELECT rowid FROM (
+                    SELECT rowid, ROW_NUMBER() OVER (
+                        PARTITION BY "Chauffør" ORDER BY periode DESC, rowid DESC
+                    ) AS nummer
+                    FROM "{VAREHUS_TABEL}"
+                    WHERE periode < ? AND periode >= ? AND "Chauffør" IS NOT NULL
+                )
+                WHERE nummer = 1
+            )
+        ''', (periode, forrige_periode(periode, max_maaneder_tilbage)))
+        resultat = {}
+        for row in cursor:
+            data = dict(row)
+            resultat[data['Chauffør']] = (data, data['periode'])
+        return resultat
+
+
+# Delt instans for hele applikationen
+_varehus = None
+
+
+def hent_varehus():
+    """Returnerer den delte varehus instans og synkroniserer den første gang"""
+    global _varehus
+    if _varehus is None:
+        _varehus = Datavarehus()
+        try:
+            _varehus.synkroniser()
+        except Exception as e:
+            logging.error(f"Fejl ved synkronisering af datavarehus: {str(e)}")
+    return _varehus
@@ -2,8 +2,8 @@ import customtkinter as ctk
 from tkinter import messagebox
 import logging
 import re
-import os
 from database_connection import DatabaseConnection
+from datavarehus import hent_varehus
 import sqlite3
 import tkinter as tk
 
@@ -407,40 +407,10 @@ class DriverMailList:
             self.window.destroy()
         
     def get_all_drivers(self):
-        """Henter alle unikke chauffører fra chauffør databaserne"""
+        """Henter alle unikke chauffører fra chaufførregistret i datavarehuset"""
         try:
-            available_drivers = set()
-            
-            # Find alle chauffør databaser og prøv alternative tabelnavne
-            for file in os.listdir('databases'):
-                # Matcher databaser med prefixet 'chauffør_data_' og endelsen '.db'
-                if file.startswith('chauffør_data_') and file.endswith('.db'):
-                    db_path = os.path.join('databases', file)
-                    try:
-                        with sqlite3.connect(db_path) as conn:
-                            cursor = conn.cursor()
-                            # Prøv alternative tabelnavne
-                            tabel_navne = ['chauffør_data_data', 'chaufførdata', 'chauffør_data']
-                            found = False
-                            for tabel in tabel_navne:
-                                try:
-                                    cursor.execute(f'SELECT DISTINCT Chauffør FROM {tabel}')
-                                    rows = cursor.fetchall()
-                                    if rows:
-                                        for row in rows:
-                                            # Tjekker at værdien ikke er tom og ikke starter med "Bemærk venligst"
-                                            if row[0] and not row[0].startswith("Bemærk venligst"):
-                                                available_drivers.add(row[0])
-                                        found = True
-                                        break  # Afslut forsøget for denne database, når en tabel lykkes
-                                except Exception as inner_e:
-                                    # Forsæt til næste tabelnavn hvis forespørgslen fejler
-                                    continue
-                    except Exception as e:
-                        logging.error(f"Fejl ved læsning af database {file}: {str(e)}")
-            
             # Returnér listen af chauffører som dictionaries med 'id' og 'name'
-            return [{'id': name, 'name': name} for name in sorted(available_drivers)]
+            return [{'id': name, 'name': name} for name in hent_varehus().hent_chauffoerer()]
             
         except Exception as e:
             logging.error(f"Fejl ved hentning af chauffører: {str(e)}")
@@ -1,9 +1,11 @@
 import customtkinter as ctk
-import sqlite3
 import os
 import pandas as pd
-from tkinter import messagebox, Canvas, Scrollbar
+from tkinter import messagebox, ttk
 from driver_mail_list import DriverMailList
+from datavarehus import hent_varehus, periode_fra_filnavn
+from indstillinger import hent_indstillinger
+from maanedsskema import er_varighed, sekunder_til_tid
 import logging
 
 class DriverWindow:
@@ -36,21 +38,18 @@ class DriverWindow:
         self.EXCLUDE_TEXT = "Bemærk venligst, at en præstationsanalyse kun kan tage hensyn til delvise aspekter vedrørende driftsmåden"
         
         # Hent minimum kilometer indstilling
-        self.min_km = self.get_min_km_setting()
+        self.min_km = hent_indstillinger().min_km
+        hent_indstillinger().abonner(self._indstillinger_aendret, noegler=('min_km',))
         
         self.setup_ui()
     
-    def get_min_km_setting(self):
-        """Henter minimum kilometer indstilling fra databasen"""
-        try:
-            conn = sqlite3.connect('databases/settings.db')
-            cursor = conn.cursor()
-            cursor.execute('SELECT value FROM settings WHERE key = "min_km"')
-            result = cursor.fetchone()
-            conn.close()
-            return float(result[0]) if result else 100.0
-        except:
-            return 100.0
+    def _indstillinger_aendret(self, aendringer):
+        """Opdaterer minimum kilometer og chaufførlisten når indstillingen ændres"""
+        self.min_km = aendringer['min_km']
+        self.subtitle.configure(
+            text=f"Vælg en chauffør for at se detaljeret information (Minimum {self.min_km} km kørt)"
+        )
+        self.filter_drivers(self.selected_database.get())
 
     def setup_ui(self):
         # Hovedcontainer
@@ -93,13 +92,13 @@ class DriverWindow:
         )
         title.pack(anchor="w")
         
-        subtitle = ctk.CTkLabel(
+        self.subtitle = ctk.CTkLabel(
             title_left,
             text=f"Vælg en chauffør for at se detaljeret information (Minimum {self.min_km} km kørt)",
             font=("Segoe UI", 14),
             text_color=self.colors["text_secondary"]
         )
-        subtitle.pack(pady=(5, 0), anchor="w")
+        self.subtitle.pack(pady=(5, 0), anchor="w")
         
         # Højre side med knapper
         button_frame = ctk.CTkFrame(title_frame, fg_color="transparent")
@@ -177,27 +176,12 @@ class DriverWindow:
         return sorted(databases, reverse=True)  # Nyeste først
 
     def get_unique_drivers(self):
-        if not os.path.exists('databases'):
+        try:
+            # Datavarehuset frasorterer selv bemærkningsrækken fra RIO eksporten
+            return hent_varehus().hent_chauffoerer(self.min_km)
+        except Exception as e:
+            print(f"Fejl ved læsning af datavarehus: {str(e)}")
             return []
-        
-        unique_drivers = set()
-        
-        for file in os.listdir('databases'):
-            if file.startswith('chauffør_data_') and file.endswith('.db'):
-                try:
-                    conn = sqlite3.connect(os.path.join('databases', file))
-                    query = f"SELECT DISTINCT Chauffør FROM chauffør_data_data WHERE \"Kørestrækning [km]\" >= {self.min_km}"
-                    df = pd.read_sql_query(query, conn)
-                    conn.close()
-                    
-                    for driver in df['Chauffør'].unique():
-                        if isinstance(driver, str) and not driver.startswith(self.EXCLUDE_TEXT):
-                            unique_drivers.add(driver)
-                            
-                except Exception as e:
-                    print(f"Fejl ved læsning af database {file}: {str(e)}")
-        
-        return sorted(list(unique_drivers))
 
     def filter_drivers(self, selected_period):
         # Ryd eksisterende chauffør knapper
@@ -218,21 +202,16 @@ class DriverWindow:
         self.create_driver_buttons(drivers)
 
     def get_drivers_from_database(self, db_name):
-        drivers = set()
+        drivers = []
         try:
-            conn = sqlite3.connect(os.path.join('databases', db_name))
-            query = f"SELECT DISTINCT Chauffør FROM chauffør_data_data WHERE \"Kørestrækning [km]\" >= {self.min_km}"
-            df = pd.read_sql_query(query, conn)
-            conn.close()
-            
-            for driver in df['Chauffør'].unique():
-                if isinstance(driver, str) and not driver.startswith(self.EXCLUDE_TEXT):
-                    drivers.add(driver)
+            periode_info = periode_fra_filnavn(db_name)
+            if periode_info:
+                drivers = hent_varehus().hent_chauffoerer(self.min_km, periode_info[0])
                     
         except Exception as e:
             print(f"Fejl ved læsning af database {db_name}: {str(e)}")
         
-        return sorted(list(drivers))
+        return drivers
 
     def create_driver_overview(self, parent):
         # Hent unikke chauffører
@@ -289,103 +268,135 @@ class DriverWindow:
             for widget in self.data_frame.winfo_children():
                 widget.destroy()
 
-            # Opret en liste til at gemme alle relevante data
-            all_data = []
-            
-            # Gennemgå alle databaser og find chaufførens data
-            for file in os.listdir('databases'):
-                if file.startswith('chauffør_data_') and file.endswith('.db'):
-                    conn = sqlite3.connect(os.path.join('databases', file))
-                    query = f"""
-                    SELECT * FROM chauffør_data_data 
-                    WHERE Chauffør = ? AND "Kørestrækning [km]" >= ?
-                    """
-                    df = pd.read_sql_query(query, conn, params=(driver_name, self.min_km))
-                    conn.close()
-                    
-                    if not df.empty:
-                        all_data.append(df)
+            # Hent chaufførens data for alle måneder med én forespørgsel
+            kolonner, raekker = hent_varehus().hent_chauffoer_historik(driver_name, self.min_km)
 
-            if not all_data:
-                self.data_label.configure(text="Ingen data fundet for denne chauffør")
+            if not raekker:
+                self.data_label = ctk.CTkLabel(
+                    self.data_frame,
+                    text="Ingen data fundet for denne chauffør",
+                    font=("Segoe UI", 14),
+                    text_color=self.colors["text_secondary"]
+                )
+                self.data_label.pack(pady=20)
                 return
 
-            # Kombiner alle dataframes
-            combined_df = pd.concat(all_data, ignore_index=True)
+            # Rådata bruges til sortering; den formaterede kopi til visning og filtrering
+            self._tabel_df = pd.DataFrame.from_records(raekker, columns=kolonner)
+            self._tabel_visning = self._formater_tabel(self._tabel_df)
+            self._tabel_sortering = None
 
-            # Opret canvas og scrollbars
-            canvas = Canvas(self.data_frame, bg=self.colors["card"], highlightthickness=0)
-            vsb = Scrollbar(self.data_frame, orient="vertical", command=canvas.yview)
-            hsb = Scrollbar(self.data_frame, orient="horizontal", command=canvas.xview)
-            
-            canvas.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+            # Filterfelt over tabellen
+            filter_frame = ctk.CTkFrame(self.data_frame, fg_color="transparent")
+            filter_frame.pack(fill="x", padx=10, pady=(10, 5))
+            self._tabel_filter = ctk.CTkEntry(
+                filter_frame,
+                placeholder_text="Filtrer rækker...",
+                width=300,
+                height=32
+            )
+            self._tabel_filter.pack(side="left")
+            self._tabel_filter.bind("<KeyRelease>", lambda event: self._udfyld_tabel())
 
-            # Tabel frame inde i canvas
-            table_frame = ctk.CTkFrame(canvas, fg_color=self.colors["card"])
-            
-            # Kolonne bredder
-            col_widths = {}
-            for col in combined_df.columns:
-                max_width = max(
-                    len(str(combined_df[col].max())),
-                    len(col),
-                    10
-                )
-                col_widths[col] = min(max_width * 10, 300)
-
-            # Opret headers
-            for col_idx, col_name in enumerate(combined_df.columns):
-                header = ctk.CTkButton(
-                    table_frame,
-                    text=col_name,
-                    font=("Segoe UI", 13, "bold"),
-                    text_color=self.colors["primary"],
-                    fg_color=self.colors["card"],
-                    hover=False,
-                    height=40,
-                    width=col_widths[col_name]
-                )
-                header.grid(row=0, column=col_idx, sticky="ew", padx=1, pady=1)
+            # Treeview tegner kun de synlige rækker, uanset hvor mange måneder chaufføren har
+            style = ttk.Style()
+            style.configure("Chauffoer.Treeview", font=("Segoe UI", 11), rowheight=30,
+                            background=self.colors["card"], fieldbackground=self.colors["card"],
+                            foreground=self.colors["text_primary"])
+            style.configure("Chauffoer.Treeview.Heading", font=("Segoe UI", 11, "bold"),
+                            foreground=self.colors["primary"])
+
+            tabel_frame = ctk.CTkFrame(self.data_frame, fg_color=self.colors["card"])
+            tabel_frame.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+
+            self._tabel = ttk.Treeview(
+                tabel_frame,
+                columns=list(range(len(kolonner))),
+                show="headings",
+                style="Chauffoer.Treeview"
+            )
+            vsb = ttk.Scrollbar(tabel_frame, orient="vertical", command=self._tabel.yview)
+            hsb = ttk.Scrollbar(tabel_frame, orient="horizontal", command=self._tabel.xview)
+            self._tabel.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+            self._tabel.tag_configure("ulige", background="#F8F9FA")
+
+            # Kolonne bredder ud fra længste formaterede værdi i hver kolonne
+            laengder = self._tabel_visning.apply(lambda kolonne: kolonne.str.len().max()).fillna(0)
+            overskrift_laengder = pd.Series([len(col) for col in kolonner], index=laengder.index)
+            bredder = (laengder.where(laengder > overskrift_laengder, overskrift_laengder)
+                       .clip(lower=10) * 10).clip(upper=300)
+            for col_idx, col_name in enumerate(kolonner):
+                self._tabel.heading(col_idx, text=col_name,
+                                    command=lambda c=col_idx: self._sorter_tabel(c))
+                self._tabel.column(col_idx, width=int(bredder.iloc[col_idx]), minwidth=60,
+                                   anchor="w", stretch=False)
 
-            # Tilføj data
-            for row_idx, row in combined_df.iterrows():
-                bg_color = self.colors["card"] if row_idx % 2 == 0 else "#F8F9FA"
-                
-                for col_idx, (col_name, value) in enumerate(row.items()):
-                    if isinstance(value, (int, float)):
-                        value = f"{value:,.2f}" if isinstance(value, float) else f"{value:,}"
-                    
-                    cell = ctk.CTkButton(
-                        table_frame,
-                        text=str(value),
-                        font=("Segoe UI", 12),
-                        text_color=self.colors["text_primary"],
-                        fg_color=bg_color,
-                        hover=False,
-                        height=35,
-                        width=col_widths[col_name]
-                    )
-                    cell.grid(row=row_idx+1, column=col_idx, sticky="ew", padx=1, pady=1)
-
-            # Pack scrollbars og canvas
             hsb.pack(side="bottom", fill="x")
             vsb.pack(side="right", fill="y")
-            canvas.pack(side="left", fill="both", expand=True)
+            self._tabel.pack(side="left", fill="both", expand=True)
 
-            # Tilføj tabel frame til canvas
-            canvas.create_window((0, 0), window=table_frame, anchor="nw")
-            
-            # Opdater scroll region
-            table_frame.update_idletasks()
-            canvas.configure(scrollregion=canvas.bbox("all"))
+            self._udfyld_tabel()
 
         except Exception as e:
             messagebox.showerror("Fejl", f"Kunne ikke indlæse chaufførdata: {str(e)}")
 
+    def _formater_tabel(self, df):
+        """Formaterer alle kolonner til visningstekst kolonnevis"""
+        visning = pd.DataFrame(index=df.index)
+        for col_name in df.columns:
+            kolonne = df[col_name]
+            if er_varighed(col_name):
+                visning[col_name] = kolonne.map(sekunder_til_tid)
+            elif pd.api.types.is_float_dtype(kolonne):
+                visning[col_name] = kolonne.map(lambda v: f"{v:,.2f}" if pd.notna(v) else "")
+            elif pd.api.types.is_integer_dtype(kolonne):
+                visning[col_name] = kolonne.map(lambda v: f"{v:,}")
+            else:
+                visning[col_name] = kolonne
+            visning[col_name] = visning[col_name].fillna("").astype(str)
+        return visning
+
+    def _udfyld_tabel(self):
+        """Indsætter de filtrerede rækker i den valgte sortering"""
+        visning = self._tabel_visning
+        soegning = self._tabel_filter.get().strip()
+        if soegning:
+            match = visning.apply(lambda kolonne: kolonne.str.contains(soegning, case=False, regex=False))
+            visning = visning[match.any(axis=1)]
+
+        if self._tabel_sortering is not None:
+            col_idx, stigende = self._tabel_sortering
+            raa = self._tabel_df.iloc[:, col_idx].loc[visning.index]
+            try:
+                orden = raa.sort_values(ascending=stigende, kind="mergesort", na_position="last").index
+            except TypeError:
+                # Blandede typer sorteres efter den viste tekst
+                orden = visning.iloc[:, col_idx].sort_values(ascending=stigende, kind="mergesort").index
+            visning = visning.loc[orden]
+
+        self._tabel.delete(*self._tabel.get_children())
+        for nr, vaerdier in enumerate(visning.itertuples(index=False, name=None)):
+            self._tabel.insert("", "end", values=vaerdier, tags=("ulige",) if nr % 2 else ())
+
+    def _sorter_tabel(self, col_idx):
+        """Sorterer efter kolonnen; et nyt klik på samme kolonne vender rækkefølgen"""
+        if self._tabel_sortering and self._tabel_sortering[0] == col_idx:
+            self._tabel_sortering = (col_idx, not self._tabel_sortering[1])
+        else:
+            self._tabel_sortering = (col_idx, True)
+
+        for idx, col_name in enumerate(self._tabel_df.columns):
+            pil = ""
+            if idx == col_idx:
+                pil = " ▲" if self._tabel_sortering[1] else " ▼"
+            self._tabel.heading(idx, text=f"{col_name}{pil}")
+        self._udfyld_tabel()
+
     def run(self):
         """Starter applikationen"""
         try:
             self.root.state("zoomed")
+            self.root.protocol("WM_DELETE_WINDOW", self.destroy)
             self.root.mainloop()
         except Exception as e:
             messagebox.showerror("Fejl", f"Kunne ikke starte chaufførvindue: {str(e)}")
@@ -393,6 +404,9 @@ class DriverWindow:
     def destroy(self):
         """Lukker vinduet og frigør ressourcer"""
         try:
+            # Afmeld indstillingerne så et lukket vindue ikke opdateres ved senere ændringer
+            hent_indstillinger().afmeld(self._indstillinger_aendret)
+            
             # Destroy alle child windows først
             for widget in self.root.winfo_children():
                 if isinstance(widget, ctk.CTkToplevel):
@@ -444,32 +458,14 @@ class DriverWindow:
     def get_all_drivers(self):
         """Henter alle chauffører fra databasen"""
         try:
-            # Hent alle unikke chauffører fra kørselsdata
-            drivers = []
-            for file in os.listdir('databases'):
-                if file.startswith('chauffør_data_') and file.endswith('.db'):
-                    try:
-                        conn = sqlite3.connect(os.path.join('databases', file))
-                        query = f"""
-                            SELECT DISTINCT Chauffør 
-                            FROM chauffør_data_data 
-                            WHERE "Kørestrækning [km]" >= {self.min_km}
-                            AND Chauffør NOT LIKE '%{self.EXCLUDE_TEXT}%'
-                        """
-                        df = pd.read_sql_query(query, conn)
-                        conn.close()
-                        
-                        for driver in df['Chauffør'].unique():
-                            if isinstance(driver, str):
-                                driver_dict = {
-                                    'id': driver,  # Brug chaufførens navn som ID
-                                    'name': driver
-                                }
-                                if driver_dict not in drivers:  # Undgå dubletter
-                                    drivers.append(driver_dict)
-                                    
-                    except Exception as e:
-                        logging.error(f"Fejl ved læsning af database {file}: {str(e)}")
+            # Hent alle unikke chauffører fra datavarehuset
+            drivers = [
+                {
+                    'id': driver,  # Brug chaufførens navn som ID
+                    'name': driver
+                }
+                for driver in hent_varehus().hent_chauffoerer(self.min_km)
+            ]
             
             return sorted(drivers, key=lambda x: x['name'])  # Sorter efter navn
                 
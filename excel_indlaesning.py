@@ -0,0 +1,252 @@
+import os
+import sqlite3
+import logging
+from datetime import datetime, date, time, timedelta
+from openpyxl import load_workbook
+import pandas as pd
+from datavarehus import EXCLUDE_TEXT
+from maanedsskema import SKEMA_VERSION, fast_kolonnetype, opret_indekser, sekunder_til_tid, tid_til_sekunder
+
+# Antal rækker der valideres og skrives pr. transaktion
+CHUNK_STOERRELSE = 500
+
+
+def _laes_raekker(excel_sti):
+    """Returnerer (forventet antal rækker, generator over rækker) for regnearket.
+    .xlsx læses streamende med openpyxl i read-only mode; gamle .xls læses via pandas."""
+    if excel_sti.lower().endswith('.xls'):
+        df = pd.read_excel(excel_sti, header=None)
+        raekker = (tuple(None if pd.isna(v) else v for v in raekke)
+                   for raekke in df.itertuples(index=False, name=None))
+        return len(df), raekker
+
+    wb = load_workbook(excel_sti, read_only=True, data_only=True)
+    ws = wb.active
+
+    def raekker():
+        try:
+            for raekke in ws.iter_rows(values_only=True):
+                yield raekke
+        finally:
+            wb.close()
+
+    return ws.max_row or 0, raekker()
+
+
+def _er_tal(vaerdi):
+    return isinstance(vaerdi, (int, float)) and not isinstance(vaerdi, bool)
+
+
+def unikke_kolonnenavne(kolonner):
+    """Omdøber gentagne kolonnenavne som pandas gjorde (X, X.1, X.2, ...).
+    SQLite skelner ikke mellem store og små bogstaver i kolonnenavne, så det gør vi heller ikke"""
+    brugte = set()
+    taellere = {}
+    resultat = []
+    for navn in kolonner:
+        nyt = navn
+        if nyt.lower() in brugte:
+            nummer = taellere.get(navn, 0)
+            while nyt.lower() in brugte:
+                nummer += 1
+                nyt = f"{navn}.{nummer}"
+            taellere[navn] = nummer
+        brugte.add(nyt.lower())
+        resultat.append(nyt)
+    return resultat
+
+
+def bestem_kolonnetyper(kolonner, raekker):
+    """Bestemmer SQLite-type for hver kolonne. Kendte kolonner får deres faste type
+    (varigheder som INTEGER sekunder); øvrige udledes af første chunk:
+    REAL hvis alle udfyldte værdier er tal, TIMESTAMP for datoer, ellers TEXT.
+    En udledt type udvides til TEXT hvis en senere værdi ikke passer (se indlaes_excel)"""
+    typer = []
+    for i, kolonne in enumerate(kolonner):
+        fast_type = fast_kolonnetype(kolonne)
+        if fast_type:
+            typer.append(fast_type)
+            continue
+        vaerdier = [raekke[i] for raekke in raekker if raekke[i] is not None]
+        if vaerdier and all(_er_tal(v) for v in vaerdier):
+            typer.append('REAL')
+        elif vaerdier and all(isinstance(v, (datetime, date)) for v in vaerdier):
+            typer.append('TIMESTAMP')
+        elif not vaerdier:
+            # Tomme kolonner gemmes som tal ligesom pandas gjorde
+            typer.append('REAL')
+        else:
+            typer.append('TEXT')
+    return typer
+
+
+def konverter_vaerdi(vaerdi, kolonnetype):
+    """Validerer og konverterer én celle til kolonnens type. Returnerer (værdi, gyldig)"""
+    if vaerdi is None or (isinstance(vaerdi, str) and not vaerdi.strip()):
+        return None, True
+
+    if kolonnetype == 'INTEGER':
+        sekunder = tid_til_sekunder(vaerdi)
+        return sekunder, sekunder is not None
+
+    if kolonnetype == 'REAL':
+        if _er_tal(vaerdi):
+            return float(vaerdi), True
+        try:
+            return float(str(vaerdi).strip().replace(',', '.')), True
+        except ValueError:
+            return None, False
+
+    if isinstance(vaerdi, (time, timedelta)):
+        return sekunder_til_tid(tid_til_sekunder(vaerdi)), True
+    if isinstance(vaerdi, (datetime, date)):
+        return str(vaerdi), True
+    if _er_tal(vaerdi) and kolonnetype == 'TEXT' and float(vaerdi).is_integer():
+        return str(int(vaerdi)), True
+    return str(vaerdi), True
+
+
+def udvid_til_tekst(conn, tabel, kolonner, kolonnetyper, udvidede):
+    """Genopbygger tabellen med de endelige kolonnetyper efter at kolonner er udvidet til TEXT.
+    Tal der allerede er gemt i en udvidet kolonne skrives som konverter_vaerdi ville have gjort"""
+    ny_tabel = f"{tabel}_udvidet"
+    kolonne_sql = ',\n  '.join(f'"{k}" {t}' for k, t in zip(kolonner, kolonnetyper))
+    udtryk = []
+    for i, kolonne in enumerate(kolonner):
+        if i in udvidede:
+            udtryk.append(
+                f'CASE WHEN typeof("{kolonne}") = \'real\' AND "{kolonne}" = CAST("{kolonne}" AS INTEGER) '
+                f'THEN CAST(CAST("{kolonne}" AS INTEGER) AS TEXT) ELSE CAST("{kolonne}" AS TEXT) END'
+            )
+        else:
+            udtryk.append(f'"{kolonne}"')
+    with conn:
+        conn.execute(f'DROP TABLE IF EXISTS "{ny_tabel}"')
+        conn.execute(f'CREATE TABLE "{ny_tabel}" (\n  {kolonne_sql}\n)')
+        conn.execute(f'INSERT INTO "{ny_tabel}" SELECT {", ".join(udtryk)} FROM "{tabel}"')
+        conn.execute(f'DROP TABLE "{tabel}"')
+        conn.execute(f'ALTER TABLE "{ny_tabel}" RENAME TO "{tabel}"')
+
+
+def indlaes_excel(excel_sti, db_sti, tabel, chunk_stoerrelse=CHUNK_STOERRELSE, progress_callback=None):
+    """Indlæser et RIO-regneark i tabel i db_sti i chunks.
+
+    Tabellen oprettes med det typede skema fra maanedsskema (varigheder som sekunder).
+    Hver chunk valideres og typekonverteres og skrives med executemany i sin egen
+    transaktion til en midlertidig tabel, som til sidst erstatter den eksisterende.
+    progress_callback kaldes med (behandlede rækker, forventet antal rækker).
+    Returnerer en dict med antal rækker og antal ugyldige celler.
+    """
+    total, raekker = _laes_raekker(excel_sti)
+
+    kolonner = next(raekker, None)
+    if not kolonner or all(k is None for k in kolonner):
+        raise ValueError("Excel filen er tom")
+
+    # Fjern bemærkningskolonnen som RIO sætter forrest i eksporten
+    spring_foerste_over = isinstance(kolonner[0], str) and kolonner[0].strip().startswith(EXCLUDE_TEXT)
+    if spring_foerste_over:
+        kolonner = kolonner[1:]
+
+    # Fjern tomme kolonner i højre side og giv unavngivne kolonner et navn
+    while kolonner and kolonner[-1] is None:
+        kolonner = kolonner[:-1]
+    kolonner = unikke_kolonnenavne(
+        [str(k) if k is not None else f"Unnamed: {i}" for i, k in enumerate(kolonner)]
+    )
+    antal_kolonner = len(kolonner)
+    # Kolonner uden fast type kan udvides til TEXT undervejs
+    udledte = [fast_kolonnetype(k) is None for k in kolonner]
+    udvidede = set()
+
+    midlertidig_tabel = f"{tabel}_indlaesning"
+    conn = sqlite3.connect(db_sti)
+    try:
+        conn.execute(f'DROP TABLE IF EXISTS "{midlertidig_tabel}"')
+
+        kolonnetyper = None
+        indsaet_sql = None
+        behandlet = 0
+        gemt = 0
+        ugyldige = 0
+        chunk = []
+
+        def skriv_chunk(chunk):
+            nonlocal kolonnetyper, indsaet_sql, gemt, ugyldige
+            if kolonnetyper is None:
+                kolonnetyper = bestem_kolonnetyper(kolonner, chunk)
+                kolonne_sql = ',\n  '.join(f'"{k}" {t}' for k, t in zip(kolonner, kolonnetyper))
+                conn.execute(f'CREATE TABLE "{midlertidig_tabel}" (\n  {kolonne_sql}\n)')
+                indsaet_sql = (f'INSERT INTO "{midlertidig_tabel}" VALUES '
+                               f'({", ".join("?" * antal_kolonner)})')
+
+            konverterede = []
+            for raekke in chunk:
+                ny_raekke = []
+                for i, vaerdi in enumerate(raekke):
+                    ny_vaerdi, gyldig = konverter_vaerdi(vaerdi, kolonnetyper[i])
+                    if not gyldig and udledte[i]:
+                        # Typen blev udledt af første chunk; udvid til TEXT i stedet for at miste værdien
+                        logging.info(f"Kolonne {kolonner[i]} udvides fra {kolonnetyper[i]} til TEXT")
+                        kolonnetyper[i] = 'TEXT'
+                        udvidede.add(i)
+                        ny_vaerdi, gyldig = konverter_vaerdi(vaerdi, 'TEXT')
+                    if not gyldig:
+                        ugyldige += 1
+                    ny_raekke.append(ny_vaerdi)
+                konverterede.append(ny_raekke)
+
+            with conn:
+                conn.executemany(indsaet_sql, konverterede)
+            gemt += len(konverterede)
+
+        for raekke in raekker:
+            behandlet += 1
+            if spring_foerste_over:
+                raekke = raekke[1:]
+            raekke = tuple(raekke[:antal_kolonner]) + (None,) * (antal_kolonner - len(raekke))
+
+            # Spring helt tomme rækker over
+            if all(v is None or (isinstance(v, str) and not v.strip()) for v in raekke):
+                continue
+
+            chunk.append(raekke)
+            if len(chunk) >= chunk_stoerrelse:
+                skriv_chunk(chunk)
+                chunk = []
+                if progress_callback:
+                    progress_callback(behandlet, total)
+
+        if chunk:
+            skriv_chunk(chunk)
+
+        if kolonnetyper is None:
+            raise ValueError("Excel filen er tom")
+
+        if udvidede:
+            udvid_til_tekst(conn, midlertidig_tabel, kolonner, kolonnetyper, udvidede)
+
+        # Erstat den eksisterende tabel i én transaktion og opret indekser
+        with conn:
+            conn.execute('BEGIN')
+            conn.execute(f'DROP TABLE IF EXISTS "{tabel}"')
+            conn.execute(f'ALTER TABLE "{midlertidig_tabel}" RENAME TO "{tabel}"')
+            opret_indekser(conn, tabel)
+            conn.execute(f'PRAGMA user_version = {SKEMA_VERSION}')
+
+        if progress_callback:
+            progress_callback(total or behandlet, total or behandlet)
+
+        if ugyldige:
+            logging.warning(f"{ugyldige} celler kunne ikke konverteres og blev gemt som tomme")
+        logging.info(f"Indlæst {gemt} rækker fra {os.path.basename(excel_sti)} i {tabel}")
+        return {'raekker': gemt, 'ugyldige': ugyldige}
+
+    except Exception:
+        try:
+            conn.execute(f'DROP TABLE IF EXISTS "{midlertidig_tabel}"')
+        except sqlite3.Error:
+            pass
+        raise
+    finally:
+        conn.close()
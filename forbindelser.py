@@ -0,0 +1,122 @@
+# Import nødvendige biblioteker
+import os
+import sqlite3
+import logging
+import threading
+from urllib.request import pathname2url
+
+# Indstillingsdatabasen som hele applikationen skriver til
+SETTINGS_DB = os.path.join('databases', 'settings.db')
+
+# PRAGMAs der sættes på alle forbindelser fra dette modul
+PRAGMAS = (
+    ('mmap_size', 256 * 1024 * 1024),  # Læs databasen via memory-mapping
+    ('cache_size', -16000),            # Sidecache på ca. 16 MB (negativ værdi er KiB)
+    ('temp_store', 'MEMORY'),          # Midlertidige tabeller og sortering i hukommelsen
+)
+
+# Højst så mange ledige forbindelser gemmes pr. database og tråd i puljen
+PULJE_STOERRELSE = 4
+
+# sqlite3 forbindelser må kun bruges i den tråd der oprettede dem,
+# så hver tråd har sine egne cachede forbindelser
+_lokal = threading.local()
+
+
+def _traad_cache(navn):
+    """Returnerer den aktuelle tråds cache med det givne navn"""
+    cache = getattr(_lokal, navn, None)
+    if cache is None:
+        cache = {}
+        setattr(_lokal, navn, cache)
+    return cache
+
+
+def _fil_signatur(sti):
+    """Ændringstidspunkt og størrelse, som afgør om en cachet forbindelse stadig er gyldig"""
+    stat = os.stat(sti)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _tilpas(conn):
+    """Sætter modulets PRAGMAs på en ny forbindelse og returnerer den"""
+    for navn, vaerdi in PRAGMAS:
+        conn.execute(f'PRAGMA {navn} = {vaerdi}')
+    return conn
+
+
+def laese_forbindelse(sti):
+    """
+    Returnerer trådens cachede skrivebeskyttede forbindelse til en database
+
+    Forbindelsen åbnes med mode=ro og almindelig låsning, da både månedsdatabaserne
+    og datavarehuset skrives i processen. Den genbruges så længe filens mtime og
+    størrelse er uændrede; ellers lukkes den og en ny åbnes.
+
+    Forbindelsen ejes af modulet og må ikke lukkes af kalderen. Sæt row_factory på
+    cursoren i stedet for på forbindelsen.
+
+    Args:
+        sti: Sti til databasefilen
+
+    Returns:
+        sqlite3.Connection
+    """
+    noegle = os.path.abspath(sti)
+    cache = _traad_cache('laesere')
+    signatur = _fil_signatur(noegle)
+
+    cached = cache.get(noegle)
+    if cached:
+        if cached[0] == signatur:
+            return cached[1]
+        cached[1].close()
+        del cache[noegle]
+
+    conn = sqlite3.connect(f"file:{pathname2url(noegle)}?mode=ro", uri=True)
+    _tilpas(conn)
+    cache[noegle] = (signatur, conn)
+    logging.debug(f"Læseforbindelse åbnet til {sti}")
+    return conn
+
+
+def settings_forbindelse(sti=SETTINGS_DB):
+    """
+    Returnerer trådens cachede læse/skrive forbindelse til settings.db
+
+    Kalderen committer selv sine ændringer og må ikke lukke forbindelsen.
+    """
+    noegle = os.path.abspath(sti)
+    cache = _traad_cache('skrivere')
+    conn = cache.get(noegle)
+    if conn is None:
+        os.makedirs(os.path.dirname(noegle), exist_ok=True)
+        conn = _tilpas(sqlite3.connect(noegle, timeout=30))
+        cache[noegle] = conn
+    return conn
+
+
+def hent_fra_pulje(sti):
+    """
+    Tager en læse/skrive forbindelse fra trådens pulje eller åbner en ny
+
+    Forbindelsen afleveres igen med aflever_til_pulje i stedet for at blive lukket.
+    """
+    ledige = _traad_cache('pulje').get(os.path.abspath(sti))
+    if ledige:
+        return ledige.pop()
+    return _tilpas(sqlite3.connect(sti, timeout=30))
+
+
+def aflever_til_pulje(sti, conn):
+    """Ruller en evt. åben transaktion tilbage og lægger forbindelsen tilbage i puljen"""
+    if conn.in_transaction:
+        conn.rollback()
+    ledige = _traad_cache('pulje').setdefault(os.path.abspath(sti), [])
+    if conn in ledige:
+        return
+    if len(ledige) < PULJE_STOERRELSE:
+        ledige.append(conn)
+    else:
+        conn.close()
+
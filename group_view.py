@@ -1,10 +1,11 @@
 import customtkinter as ctk
 from tkinter import messagebox
 import sqlite3
-import os
 import logging
 from PIL import Image
 from tkinter import ttk
+from datavarehus import hent_varehus
+from indstillinger import hent_indstillinger
 
 class DatabaseConnection:
     def __init__(self, db_path):
@@ -37,7 +38,8 @@ class GroupWindow:
             }
             
             # Hent minimum kilometer indstilling
-            self.min_km = self.get_min_km_setting()
+            self.min_km = hent_indstillinger().min_km
+            hent_indstillinger().abonner(self._indstillinger_aendret, noegler=('min_km',))
             
             # Indlæs eksisterende grupper
             self.groups = self.load_groups()
@@ -168,6 +170,9 @@ class GroupWindow:
     def destroy(self):
         """Lukker vinduet og frigør ressourcer"""
         try:
+            # Afmeld indstillingerne så et lukket vindue ikke opdateres ved senere ændringer
+            hent_indstillinger().afmeld(self._indstillinger_aendret)
+            
             # Frigiv grab
             self.root.grab_release()
             
@@ -435,26 +440,9 @@ class GroupWindow:
 
     def get_available_drivers(self):
         """Henter liste over tilgængelige chauffører"""
-        available_drivers = set()
-        
         try:
-            # Gennemgå alle chauffør databaser
-            for file in os.listdir('databases'):
-                if file.startswith('chauffør_data_') and file.endswith('.db'):
-                    db_path = os.path.join('databases', file)
-                    with DatabaseConnection(db_path) as conn:
-                        cursor = conn.cursor()
-                        cursor.execute(f'''
-                            SELECT DISTINCT Chauffør 
-                            FROM chauffør_data_data 
-                            WHERE "Kørestrækning [km]" >= {self.min_km}
-                        ''')
-                        
-                        for row in cursor.fetchall():
-                            if row[0] and not row[0].startswith("Bemærk venligst"):
-                                available_drivers.add(row[0])
-                            
-            return sorted(list(available_drivers))
+            # Kvalificerede chauffører på tværs af alle måneder fra chaufførregistret
+            return hent_varehus().hent_chauffoerer(self.min_km)
             
         except Exception as e:
             logging.error(f"Fejl ved hentning af chauffører: {str(e)}")
@@ -506,16 +494,9 @@ class GroupWindow:
             except Exception as e:
                 messagebox.showerror("Fejl", f"Kunne ikke fjerne medlem: {str(e)}")
 
-    def get_min_km_setting(self):
-        """Henter minimum kilometer indstilling fra databasen"""
-        try:
-            with DatabaseConnection('databases/settings.db') as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT value FROM settings WHERE key = "min_km"')
-                result = cursor.fetchone()
-                return float(result[0]) if result else 100.0
-        except:
-            return 100.0
+    def _indstillinger_aendret(self, aendringer):
+        """Nye chaufførvalg bruger den ændrede minimum kilometer indstilling"""
+        self.min_km = aendringer['min_km']
 
     def edit_group(self, group_id, group_name):
         """Redigerer en eksisterende gruppe"""
@@ -677,26 +658,8 @@ class DriverSelectionDialog:
             self.checkboxes = {}
             self.checkbox_vars = {}
             
-            # Hent alle unikke chauffører
-            available_drivers = set()
-            for file in os.listdir('databases'):
-                if file.startswith('chauffør_data_') and file.endswith('.db'):
-                    db_path = os.path.join('databases', file)
-                    logging.info(f"Læser fra database: {db_path}")
-                    try:
-                        with DatabaseConnection(db_path) as conn:
-                            cursor = conn.cursor()
-                            cursor.execute(f'''
-                                SELECT DISTINCT Chauffør 
-                                FROM chauffør_data_data 
-                                WHERE "Kørestrækning [km]" >= {self.min_km}
-                            ''')
-                            
-                            for row in cursor.fetchall():
-                                if row[0] and not row[0].startswith("Bemærk venligst"):
-                                    available_drivers.add(row[0])
-                    except Exception as e:
-                        logging.error(f"Fejl ved læsning af database {file}: {str(e)}")
+            # Hent alle unikke chauffører fra chaufførregistret
+            available_drivers = hent_varehus().hent_chauffoerer(self.min_km)
             
             logging.info(f"Fandt {len(available_drivers)} tilgængelige chauffører")
             
@@ -0,0 +1,157 @@
+# Import nødvendige biblioteker
+import sqlite3
+import inspect
+import logging
+import threading
+import weakref
+from forbindelser import SETTINGS_DB, settings_forbindelse
+
+# Kendte indstillinger med type og standardværdi
+INDSTILLINGER = {
+    'min_km': (float, 100.0),
+    'diesel_price': (float, 13.50),
+}
+
+
+class Indstillinger:
+    """
+    Procesdækkende cache af indstillingerne i settings.db.
+
+    Indstillingerne indlæses én gang og holdes i hukommelsen med deres rigtige typer.
+    gem() skriver til databasen, opdaterer cachen og giver abonnenterne besked om de
+    indstillinger der faktisk er ændret, så afhængige caches kan ryddes præcist.
+    """
+
+    def __init__(self, sti=SETTINGS_DB):
+        self.sti = sti
+        self._lock = threading.RLock()
+        self._vaerdier = None
+        # Abonnenter: [(svag reference til callback, nøgler eller None for alle)]
+        self._abonnenter = []
+
+    def _indlaes(self):
+        """Læser alle kendte indstillinger fra databasen og konverterer dem til deres type"""
+        gemte = {}
+        try:
+            cursor = settings_forbindelse(self.sti).execute('SELECT key, value FROM settings')
+            gemte = dict(cursor.fetchall())
+        except sqlite3.OperationalError as e:
+            logging.warning(f"Kunne ikke læse indstillinger, bruger standardværdier: {str(e)}")
+
+        vaerdier = {}
+        for noegle, (type_, standard) in INDSTILLINGER.items():
+            try:
+                vaerdier[noegle] = type_(gemte[noegle]) if gemte.get(noegle) is not None else standard
+            except (TypeError, ValueError):
+                logging.warning(f"Ugyldig værdi for {noegle}: {gemte[noegle]!r}, bruger {standard}")
+                vaerdier[noegle] = standard
+        logging.info(f"Indstillinger indlæst: {vaerdier}")
+        return vaerdier
+
+    def genindlaes(self):
+        """Indlæser indstillingerne fra databasen igen (fx ved opstart)"""
+        with self._lock:
+            self._vaerdier = self._indlaes()
+
+    def hent(self, noegle):
+        """Returnerer den typede værdi for en indstilling"""
+        with self._lock:
+            if self._vaerdier is None:
+                self._vaerdier = self._indlaes()
+            return self._vaerdier[noegle]
+
+    @property
+    def min_km(self):
+        return self.hent('min_km')
+
+    @property
+    def diesel_price(self):
+        return self.hent('diesel_price')
+
+    def gem(self, **vaerdier):
+        """
+        Gemmer indstillinger i databasen og giver abonnenterne besked om ændringerne
+
+        Abonnenterne kaldes i den tråd der gemmer (normalt Tk-tråden).
+
+        Args:
+            **vaerdier: Indstillinger der skal gemmes, fx min_km=150
+
+        Returns:
+            dict: De indstillinger der blev ændret med deres nye værdier
+        """
+        for noegle in vaerdier:
+            if noegle not in INDSTILLINGER:
+                raise KeyError(f"Ukendt indstilling: {noegle}")
+
+        with self._lock:
+            conn = settings_forbindelse(self.sti)
+            with conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
+                    [(noegle, str(vaerdi)) for noegle, vaerdi in vaerdier.items()]
+                )
+
+            if self._vaerdier is None:
+                self._vaerdier = self._indlaes()
+            aendringer = {}
+            for noegle, vaerdi in vaerdier.items():
+                ny = INDSTILLINGER[noegle][0](vaerdi)
+                if self._vaerdier[noegle] != ny:
+                    aendringer[noegle] = ny
+                self._vaerdier[noegle] = ny
+
+        if aendringer:
+            logging.info(f"Indstillinger ændret: {aendringer}")
+            self._giv_besked(aendringer)
+        return aendringer
+
+    def abonner(self, callback, noegler=None):
+        """
+        Registrerer en callback der kaldes med {nøgle: ny værdi} når indstillinger ændres
+
+        Callbacken holdes med en svag reference, så et lukket vindue ikke holdes i live
+        og automatisk falder ud af listen.
+
+        Args:
+            callback: Funktion eller bundet metode
+            noegler: Kun kald ved ændring af disse indstillinger (None giver alle)
+        """
+        reference = weakref.WeakMethod(callback) if inspect.ismethod(callback) else weakref.ref(callback)
+        with self._lock:
+            self._abonnenter.append((reference, frozenset(noegler) if noegler else None))
+
+    def afmeld(self, callback):
+        """Fjerner en callback fra abonnenterne"""
+        with self._lock:
+            self._abonnenter = [(reference, noegler) for reference, noegler in self._abonnenter
+                                if reference() not in (None, callback)]
+
+    def _giv_besked(self, aendringer):
+        with self._lock:
+            self._abonnenter = [(reference, noegler) for reference, noegler in self._abonnenter
+                                if reference() is not None]
+            abonnenter = list(self._abonnenter)
+
+        for reference, noegler in abonnenter:
+            callback = reference()
+            if callback is None or (noegler is not None and noegler.isdisjoint(aendringer)):
+                continue
+            try:
+                callback(aendringer)
+            except Exception as e:
+                logging.error(f"Fejl i abonnent på indstillinger: {str(e)}")
+
+
+# Delt instans for hele applikationen
+_indstillinger = None
+_indstillinger_lock = threading.Lock()
+
+
+def hent_indstillinger():
+    """Returnerer den delte indstillingsservice"""
+    global _indstillinger
+    with _indstillinger_lock:
+        if _indstillinger is None:
+            _indstillinger = Indstillinger()
+        return _indstillinger
@@ -1,17 +1,44 @@
 import customtkinter as ctk
-import sqlite3
+import tkinter as tk
 import os
 from datetime import datetime
-import pandas as pd
 import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import numpy as np
 from dateutil.relativedelta import relativedelta
 import calendar
-from functools import lru_cache
 import logging
+import base64
+from io import BytesIO
+import queue
+import threading
 import tkinter.messagebox as messagebox
-from database_connection import DatabaseConnection
+from datavarehus import hent_varehus
+from indstillinger import hent_indstillinger
+from noegletal_lager import hent_flaade_noegletal
+
+# Månedsresultater pr. databasefil: {sti: (mtime, min_km, nøgletal)}. Lever på tværs af
+# vinduer, så genåbning kun behandler nye eller ændrede måneder
+_maaneds_cache = {}
+
+# Renderede grafbilleder: {(kpi, datahash, (bredde, højde)): (png, punkter)}. Lever også
+# på tværs af vinduer, så genåbning med samme data og størrelse kun tegner billedet
+_graf_billeder = {}
+
+GRAF_CACHE_STOERRELSE = 64
+GRAF_HOEJDE = 400
+GRAF_DPI = 100
+HOVER_AFSTAND = 10  # Pixels fra et punkt hvor tooltip vises
+
+
+def _ryd_maaneds_cache(aendringer):
+    """Månedsresultaterne afhænger af min_km og ryddes når indstillingen ændres"""
+    _maaneds_cache.clear()
+
+
+hent_indstillinger().abonner(_ryd_maaneds_cache, noegler=('min_km',))
+
 
 class KPIWindow:
     def __init__(self):
@@ -121,7 +148,8 @@ class KPIWindow:
         }
         
         # Hent minimum kilometer indstilling
-        self.min_km = self.get_min_km_setting()
+        self.min_km = hent_indstillinger().min_km
+        hent_indstillinger().abonner(self._indstillinger_aendret, noegler=('min_km',))
         
         # Hent historisk data
         self.historical_data = {}
@@ -140,8 +168,6 @@ class KPIWindow:
         # Tilføj window closure handler
         self.root.protocol("WM_DELETE_WINDOW", self.destroy)
         
-        self._noegletal_cache = {}
-        
         self.setup_logging()
         
     def setup_logging(self):
@@ -155,114 +181,49 @@ class KPIWindow:
     def destroy(self):
         """Lukker vinduet og frigør ressourcer"""
         try:
+            # Afmeld indstillingerne så et lukket vindue ikke opdateres ved senere ændringer
+            hent_indstillinger().afmeld(self._indstillinger_aendret)
+            
+            # Stop baggrundsindlæsningen og polling af resultatkøen
+            if hasattr(self, '_stop_indlaesning'):
+                self._stop_indlaesning.set()
+            if getattr(self, '_poll_id', None):
+                self.root.after_cancel(self._poll_id)
+                self._poll_id = None
+            if getattr(self, '_synlighed_id', None):
+                self.root.after_cancel(self._synlighed_id)
+                self._synlighed_id = None
             plt.close('all')  # Luk alle matplotlib figurer
             self.root.destroy()
         except Exception as e:
             print(f"Fejl ved lukning af KPI vindue: {str(e)}")
         
-    def get_min_km_setting(self):
-        """Henter minimum kilometer indstilling fra databasen"""
-        try:
-            conn = sqlite3.connect('databases/settings.db')
-            cursor = conn.cursor()
-            cursor.execute('SELECT value FROM settings WHERE key = "min_km"')
-            result = cursor.fetchone()
-            conn.close()
-            return float(result[0]) if result else 100.0
-        except:
-            return 100.0
+    def _indstillinger_aendret(self, aendringer):
+        """Genindlæser månederne når minimum kilometer indstillingen ændres"""
+        self.min_km = aendringer['min_km']
+        if not hasattr(self, '_stop_indlaesning'):
+            return
+        self._stop_indlaesning.set()
+        if getattr(self, '_poll_id', None):
+            self.root.after_cancel(self._poll_id)
+            self._poll_id = None
+        self.get_historical_data()
             
     def find_all_databases(self):
-        """Finder alle kvalificerede chauffør databaser"""
-        databases = []
-        if not os.path.exists('databases'):
-            return databases
-            
-        for file in os.listdir('databases'):
-            if file.startswith('chauffør_data_') and file.endswith('.db'):
-                # Udtræk måned og år fra filnavn
-                parts = file.replace('.db', '').split('_')
-                if len(parts) >= 4:
-                    month = parts[2].lower()
-                    year = parts[3]
-                    
-                    # Konverter måned til nummer for sortering
-                    months = {
-                        'januar': 1, 'februar': 2, 'marts': 3, 'april': 4,
-                        'maj': 5, 'juni': 6, 'juli': 7, 'august': 8,
-                        'september': 9, 'oktober': 10, 'november': 11, 'december': 12
-                    }
-                    
-                    if month in months:
-                        month_num = months[month]
-                        databases.append({
-                            'path': os.path.join('databases', file),
-                            'month': month,
-                            'year': int(year),
-                            'month_num': month_num,
-                            'display_date': f"{month.capitalize()} {year}"
-                        })
-        
-        # Sorter efter år og måned i faldende rækkefølge
-        return sorted(databases, key=lambda x: (x['year'], x['month_num']), reverse=True)
-
-    def convert_time_to_seconds(self, time_str):
-        """Konverterer tid fra 'HH:MM:SS' format til sekunder"""
-        try:
-            h, m, s = map(int, time_str.split(':'))
-            return h * 3600 + m * 60 + s
-        except:
-            return 0
-
-    @lru_cache(maxsize=128)
-    def beregn_noegletal(self, data_tuple):
-        """Beregner nøgletal for given data med caching"""
+        """Finder alle indlæste måneder i datavarehuset, nyeste først"""
         try:
-            # Konverter tuple tilbage til dictionary
-            if isinstance(data_tuple, tuple):
-                data = dict(data_tuple)
-            else:
-                data = data_tuple
-                
-            noegletal = self._calculate_noegletal(data)
-            logging.info(f"Nøgletal beregnet for chauffør")
-            return noegletal
-                
+            return hent_varehus().hent_perioder()
         except Exception as e:
-            logging.error(f"Fejl i nøgletalsberegning: {str(e)}")
-            raise
+            logging.error(f"Fejl ved hentning af perioder fra datavarehus: {str(e)}")
+            return []
 
     def get_kpi_historical_data(self):
-        """Henter historisk KPI data fra alle databaser"""
+        """Henter historisk KPI data for alle måneder som opslag i de gemte flådegennemsnit"""
         historical_data = {}
-        databases = self.find_all_databases()
-        
-        for db_info in databases:
-            try:
-                with DatabaseConnection(db_info['path']) as db:
-                    query = f'''
-                        SELECT * FROM chauffør_data_data 
-                        WHERE "Kørestrækning [km]" >= {self.min_km}
-                    '''
-                    df = pd.read_sql_query(query, db.connection)
-                    
-                    if not df.empty:
-                        # Beregn gennemsnit af KPIer for kvalificerede chauffører
-                        kpis = {}
-                        for _, row in df.iterrows():
-                            # Konverter row til tuple for caching
-                            row_tuple = tuple(row.items())
-                            current_kpis = self.beregn_noegletal(row_tuple)
-                            for key, value in current_kpis.items():
-                                kpis[key] = kpis.get(key, []) + [value]
-                        
-                        # Beregn gennemsnit for hver KPI
-                        avg_kpis = {k: sum(v)/len(v) for k, v in kpis.items() if v}
-                        historical_data[db_info['display_date']] = avg_kpis
-                            
-            except Exception as e:
-                logging.error(f"Fejl ved læsning af {db_info['path']}: {str(e)}")
-                    
+        for db_info in self.find_all_databases():
+            gennemsnit = self._process_database(db_info)
+            if gennemsnit:
+                historical_data[db_info['display_date']] = gennemsnit
         return historical_data
 
     def setup_ui(self):
@@ -278,21 +239,15 @@ class KPIWindow:
             # Titel sektion
             self.create_title_section()
             
-            # Hent historisk data
-            self.historical_data = self.get_kpi_historical_data()
-            
-            if self.historical_data:
-                # Få seneste KPI værdier
-                current_values = list(self.historical_data.values())[0]  # Tag den første værdi (nyeste)
-                
-                # KPI Cards sektion
-                self.create_kpi_cards(current_values)
-                
-                # Graf sektion med individuelle grafer
-                self.create_kpi_graphs()
-            else:
-                # Vis fejlbesked hvis ingen data findes
-                self.show_no_data_message()
+            # Historisk data indlæses i baggrunden og vises efterhånden som månederne ankommer
+            self.loading_label = ctk.CTkLabel(
+                self.main_container,
+                text="Indlæser historisk data...",
+                font=("Segoe UI", 12),
+                text_color=self.colors["text_secondary"]
+            )
+            self.loading_label.pack(pady=(0, 10))
+            self.get_historical_data()
             
         except Exception as e:
             print(f"Fejl i setup_ui: {str(e)}")
@@ -326,7 +281,7 @@ class KPIWindow:
         )
         subtitle.pack(pady=(5, 0))
 
-    def create_kpi_cards(self, current_values):
+    def create_kpi_cards(self):
         # Container til KPI kort
         cards_frame = ctk.CTkFrame(self.main_container, fg_color="transparent")
         cards_frame.pack(fill="x", padx=40, pady=10)
@@ -336,8 +291,9 @@ class KPIWindow:
         col = 0
         max_cols = 4
         
-        for kpi_name, value in current_values.items():
-            card = self.create_kpi_card(cards_frame, kpi_name, value)
+        self._kpi_kort = {}
+        for kpi_name in self.kpi_config.keys():
+            card = self.create_kpi_card(cards_frame, kpi_name)
             card.grid(row=row, column=col, padx=5, pady=5, sticky="nsew")
             
             # Opdater grid position
@@ -350,12 +306,59 @@ class KPIWindow:
         for i in range(max_cols):
             cards_frame.grid_columnconfigure(i, weight=1)
 
-    def create_kpi_card(self, parent, title, current_value):
-        """Opretter et KPI kort med farver og pile baseret på udvikling"""
+    def create_kpi_card(self, parent, title):
+        """Opretter et KPI kort; værdi, farve og pil sættes af update_kpi_card"""
         card = ctk.CTkFrame(parent, fg_color=self.colors["card"])
         
-        # Find forrige måneds værdi
+        # KPI titel og beskrivelse
+        desc_label = ctk.CTkLabel(
+            card,
+            text=self.kpi_config[title]['beskrivelse'],
+            font=("Segoe UI", 12),
+            text_color=self.colors["text_secondary"]
+        )
+        desc_label.pack(pady=(10, 0))
+        
+        title_label = ctk.CTkLabel(
+            card,
+            text=self.kpi_config[title]['navn'],  # Brug 'navn' i stedet for direkte titel
+            font=("Segoe UI", 16, "bold"),
+            text_color=self.colors["primary"]
+        )
+        title_label.pack(pady=(0, 5))
+        
+        # KPI værdi med ændring
+        value_frame = ctk.CTkFrame(card, fg_color="transparent")
+        value_frame.pack(pady=5)
+        
+        value_label = ctk.CTkLabel(
+            value_frame,
+            text="...",
+            font=("Segoe UI", 24, "bold"),
+            text_color=self.colors["primary"]
+        )
+        value_label.pack(side="left", padx=5)
+        
+        change_label = ctk.CTkLabel(
+            value_frame,
+            text="",
+            font=("Segoe UI", 14),
+            text_color=self.colors["primary"]
+        )
+        change_label.pack(side="left")
+        
+        self._kpi_kort[title] = (value_label, change_label)
+        return card
+
+    def update_kpi_card(self, title):
+        """Sætter kortets værdi med farver og pile baseret på udvikling"""
+        value_label, change_label = self._kpi_kort[title]
         dates = list(self.historical_data.keys())
+        if not dates or title not in self.historical_data[dates[0]]:
+            return
+        current_value = self.historical_data[dates[0]][title]
+        
+        # Find forrige måneds værdi
         if len(dates) >= 2:
             # Nyeste måned er index 0, så den forrige er index 1
             prev_month = dates[1]
@@ -383,64 +386,38 @@ class KPIWindow:
             pct_change = 0
             arrow = ""
         
-        # KPI titel og beskrivelse
-        desc_label = ctk.CTkLabel(
-            card,
-            text=self.kpi_config[title]['beskrivelse'],
-            font=("Segoe UI", 12),
-            text_color=self.colors["text_secondary"]
-        )
-        desc_label.pack(pady=(10, 0))
-        
-        title_label = ctk.CTkLabel(
-            card,
-            text=self.kpi_config[title]['navn'],  # Brug 'navn' i stedet for direkte titel
-            font=("Segoe UI", 16, "bold"),
-            text_color=self.colors["primary"]
-        )
-        title_label.pack(pady=(0, 5))
-        
-        # KPI værdi med ændring
-        value_frame = ctk.CTkFrame(card, fg_color="transparent")
-        value_frame.pack(pady=5)
-        
-        value_label = ctk.CTkLabel(
-            value_frame,
+        value_label.configure(
             text=self.kpi_config[title]['format'].format(current_value),
-            font=("Segoe UI", 24, "bold"),
             text_color=color
         )
-        value_label.pack(side="left", padx=5)
-        
-        if arrow:
-            change_label = ctk.CTkLabel(
-                value_frame,
-                text=f"{arrow} {abs(pct_change):.1f}%",
-                font=("Segoe UI", 14),
-                text_color=color
-            )
-            change_label.pack(side="left")
-        
-        return card
+        change_label.configure(
+            text=f"{arrow} {abs(pct_change):.1f}%" if arrow else "",
+            text_color=color
+        )
 
     def create_kpi_graphs(self):
-        """Forbedret memory management for grafer"""
-        # Ryd tidligere grafer
-        if hasattr(self, '_current_figures'):
-            for fig in self._current_figures:
-                plt.close(fig)
-        self._current_figures = []
+        """Opretter pladser til graferne; selve figurerne tegnes først når de scrolles frem"""
+        self._kpi_grafer = {}
         
         # Container til alle grafer
         graphs_container = ctk.CTkFrame(self.main_container, fg_color=self.colors["card"])
         graphs_container.pack(fill="x", padx=40, pady=10)
         
-        # Opret nye grafer med kontrolleret memory brug
         for kpi_name in self.kpi_config.keys():
             self.create_interactive_kpi_graph(graphs_container, kpi_name)
+        
+        self._start_synlighedstjek()
+
+    def format_graph_date(self, date):
+        """Formatér x-akse label; fjern årstal fra visningen hvis det er samme år"""
+        if date.endswith('2024'):
+            return date.replace(' 2024', '')
+        elif date.endswith('2023'):
+            return date.replace(' 2023', '\'23')
+        return date
 
     def create_interactive_kpi_graph(self, parent, kpi_name):
-        """Opretter en interaktiv graf for en KPI"""
+        """Opretter titel og lærred til en KPI-graf; billedet tegnes af tegn_kpi_graf"""
         # Graf container
         graph_frame = ctk.CTkFrame(parent, fg_color=self.colors["background"])
         graph_frame.pack(fill="x", padx=20, pady=10)
@@ -465,138 +442,239 @@ class KPIWindow:
         )
         description.pack()
         
+        # Lærredet har fast højde, så scrollområdet ikke ændrer sig når graferne tegnes
+        canvas = tk.Canvas(
+            graph_frame,
+            height=GRAF_HOEJDE,
+            bg=self.colors["background"],
+            highlightthickness=0
+        )
+        canvas.pack(fill="x", expand=True)
+        
+        self._kpi_grafer[kpi_name] = {
+            'canvas': canvas,
+            'formatted_dates': [],
+            'values': [],
+            'noegle': None,      # Cachenøgle for det viste billede
+            'foto': None,
+            'punkter': None,
+            'hover_index': None,
+            'resize_id': None,
+            'tegnet': False      # False når data eller bredde er ændret siden sidste tegning
+        }
+        
+        canvas.bind("<Motion>", lambda event: self._vis_tooltip(kpi_name, event))
+        canvas.bind("<Leave>", lambda event: self._skjul_tooltip(kpi_name))
+        canvas.bind("<Configure>", lambda event: self._graf_aendret_stoerrelse(kpi_name))
+
+    def update_kpi_graph(self, kpi_name):
+        """Opdaterer grafens data; billedet tegnes med det samme hvis grafen er synlig"""
+        graf = self._kpi_grafer.get(kpi_name)
+        if graf is None:
+            return
+        # Forbered data
+        dates = [date for date in reversed(self.historical_data.keys())  # Vend rækkefølgen
+                 if kpi_name in self.historical_data[date]]
+        graf['values'] = [self.historical_data[date][kpi_name] for date in dates]
+        graf['formatted_dates'] = [self.format_graph_date(date) for date in dates]
+        graf['tegnet'] = False
+        if self._graf_synlig(graf):
+            self.tegn_kpi_graf(kpi_name)
+        else:
+            self._start_synlighedstjek()
+
+    def _graf_synlig(self, graf):
+        """True hvis grafens lærred helt eller delvist er inden for vinduet"""
+        canvas = graf['canvas']
+        if not canvas.winfo_ismapped():
+            return False
+        top = canvas.winfo_rooty()
+        vindue_top = self.root.winfo_rooty()
+        return top < vindue_top + self.root.winfo_height() and top + canvas.winfo_height() > vindue_top
+
+    def _start_synlighedstjek(self):
+        """Starter tjekket for grafer der scrolles frem, hvis det ikke allerede kører"""
+        if getattr(self, '_synlighed_id', None) is None:
+            self._synlighed_id = self.root.after(200, self._tjek_synlige_grafer)
+
+    def _tjek_synlige_grafer(self):
+        """Tegner grafer der er scrollet frem og mangler et opdateret billede.
+        Tjekket stopper når alle grafer med data er tegnet og startes igen ved nye data eller ny bredde."""
+        self._synlighed_id = None
         try:
-            # Opret figur og axes med specifik størrelse og DPI
-            fig, ax = plt.subplots(figsize=(12, 4), dpi=100)
-            self._current_figures.append(fig)
-            
-            # Stil indstillinger
-            fig.patch.set_facecolor(self.colors["background"])
-            ax.set_facecolor(self.colors["background"])
-            
-            # Forbered data
-            dates = list(reversed(self.historical_data.keys()))  # Vend rækkefølgen
-            values = [self.historical_data[date][kpi_name] for date in dates]
-            
-            # Formatér x-akse labels
-            formatted_dates = []
-            for date in dates:
-                # Fjern årstal fra visningen hvis det er samme år
-                if date.endswith('2024'):
-                    formatted_dates.append(date.replace(' 2024', ''))
-                elif date.endswith('2023'):
-                    formatted_dates.append(date.replace(' 2023', '\'23'))
+            mangler = False
+            for kpi_name, graf in self._kpi_grafer.items():
+                if not graf['values'] or graf['tegnet']:
+                    continue
+                if self._graf_synlig(graf):
+                    self.tegn_kpi_graf(kpi_name)
                 else:
-                    formatted_dates.append(date)
-            
-            # Plot hovedlinje med punkter
-            line = ax.plot(formatted_dates, values, 'o-', color=self.colors["primary"], 
-                        linewidth=2, markersize=6, label='Faktisk værdi')[0]
-            
-            # Tilføj trend line hvis der er mere end ét datapunkt
-            if len(values) > 1:
-                z = np.polyfit(range(len(values)), values, 1)
-                p = np.poly1d(z)
-                ax.plot(formatted_dates, p(range(len(values))), "--", 
-                    color=self.colors["text_secondary"], alpha=0.8, 
-                    label='Trend', linewidth=1.5)
-            
-            # Konfigurer graf
-            ax.grid(True, linestyle='--', alpha=0.3)
-            ax.set_ylabel(f"Værdi ({self.kpi_config[kpi_name]['format'].split()[1] if ' ' in self.kpi_config[kpi_name]['format'] else '%'})")
-            
-            # Juster x-akse labels
-            plt.xticks(rotation=45, ha='right')
-            ax.tick_params(axis='x', labelsize=8)
-            
-            # Tilføj målområde hvis defineret
-            if self.kpi_config[kpi_name]['maal_min'] is not None and self.kpi_config[kpi_name]['maal_max'] is not None:
-                maal_min = self.kpi_config[kpi_name]['maal_min']
-                maal_max = self.kpi_config[kpi_name]['maal_max']
-                if self.kpi_config[kpi_name]['hoejere_er_bedre']:
-                    ax.axhspan(maal_min, maal_max, 
-                            color=self.colors["success"], alpha=0.1,
-                            label=f"Målområde")
-                else:
-                    ax.axhspan(0, maal_max, 
-                            color=self.colors["success"], alpha=0.1,
-                            label=f"Målområde")
-            
-            # Tilføj legend med transparent baggrund
-            ax.legend(loc='upper right', facecolor=self.colors["background"], 
-                    framealpha=0.8, fontsize=8)
-            
-            # Tilføj tooltips med dynamisk positionering
-            tooltip = ax.annotate("", 
-                xy=(0,0), 
-                xytext=(20,20),
-                textcoords="offset points",
-                bbox=dict(
-                    boxstyle="round,pad=0.5", 
-                    fc="white", 
-                    ec="0.5", 
-                    alpha=0.9
-                ),
-                arrowprops=dict(arrowstyle="->"))
-            tooltip.set_visible(False)
-
-            def hover(event):
-                if event.inaxes == ax:
-                    cont, ind = line.contains(event)
-                    if cont:
-                        x = formatted_dates[ind["ind"][0]]
-                        y = values[ind["ind"][0]]
-                        
-                        # Brug kun y-værdien til transformation da x er en dato string
-                        display_coords = ax.transData.transform([(0, float(y))])[0]
-                        fig_coords = fig.transFigure.inverted().transform(display_coords)
-                        
-                        # Juster position baseret på x-koordinat i plot
-                        x_pos = ind["ind"][0] / (len(dates)-1)  # Normaliseret x-position (0-1)
-                        
-                        # Bestem tooltip position
-                        if x_pos > 0.8:  # Hvis punktet er i højre side
-                            tooltip.set_position((-120, 20))
-                        else:
-                            tooltip.set_position((20, 20))
-                            
-                        # Juster y position hvis punktet er nær top eller bund
-                        if fig_coords[1] > 0.8:
-                            tooltip.set_position((tooltip.xyann[0], -20))
-                        elif fig_coords[1] < 0.2:
-                            tooltip.set_position((tooltip.xyann[0], 20))
-                            
-                        # Sæt tooltip data og position
-                        tooltip.xy = (x, y)
-                        tooltip.set_text(f"{x}\n{self.kpi_config[kpi_name]['format'].format(y)}")
-                        tooltip.set_visible(True)
-                        fig.canvas.draw_idle()
-                    else:
-                        tooltip.set_visible(False)
-                        fig.canvas.draw_idle()
-
-            # Tilføj hover event
-            fig.canvas.mpl_connect("motion_notify_event", hover)
-            
-            # Juster layout
-            plt.tight_layout()
-            
-            # Juster margener for bedre visning
-            plt.subplots_adjust(bottom=0.2, left=0.1, right=0.95, top=0.95)
-            
-            # Embed graf i tkinter vindue med korrekt størrelse
-            canvas = FigureCanvasTkAgg(fig, master=graph_frame)
-            canvas.draw()
-            canvas.get_tk_widget().pack(fill="both", expand=True)
-            
+                    mangler = True
+            if mangler:
+                self._synlighed_id = self.root.after(200, self._tjek_synlige_grafer)
+        except tk.TclError:
+            # Vinduet er lukket
+            pass
+
+    def _graf_aendret_stoerrelse(self, kpi_name):
+        """Tegner grafen i den nye bredde når størrelsesændringen er afsluttet"""
+        graf = self._kpi_grafer[kpi_name]
+        if graf['resize_id']:
+            self.root.after_cancel(graf['resize_id'])
+        graf['resize_id'] = self.root.after(150, self._tegn_efter_resize, kpi_name)
+
+    def _tegn_efter_resize(self, kpi_name):
+        graf = self._kpi_grafer[kpi_name]
+        graf['resize_id'] = None
+        graf['tegnet'] = False
+        if not graf['values']:
+            return
+        if self._graf_synlig(graf):
+            self.tegn_kpi_graf(kpi_name)
+        else:
+            self._start_synlighedstjek()
+
+    def tegn_kpi_graf(self, kpi_name):
+        """Viser grafens billede fra cachen og renderer det kun hvis data eller størrelse er ny"""
+        graf = self._kpi_grafer[kpi_name]
+        canvas = graf['canvas']
+        bredde = canvas.winfo_width()
+        if bredde <= 1:
+            bredde = 12 * GRAF_DPI
+        data_hash = hash((tuple(graf['formatted_dates']), tuple(graf['values'])))
+        noegle = (kpi_name, data_hash, (bredde, GRAF_HOEJDE))
+        graf['tegnet'] = True
+        if graf['noegle'] == noegle:
+            return
+        
+        try:
+            billede = _graf_billeder.get(noegle)
+            if billede is None:
+                billede = self._render_kpi_graf(kpi_name, graf['formatted_dates'], graf['values'], bredde, GRAF_HOEJDE)
+                if len(_graf_billeder) >= GRAF_CACHE_STOERRELSE:
+                    _graf_billeder.pop(next(iter(_graf_billeder)))
+                _graf_billeder[noegle] = billede
+            png, punkter = billede
+            
+            graf['foto'] = tk.PhotoImage(master=canvas, data=png, format='png')
+            canvas.delete("all")
+            canvas.create_image(0, 0, image=graf['foto'], anchor="nw")
+            graf['punkter'] = punkter
+            graf['hover_index'] = None
+            graf['noegle'] = noegle
         except Exception as e:
-            logging.error(f"Fejl ved oprettelse af graf for {kpi_name}: {str(e)}")
-            error_label = ctk.CTkLabel(
-                graph_frame,
+            logging.error(f"Fejl ved tegning af graf for {kpi_name}: {str(e)}")
+            canvas.delete("all")
+            canvas.create_text(
+                bredde // 2, GRAF_HOEJDE // 2,
                 text=f"Kunne ikke oprette graf: {str(e)}",
-                text_color=self.colors["danger"]
+                fill=self.colors["danger"]
             )
-            error_label.pack(pady=20)
+            graf['noegle'] = noegle
+
+    def _render_kpi_graf(self, kpi_name, formatted_dates, values, bredde, hoejde):
+        """
+        Renderer grafen offscreen og returnerer (png som base64, punkter)
+        
+        punkter er (x, y) i pixels sorteret efter x, så hover kan slå nærmeste punkt op
+        med en binær søgning.
+        """
+        fig = Figure(figsize=(bredde / GRAF_DPI, hoejde / GRAF_DPI), dpi=GRAF_DPI)
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot()
+        
+        # Stil indstillinger
+        fig.patch.set_facecolor(self.colors["background"])
+        ax.set_facecolor(self.colors["background"])
+        
+        positions = list(range(len(values)))
+        ax.plot(positions, values, 'o-', color=self.colors["primary"],
+                linewidth=2, markersize=6, label='Faktisk værdi')
+        
+        # Trend line hvis der er mere end ét datapunkt
+        if len(values) > 1:
+            p = np.poly1d(np.polyfit(positions, values, 1))
+            ax.plot(positions, p(positions), "--",
+                color=self.colors["text_secondary"], alpha=0.8,
+                label='Trend', linewidth=1.5)
+        
+        # Konfigurer graf
+        ax.grid(True, linestyle='--', alpha=0.3)
+        ax.set_ylabel(f"Værdi ({self.kpi_config[kpi_name]['format'].split()[1] if ' ' in self.kpi_config[kpi_name]['format'] else '%'})")
+        ax.tick_params(axis='x', labelsize=8)
+        ax.set_xticks(positions)
+        ax.set_xticklabels(formatted_dates, rotation=45, ha='right')
+        
+        # Tilføj målområde hvis defineret
+        if self.kpi_config[kpi_name]['maal_min'] is not None and self.kpi_config[kpi_name]['maal_max'] is not None:
+            maal_min = self.kpi_config[kpi_name]['maal_min']
+            maal_max = self.kpi_config[kpi_name]['maal_max']
+            if self.kpi_config[kpi_name]['hoejere_er_bedre']:
+                ax.axhspan(maal_min, maal_max, 
+                        color=self.colors["success"], alpha=0.1,
+                        label=f"Målområde")
+            else:
+                ax.axhspan(0, maal_max, 
+                        color=self.colors["success"], alpha=0.1,
+                        label=f"Målområde")
+        
+        # Tilføj legend med transparent baggrund
+        ax.legend(loc='upper right', facecolor=self.colors["background"], 
+                framealpha=0.8, fontsize=8)
+        
+        # Juster margener for bedre visning
+        fig.subplots_adjust(bottom=0.2, left=0.1, right=0.95, top=0.95)
+        
+        buffer = BytesIO()
+        fig.savefig(buffer, format='png', dpi=GRAF_DPI, facecolor=fig.get_facecolor())
+        
+        # Punkternes pixelposition i billedet (matplotlib måler y fra bunden)
+        punkter = ax.transData.transform(np.column_stack([positions, values])) if values else np.empty((0, 2))
+        punkter[:, 1] = hoejde - punkter[:, 1]
+        return base64.b64encode(buffer.getvalue()).decode('ascii'), punkter
+
+    def _vis_tooltip(self, kpi_name, event):
+        """Viser tooltip for nærmeste punkt inden for HOVER_AFSTAND pixels"""
+        graf = self._kpi_grafer[kpi_name]
+        punkter = graf['punkter']
+        if punkter is None or not len(punkter):
+            return
+        
+        # Punkterne er sorteret efter x, så kun naboerne til musens x skal undersøges
+        i = int(np.searchsorted(punkter[:, 0], event.x))
+        kandidater = [k for k in (i - 1, i) if 0 <= k < len(punkter)]
+        index = min(kandidater, key=lambda k: (punkter[k, 0] - event.x) ** 2 + (punkter[k, 1] - event.y) ** 2)
+        afstand = np.hypot(punkter[index, 0] - event.x, punkter[index, 1] - event.y)
+        if afstand > HOVER_AFSTAND:
+            self._skjul_tooltip(kpi_name)
+            return
+        if graf['hover_index'] == index:
+            return
+        
+        canvas = graf['canvas']
+        canvas.delete("tooltip")
+        graf['hover_index'] = index
+        x, y = punkter[index]
+        tekst = f"{graf['formatted_dates'][index]}\n{self.kpi_config[kpi_name]['format'].format(graf['values'][index])}"
+        
+        # Placer tooltip til venstre i højre side af grafen og under punktet nær toppen
+        dx = -20 if index / max(len(punkter) - 1, 1) > 0.8 else 20
+        dy = 20 if y < 0.2 * GRAF_HOEJDE else -20
+        tekst_id = canvas.create_text(
+            x + dx, y + dy, text=tekst,
+            anchor=("s" if dy < 0 else "n") + ("e" if dx < 0 else "w"),
+            font=("Segoe UI", 9), fill="black", tags="tooltip"
+        )
+        x1, y1, x2, y2 = canvas.bbox(tekst_id)
+        canvas.create_line(x, y, x + dx, y + dy, arrow="first", fill="gray40", tags="tooltip")
+        boks = canvas.create_rectangle(x1 - 6, y1 - 4, x2 + 6, y2 + 4, fill="white", outline="gray50", tags="tooltip")
+        canvas.tag_raise(tekst_id, boks)
+
+    def _skjul_tooltip(self, kpi_name):
+        graf = self._kpi_grafer[kpi_name]
+        if graf['hover_index'] is not None:
+            graf['canvas'].delete("tooltip")
+            graf['hover_index'] = None
 
     def show_no_data_message(self):
             """Viser besked når ingen data er tilgængelig"""
@@ -623,156 +701,113 @@ class KPIWindow:
             messagebox.showerror("Fejl", f"Kunne ikke starte KPI-vindue: {str(e)}")
 
     def get_historical_data(self):
-        """Implementer progressiv data loading med progress feedback"""
+        """Starter indlæsning af historisk data i en baggrundstråd.
+        Hver måned sendes tilbage gennem en kø som brugerfladen tømmer med root.after."""
+        self._databases = self.find_all_databases()
+        self._resultat_koe = queue.Queue()
+        self._stop_indlaesning = threading.Event()
+        self._maaneds_resultater = {}
+        self._sidst_viste_maaneder = None
+        self.historical_data = {}
+        
+        threading.Thread(
+            target=self._indlaes_maaneder,
+            args=(list(self._databases), self._resultat_koe, self._stop_indlaesning),
+            daemon=True
+        ).start()
+        self._poll_id = self.root.after(50, self._behandl_resultater)
+
+    def _indlaes_maaneder(self, databases, koe, stop):
+        """Kører i baggrundstråden og sender (display_date, nøgletal) for hver måned til køen.
+        Køen og stop-signalet gives med, så en genstartet indlæsning ikke blandes med den gamle."""
         try:
-            databases = self.find_all_databases()
-            total_chunks = (len(databases) + 9) // 10  # Ceil division
-            
-            # Opret progress bar
-            progress_window = ctk.CTkToplevel()
-            progress_window.title("Indlæser data")
-            progress_window.geometry("300x150")
-            
-            # Centrer progress window
-            progress_window.update_idletasks()
-            x = (progress_window.winfo_screenwidth() // 2) - (300 // 2)
-            y = (progress_window.winfo_screenheight() // 2) - (150 // 2)
-            progress_window.geometry(f'+{x}+{y}')
-            
-            progress_label = ctk.CTkLabel(
-                progress_window,
-                text="Indlæser historisk data...",
-                font=("Segoe UI", 12)
-            )
-            progress_label.pack(pady=20)
-            
-            progress_bar = ctk.CTkProgressBar(progress_window)
-            progress_bar.pack(pady=10, padx=20, fill="x")
-            progress_bar.set(0)
-            
-            def load_chunk(start_idx, chunk_size=10):
-                end_idx = min(start_idx + chunk_size, len(databases))
-                chunk_data = databases[start_idx:end_idx]
-                return {db['display_date']: self._process_database(db) 
-                        for db in chunk_data}
-            
-            self.historical_data = {}
-            for i in range(0, len(databases), 10):
-                chunk = load_chunk(i)
-                self.historical_data.update(chunk)
-                
-                # Opdater progress
-                progress = (i + 10) / len(databases)
-                progress_bar.set(min(progress, 1.0))
-                progress_label.configure(
-                    text=f"Indlæser historisk data... {int(progress * 100)}%"
-                )
-                progress_window.update()
-                
-                self.update_ui()
-                    
+            for db_info in databases:
+                if stop.is_set():
+                    return
+                koe.put((db_info['display_date'], self._process_database(db_info)))
             logging.info("Historisk data indlæst succesfuldt")
-            progress_window.destroy()
-                
         except Exception as e:
             logging.error(f"Fejl ved indlæsning af historisk data: {str(e)}")
-            self.historical_data = {}
-            if 'progress_window' in locals():
-                progress_window.destroy()
+        finally:
+            koe.put(None)
 
-    def _calculate_noegletal(self, data):
-        """Beregner nøgletal baseret på kørselsdata"""
-        try:
-            noegletal = {}
-            
-            # Beregn tomgangsprocent
-            motor_tid = self.convert_time_to_seconds(data['Motordriftstid [hh:mm:ss]'])
-            tomgangs_tid = self.convert_time_to_seconds(data['Tomgang / stilstandstid [hh:mm:ss]'])
-            noegletal['Tomgangsprocent'] = (tomgangs_tid / motor_tid) * 100 if motor_tid > 0 else 0
-            
-            # Beregn cruise control andel
-            distance_over_50 = float(data['Afstand med kørehastighedsregulering (> 50 km/h) [km]']) + \
-                             float(data['Afstand > 50 km/h uden kørehastighedsregulering [km]'])
-            cruise_distance = float(data['Afstand med kørehastighedsregulering (> 50 km/h) [km]'])
-            noegletal['Fartpilot Andel'] = (cruise_distance / distance_over_50) * 100 if distance_over_50 > 0 else 0
-            
-            # Beregn motorbremse andel
-            driftsbremse = float(data['Driftsbremse (km) [km]'])
-            motorbremse = float(data['Afstand motorbremse [km]'])
-            total_bremse = driftsbremse + motorbremse
-            noegletal['Motorbremse Andel'] = (motorbremse / total_bremse) * 100 if total_bremse > 0 else 0
-            
-            # Beregn påløbsdrift andel
-            total_distance = float(data['Kørestrækning [km]'])
-            paalobsdrift = float(data['Aktiv påløbsdrift (km) [km]']) + float(data['Afstand i påløbsdrift [km]'])
-            noegletal['Påløbsdrift Andel'] = (paalobsdrift / total_distance) * 100 if total_distance > 0 else 0
-            
-            # Beregn diesel effektivitet
-            forbrug = float(data['Forbrug [l]'])
-            noegletal['Diesel Effektivitet'] = total_distance / forbrug if forbrug > 0 else 0
-            
-            # Beregn vægtkorrigeret forbrug
-            total_vaegt = float(data.get('Ø totalvægt [t]', 0))
-            if total_vaegt > 0 and total_distance > 0:
-                noegletal['Vægtkorrigeret Forbrug'] = (forbrug / total_distance * 100) / total_vaegt
-            else:
-                noegletal['Vægtkorrigeret Forbrug'] = 0
-                
-            # Beregn overspeed andel
-            overspeed = float(data['Overspeed (km uden påløbsdrift) [km]'])
-            noegletal['Overspeed Andel'] = (overspeed / total_distance) * 100 if total_distance > 0 else 0
-            
-            # Beregn CO₂ effektivitet (kg CO₂ per ton-kilometer)
-            co2_emission = float(data['CO₂-emission [kg]'])
-            if total_distance > 0 and total_vaegt > 0:
-                # Først beregn CO₂ per kilometer
-                co2_per_km = co2_emission / total_distance
-                # Derefter normaliser med vægten for at få kg CO₂ per ton-kilometer
-                noegletal['CO2 Effektivitet'] = co2_per_km / total_vaegt
-            else:
-                noegletal['CO2 Effektivitet'] = 0
-            
-            logging.info(f"Nøgletal beregnet succesfuldt")
-            return noegletal
-            
-        except Exception as e:
-            logging.error(f"Fejl i _calculate_noegletal: {str(e)}")
-            raise
+    def _behandl_resultater(self):
+        """Tømmer køen på Tk-tråden og opdaterer kun de berørte kort og grafpunkter"""
+        faerdig = False
+        nye = 0
+        while True:
+            try:
+                resultat = self._resultat_koe.get_nowait()
+            except queue.Empty:
+                break
+            if resultat is None:
+                faerdig = True
+                break
+            display_date, noegletal = resultat
+            if noegletal:
+                self._maaneds_resultater[display_date] = noegletal
+                nye += 1
+        
+        if nye:
+            # Bevar rækkefølgen nyeste først uanset hvornår månederne ankom
+            self.historical_data = {
+                db_info['display_date']: self._maaneds_resultater[db_info['display_date']]
+                for db_info in self._databases
+                if db_info['display_date'] in self._maaneds_resultater
+            }
+            self.update_ui()
+        
+        if faerdig:
+            self._poll_id = None
+            self.loading_label.pack_forget()
+            if not self.historical_data:
+                # Vis fejlbesked hvis ingen data findes
+                self.show_no_data_message()
+        else:
+            self.loading_label.configure(
+                text=f"Indlæser historisk data... {len(self._maaneds_resultater)}/{len(self._databases)}"
+            )
+            self._poll_id = self.root.after(50, self._behandl_resultater)
 
     def update_ui(self):
-        """Opdaterer brugergrænsefladen med nye data"""
+        """Opdaterer brugergrænsefladen med nye måneder"""
         try:
-            if self.historical_data:
-                current_values = list(self.historical_data.values())[0]
-                self.create_kpi_cards(current_values)
+            if not self.historical_data:
+                return
+            
+            # KPI kort og grafer oprettes første gang der er data
+            if not hasattr(self, '_kpi_kort'):
+                self.create_kpi_cards()
                 self.create_kpi_graphs()
-            self.root.update()
+            
+            # Kortene afhænger kun af de to nyeste måneder
+            nyeste_maaneder = list(self.historical_data.keys())[:2]
+            if nyeste_maaneder != self._sidst_viste_maaneder:
+                self._sidst_viste_maaneder = nyeste_maaneder
+                for kpi_name in self._kpi_kort:
+                    self.update_kpi_card(kpi_name)
+            
+            for kpi_name in self._kpi_grafer:
+                self.update_kpi_graph(kpi_name)
         except Exception as e:
             logging.error(f"Fejl ved opdatering af UI: {str(e)}")
 
     def _process_database(self, db_info):
-        """Processerer en database og returnerer dens KPI data"""
+        """Slår de gemte flådegennemsnit op for en måned.
+        Resultatet caches pr. fil og genbruges indtil filens mtime eller min_km ændres."""
         try:
-            with DatabaseConnection(db_info['path']) as db:
-                query = f'''
-                    SELECT * FROM chauffør_data_data 
-                    WHERE "Kørestrækning [km]" >= {self.min_km}
-                '''
-                df = pd.read_sql_query(query, db.connection)
-                
-                if not df.empty:
-                    kpis = {}
-                    for _, row in df.iterrows():
-                        row_dict = dict(row)
-                        current_kpis = self._calculate_noegletal(row_dict)
-                        for key, value in current_kpis.items():
-                            kpis[key] = kpis.get(key, []) + [value]
-                            
-                    return {k: sum(v)/len(v) for k, v in kpis.items() if v}
-                return {}
+            sti = os.path.abspath(db_info['path'])
+            mtime = os.path.getmtime(sti)
+            cached = _maaneds_cache.get(sti)
+            if cached and cached[0] == mtime and cached[1] == self.min_km:
+                return cached[2]
+            
+            gennemsnit = hent_flaade_noegletal(sti, self.min_km)
+            _maaneds_cache[sti] = (mtime, self.min_km, gennemsnit)
+            return gennemsnit
                 
         except Exception as e:
-            logging.error(f"Fejl ved processering af database {db_info['path']}: {str(e)}")
+            logging.error(f"Fejl ved processering af {db_info['display_date']}: {str(e)}")
             return {}
 
     def _safe_maximize(self):
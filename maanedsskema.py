@@ -0,0 +1,206 @@
+import os
+import sqlite3
+import logging
+from datetime import datetime, time, timedelta
+
+# Skemaversion gemt i PRAGMA user_version på hver månedsdatabase
+SKEMA_VERSION = 1
+
+# Varigheder gemmes som heltal sekunder; RIO markerer dem med denne enhed i kolonnenavnet
+VARIGHED_MARKOER = '[hh:mm:ss]'
+
+# openpyxl læser varigheder på 24 timer eller mere som datetime regnet fra Excels
+# dag 0. Under serienummer 60 (1. marts 1900) lægger openpyxl en dag til pga. Excels
+# skudårsfejl, så grundlaget er reelt 31. december 1899
+EXCEL_VARIGHED_GRUNDLAG = datetime(1899, 12, 31)
+EXCEL_SKUDDAG_GRAENSE = datetime(1900, 3, 1)
+
+# Kolonner som altid er tekst eller tidsstempler; øvrige kendte kolonner er tal
+TEKST_KOLONNER = {'Chauffør', 'Køretøjer', 'Samlet anvendelse', 'Indsatsdage'}
+TIDSSTEMPEL_KOLONNER = {'Fra', 'Til'}
+
+# Indekser som alle forbrugere filtrerer på
+INDEKS_KOLONNER = ['Chauffør', 'Kørestrækning [km]']
+
+
+def er_varighed(kolonne):
+    """True hvis kolonnen er en varighed der gemmes som sekunder"""
+    return VARIGHED_MARKOER in str(kolonne)
+
+
+def tid_til_sekunder(vaerdi):
+    """Konverterer 'tt:mm:ss', tal, time, timedelta eller en Excel-varighed over 24 timer
+    (datetime i starten af 1900) til heltal sekunder (None hvis tom/ugyldig)
+
+    >>> tid_til_sekunder('25:30:00')
+    91800
+    >>> tid_til_sekunder(time(1, 2, 3))
+    3723
+    >>> tid_til_sekunder(datetime(1900, 1, 1, 1, 30))
+    91800
+    >>> tid_til_sekunder('1900-01-01 01:30:00')
+    91800
+    >>> tid_til_sekunder(datetime(2024, 5, 1)) is None
+    True
+    """
+    if vaerdi is None:
+        return None
+    if isinstance(vaerdi, bool):
+        return None
+    if isinstance(vaerdi, datetime):
+        if vaerdi >= EXCEL_SKUDDAG_GRAENSE:
+            # Et rigtigt tidspunkt er ikke en varighed
+            return None
+        return int(round((vaerdi - EXCEL_VARIGHED_GRUNDLAG).total_seconds()))
+    if isinstance(vaerdi, (int, float)):
+        return None if vaerdi != vaerdi else int(round(vaerdi))
+    if isinstance(vaerdi, timedelta):
+        return int(round(vaerdi.total_seconds()))
+    if isinstance(vaerdi, time):
+        return vaerdi.hour * 3600 + vaerdi.minute * 60 + vaerdi.second
+    try:
+        tekst = str(vaerdi).strip()
+        if not tekst:
+            return None
+        if ':' not in tekst:
+            return int(round(float(tekst)))
+        if '-' in tekst:
+            # Ældre databaser har gemt Excel-varigheder over 24 timer som datotekst
+            return tid_til_sekunder(datetime.fromisoformat(tekst))
+        t, m, s = tekst.split(':')
+        return int(t) * 3600 + int(m) * 60 + int(round(float(s)))
+    except (ValueError, TypeError):
+        return None
+
+
+def sekunder_til_tid(vaerdi):
+    """Formaterer sekunder som 'tt:mm:ss' (timer kan overstige 24); tekst returneres uændret"""
+    if vaerdi is None or isinstance(vaerdi, str):
+        return vaerdi
+    try:
+        if vaerdi != vaerdi:
+            return None
+        sekunder = int(round(vaerdi))
+    except (TypeError, ValueError):
+        return vaerdi
+    return f"{sekunder // 3600:02d}:{sekunder % 3600 // 60:02d}:{sekunder % 60:02d}"
+
+
+def fast_kolonnetype(kolonne):
+    """Returnerer den faste type for en kolonne, eller None hvis typen skal udledes af data"""
+    if er_varighed(kolonne):
+        return 'INTEGER'
+    if kolonne in TEKST_KOLONNER:
+        return 'TEXT'
+    if kolonne in TIDSSTEMPEL_KOLONNER:
+        return 'TIMESTAMP'
+    return None
+
+
+def opret_indekser(conn, tabel):
+    """Opretter indekser på Chauffør og Kørestrækning hvis kolonnerne findes"""
+    kolonner = {row[1] for row in conn.execute(f'PRAGMA table_info("{tabel}")')}
+    for kolonne in INDEKS_KOLONNER:
+        if kolonne in kolonner:
+            navn = 'idx_' + ''.join(c if c.isalnum() else '_' for c in f"{tabel}_{kolonne}").lower()
+            conn.execute(f'CREATE INDEX IF NOT EXISTS "{navn}" ON "{tabel}" ("{kolonne}")')
+
+
+def _er_tal_tekst(vaerdi):
+    try:
+        float(str(vaerdi).strip().replace(',', '.'))
+        return True
+    except ValueError:
+        return False
+
+
+def migrer_maanedsdatabase(db_sti, tabel='chauffør_data_data'):
+    """
+    Konverterer en eksisterende månedsdatabase til det typede skema på stedet.
+
+    Varigheder konverteres fra 'tt:mm:ss' til heltal sekunder, talkolonner gemt som
+    tekst konverteres til REAL, og der oprettes indekser. Databaser der allerede har
+    den aktuelle skemaversion springes over uden at blive ændret.
+
+    Returns:
+        bool: True hvis databasen blev migreret
+    """
+    conn = sqlite3.connect(db_sti)
+    try:
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= SKEMA_VERSION:
+            return False
+
+        skema = conn.execute(f'PRAGMA table_info("{tabel}")').fetchall()
+        if not skema:
+            return False
+
+        kolonner = [row[1] for row in skema]
+        gamle_typer = [(row[2] or '').upper() for row in skema]
+        kolonne_liste = ', '.join(f'"{k}"' for k in kolonner)
+        raekker = conn.execute(f'SELECT {kolonne_liste} FROM "{tabel}"').fetchall()
+
+        # Bestem nye typer: faste typer efter navn, ellers REAL hvis alle værdier er tal
+        nye_typer = []
+        for i, (kolonne, gammel_type) in enumerate(zip(kolonner, gamle_typer)):
+            fast_type = fast_kolonnetype(kolonne)
+            if fast_type:
+                nye_typer.append(fast_type)
+            elif gammel_type in ('REAL', 'INTEGER', 'TIMESTAMP'):
+                nye_typer.append(gammel_type)
+            elif all(r[i] is None or _er_tal_tekst(r[i]) for r in raekker):
+                nye_typer.append('REAL')
+            else:
+                nye_typer.append('TEXT')
+
+        konverterede = []
+        for raekke in raekker:
+            ny_raekke = []
+            for vaerdi, ny_type in zip(raekke, nye_typer):
+                if vaerdi is None:
+                    ny_raekke.append(None)
+                elif ny_type == 'INTEGER':
+                    ny_raekke.append(tid_til_sekunder(vaerdi))
+                elif ny_type == 'REAL' and isinstance(vaerdi, str):
+                    ny_raekke.append(float(vaerdi.strip().replace(',', '.')) if vaerdi.strip() else None)
+                else:
+                    ny_raekke.append(vaerdi)
+            konverterede.append(ny_raekke)
+
+        ny_tabel = f"{tabel}_migrering"
+        kolonne_sql = ',\n  '.join(f'"{k}" {t}' for k, t in zip(kolonner, nye_typer))
+        with conn:
+            conn.execute('BEGIN')
+            conn.execute(f'DROP TABLE IF EXISTS "{ny_tabel}"')
+            conn.execute(f'CREATE TABLE "{ny_tabel}" (\n  {kolonne_sql}\n)')
+            conn.executemany(
+                f'INSERT INTO "{ny_tabel}" VALUES ({", ".join("?" * len(kolonner))})',
+                konverterede
+            )
+            conn.execute(f'DROP TABLE "{tabel}"')
+            conn.execute(f'ALTER TABLE "{ny_tabel}" RENAME TO "{tabel}"')
+            opret_indekser(conn, tabel)
+            conn.execute(f'PRAGMA user_version = {SKEMA_VERSION}')
+
+        logging.info(f"Migreret {os.path.basename(db_sti)} til typet skema ({len(raekker)} rækker)")
+        return True
+    finally:
+        conn.close()
+
+
+def migrer_alle_maanedsdatabaser(database_mappe='databases'):
+    """Migrerer alle månedlige chauffør databaser der endnu ikke har det typede skema"""
+    if not os.path.exists(database_mappe):
+        return 0
+
+    antal = 0
+    for fil in sorted(os.listdir(database_mappe)):
+        if not (fil.startswith('chauffør_data_') and fil.endswith('.db')):
+            continue
+        try:
+            if migrer_maanedsdatabase(os.path.join(database_mappe, fil)):
+                antal += 1
+        except Exception as e:
+            logging.error(f"Fejl ved migrering af {fil}: {str(e)}")
+    if antal:
+        logging.info(f"Migreret {antal} månedsdatabaser til typet skema")
+    return antal
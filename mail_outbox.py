@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+from datetime import datetime, timedelta
+
+# Outboxen ligger i settings.db; de færdigbyggede beskeder gemmes som filer ved siden af
+OUTBOX_DB = os.path.join('databases', 'settings.db')
+VEDHAEFTNING_MAPPE = os.path.join('databases', 'mail_outbox')
+
+# Exponentiel backoff pr. besked: BACKOFF_START * 2^(forsøg-1), højst BACKOFF_MAX sekunder
+BACKOFF_START = 30
+BACKOFF_MAX = 3600
+
+# En besked der har været 'sending' længere end dette regnes som forladt (fx ved nedbrud)
+CLAIM_LEASE = 600
+
+# Sendte beskeder slettes fra udbakken når de er ældre end dette (dage)
+SENDT_OPBEVARING = 30
+
+# Tilstande en besked kan have
+VENTER = 'pending'
+SENDER = 'sending'
+SENDT = 'sent'
+FEJLET = 'failed'
+
+
+class MailOutbox:
+    """
+    Holdbar udbakke for mails i settings.db.
+
+    Hver besked gemmes før den sendes og hentes af workers med en transaktionel claim,
+    så ikke-sendte mails overlever at vinduet eller programmet lukkes. En besked der er
+    claimet men aldrig markeret (nedbrud midt i afsendelsen) kan claimes igen når
+    CLAIM_LEASE er udløbet, dvs. afsendelsen er mindst-én-gang.
+    """
+
+    def __init__(self, db_path=OUTBOX_DB, vedhaeftning_mappe=VEDHAEFTNING_MAPPE):
+        self.db_path = db_path
+        self.vedhaeftning_mappe = vedhaeftning_mappe
+        self._opret_tabel()
+
+    def _forbind(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _opret_tabel(self):
+        """Opretter mail_outbox tabellen hvis den ikke findes"""
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        conn = self._forbind()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS mail_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    message_id TEXT NOT NULL UNIQUE,
+                    recipient TEXT NOT NULL,
+                    subject TEXT NOT NULL,
+                    body TEXT NOT NULL,
+                    is_html INTEGER DEFAULT 0,
+                    driver_id TEXT,
+                    attachments TEXT,
+                    message_path TEXT NOT NULL,
+                    state TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_retry REAL NOT NULL,
+                    claimed_by TEXT,
+                    claimed_at REAL,
+                    last_error TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_mail_outbox_state_retry
+                ON mail_outbox (state, next_retry)
+            ''')
+        finally:
+            conn.close()
+
+    def _gem_besked(self, message_id, raw_message):
+        """Skriver den færdigbyggede besked atomisk til disk og returnerer stien"""
+        os.makedirs(self.vedhaeftning_mappe, exist_ok=True)
+        sti = os.path.join(self.vedhaeftning_mappe, f"{message_id}.eml")
+        midlertidig_sti = f"{sti}.tmp"
+        with open(midlertidig_sti, 'wb') as f:
+            f.write(raw_message)
+        os.replace(midlertidig_sti, sti)
+        return sti
+
+    def _slet_filer(self, message_id):
+        """Sletter beskedfilen"""
+        sti = os.path.join(self.vedhaeftning_mappe, f"{message_id}.eml")
+        if os.path.exists(sti):
+            try:
+                os.remove(sti)
+            except OSError as e:
+                logging.warning(f"Kunne ikke slette besked {sti}: {str(e)}")
+
+    def tilfoej(self, mail_data, raw_message):
+        """
+        Gemmer en mail i udbakken
+
+        Args:
+            mail_data: Dict med to, subject, body, attachments, driver_id og is_html
+            raw_message: Den færdigbyggede besked som bytes (inkl. kodede vedhæftninger)
+
+        Returns:
+            str: Beskedens message_id
+        """
+        message_id = uuid.uuid4().hex
+        message_path = self._gem_besked(message_id, raw_message)
+        # Vedhæftningerne ligger i beskedfilen; kolonnen gemmer kun deres filnavne
+        attachments = None
+        if mail_data.get('attachments'):
+            attachments = json.dumps(list(mail_data['attachments'].keys()), ensure_ascii=False)
+        conn = self._forbind()
+        try:
+            conn.execute('''
+                INSERT INTO mail_outbox (
+                    message_id, recipient, subject, body, is_html, driver_id,
+                    attachments, message_path, state, attempts, next_retry
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?)
+            ''', (
+                message_id,
+                mail_data['to'],
+                mail_data['subject'],
+                mail_data['body'],
+                1 if mail_data.get('is_html') else 0,
+                mail_data.get('driver_id'),
+                attachments,
+                message_path,
+                VENTER,
+                time.time()
+            ))
+        except Exception:
+            self._slet_filer(message_id)
+            raise
+        finally:
+            conn.close()
+        return message_id
+
+    def claim(self, worker):
+        """
+        Tager transaktionelt den næste besked der er klar til afsendelse
+
+        Returns:
+            dict: mail_data med outbox_id, message_id og attempts, eller None
+        """
+        nu = time.time()
+        conn = self._forbind()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            raekke = conn.execute('''
+                SELECT * FROM mail_outbox
+                WHERE (state = ? AND next_retry <= ?)
+                   OR (state = ? AND claimed_at <= ?)
+                ORDER BY next_retry, id
+                LIMIT 1
+            ''', (VENTER, nu, SENDER, nu - CLAIM_LEASE)).fetchone()
+            if raekke is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute('''
+                UPDATE mail_outbox
+                SET state = ?, claimed_by = ?, claimed_at = ?, updated_at = ?
+                WHERE id = ?
+            ''', (SENDER, worker, nu, datetime.now().isoformat(), raekke['id']))
+            conn.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+        with open(raekke['message_path'], 'rb') as f:
+            raw_message = f.read()
+
+        return {
+            'outbox_id': raekke['id'],
+            'message_id': raekke['message_id'],
+            'attempts': raekke['attempts'],
+            'raw_message': raw_message,
+            'to': raekke['recipient'],
+            'subject': raekke['subject'],
+            'body': raekke['body'],
+            'driver_id': raekke['driver_id'],
+            'is_html': bool(raekke['is_html'])
+        }
+
+    def marker_sendt(self, mail_data):
+        """Markerer en besked som sendt og sletter dens beskedfil"""
+        conn = self._forbind()
+        try:
+            conn.execute('''
+                UPDATE mail_outbox
+                SET state = ?, attempts = attempts + 1, last_error = NULL, updated_at = ?
+                WHERE id = ?
+            ''', (SENDT, datetime.now().isoformat(), mail_data['outbox_id']))
+        finally:
+            conn.close()
+        self._slet_filer(mail_data['message_id'])
+
+    def marker_fejl(self, mail_data, fejl, max_forsoeg):
+        """
+        Registrerer et mislykket forsøg og planlægger næste forsøg med exponentiel backoff
+
+        Returns:
+            bool: True hvis beskeden er opgivet (max_forsoeg nået)
+        """
+        forsoeg = mail_data['attempts'] + 1
+        opgivet = forsoeg >= max_forsoeg
+        ventetid = min(BACKOFF_MAX, BACKOFF_START * 2 ** (forsoeg - 1))
+        conn = self._forbind()
+        try:
+            conn.execute('''
+                UPDATE mail_outbox
+                SET state = ?, attempts = ?, next_retry = ?, last_error = ?,
+                    claimed_by = NULL, claimed_at = NULL, updated_at = ?
+                WHERE id = ?
+            ''', (
+                FEJLET if opgivet else VENTER,
+                forsoeg,
+                time.time() + ventetid,
+                str(fejl),
+                datetime.now().isoformat(),
+                mail_data['outbox_id']
+            ))
+        finally:
+            conn.close()
+        if opgivet:
+            self._slet_filer(mail_data['message_id'])
+        else:
+            logging.info(f"Nyt forsøg for mail til {mail_data['to']} om {ventetid} sekunder")
+        return opgivet
+
+    def sekunder_til_naeste(self):
+        """Sekunder til den næste ventende besked er klar, eller None hvis udbakken er tom"""
+        conn = self._forbind()
+        try:
+            naeste = conn.execute('''
+                SELECT MIN(CASE WHEN state = ? THEN next_retry ELSE claimed_at + ? END)
+                FROM mail_outbox WHERE state IN (?, ?)
+            ''', (VENTER, CLAIM_LEASE, VENTER, SENDER)).fetchone()[0]
+        finally:
+            conn.close()
+        if naeste is None:
+            return None
+        return max(0.0, naeste - time.time())
+
+    def antal_ventende(self):
+        """Antal beskeder der endnu ikke er sendt eller opgivet"""
+        conn = self._forbind()
+        try:
+            return conn.execute(
+                'SELECT COUNT(*) FROM mail_outbox WHERE state IN (?, ?)', (VENTER, SENDER)
+            ).fetchone()[0]
+        finally:
+            conn.close()
+
+    def ryd_op(self, dage=SENDT_OPBEVARING):
+        """
+        Sletter sendte beskeder ældre end dage og beskedfiler uden en ventende besked
+
+        Beskedfiler kan blive efterladt hvis programmet lukker mellem afsendelse og
+        marker_sendt, eller midt i skrivningen af en ny besked.
+
+        Returns:
+            tuple: (antal slettede rækker, antal slettede filer)
+        """
+        graense = (datetime.now() - timedelta(days=dage)).isoformat()
+        conn = self._forbind()
+        try:
+            slettede_raekker = conn.execute(
+                'DELETE FROM mail_outbox WHERE state = ? AND updated_at < ?', (SENDT, graense)
+            ).rowcount
+            aktive = {raekke['message_id'] for raekke in conn.execute(
+                'SELECT message_id FROM mail_outbox WHERE state IN (?, ?)', (VENTER, SENDER)
+            )}
+        finally:
+            conn.close()
+
+        slettede_filer = 0
+        if os.path.isdir(self.vedhaeftning_mappe):
+            for fil in os.listdir(self.vedhaeftning_mappe):
+                if not (fil.endswith('.eml') or fil.endswith('.eml.tmp')):
+                    continue
+                if fil.split('.', 1)[0] in aktive and fil.endswith('.eml'):
+                    continue
+                try:
+                    os.remove(os.path.join(self.vedhaeftning_mappe, fil))
+                    slettede_filer += 1
+                except OSError as e:
+                    logging.warning(f"Kunne ikke slette besked {fil}: {str(e)}")
+
+        if slettede_raekker or slettede_filer:
+            logging.info(f"Mail udbakke ryddet: {slettede_raekker} sendte beskeder og {slettede_filer} filer slettet")
+        return slettede_raekker, slettede_filer
@@ -0,0 +1,60 @@
+import re
+from functools import lru_cache
+
+# Variabler i mail templates skrives som {{NAVN}}
+PLADSHOLDER = re.compile(r'\{\{([^{}]+)\}\}')
+
+
+class MailSkabelon:
+    """
+    En mail template parset én gang til faste tekststykker og variabelnavne.
+
+    render() samler mailen i ét gennemløb over stykkerne i stedet for en str.replace
+    over hele teksten pr. variabel. Variabler uden værdi efterlades uændrede.
+    """
+
+    __slots__ = ('tekst', 'variabler')
+
+    def __init__(self, kilde):
+        dele = PLADSHOLDER.split(kilde)
+        self.tekst = dele[0::2]
+        self.variabler = dele[1::2]
+
+    def render(self, vaerdier):
+        """
+        Indsætter værdierne i skabelonen
+
+        Args:
+            vaerdier: Dict med variabelnavn (uden krøllede parenteser) og værdi
+
+        Returns:
+            str: Den færdige tekst
+        """
+        dele = [self.tekst[0]]
+        for navn, tekst in zip(self.variabler, self.tekst[1:]):
+            vaerdi = vaerdier.get(navn)
+            dele.append('{{' + navn + '}}' if vaerdi is None else str(vaerdi))
+            dele.append(tekst)
+        return ''.join(dele)
+
+
+@lru_cache(maxsize=128)
+def kompiler(kilde):
+    """Kompilerer en skabelontekst; samme tekst parses kun én gang"""
+    return MailSkabelon(kilde or '')
+
+
+def hent_kompileret(template):
+    """
+    Returnerer emne og brødtekst for en template som kompilerede skabeloner
+
+    Skabelonerne caches på selve teksten via kompiler(), så en gemt ændring altid
+    giver en ny skabelon.
+
+    Args:
+        template: Dict med subject og body
+
+    Returns:
+        tuple: (MailSkabelon for emne, MailSkabelon for brødtekst)
+    """
+    return kompiler(template['subject']), kompiler(template['body'])
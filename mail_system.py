@@ -8,18 +8,256 @@ import threading
 import sqlite3
 import traceback
 import re
+import copy
+import hashlib
+import asyncio
 import unicodedata
-from queue import Queue
+from queue import Queue, Empty
 from datetime import datetime
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
 from email.mime.base import MIMEBase
+from email.policy import compat32
 from email import encoders
+from concurrent.futures import ThreadPoolExecutor
 from database_connection import DatabaseConnection
+from mail_outbox import MailOutbox
+from mail_skabelon import kompiler
+
+# aiosmtplib er valgfri; uden den kører asyncio-transporten smtplib i en tråd
+try:
+    import aiosmtplib
+except ImportError:
+    aiosmtplib = None
+
+# Standardværdier for den forbindelsespuljede afsendelse
+ANTAL_MAIL_WORKERS = 3          # Samtidige SMTP sessioner
+MAILS_PR_MINUT = 30             # Serverens grænse for afsendelse
+MAIL_BURST = 5                  # Antal mails der må sendes straks efter en pause
+KEEPALIVE_INTERVAL = 60         # Sekunder en session må være inaktiv før NOOP
+STOP_DEADLINE = 30              # Sekunder stop_queue_processing venter på at køen tømmes
+CONFIG_CACHE_TID = 60           # Sekunder afsender-konfigurationen genbruges (fx i en batch)
+VEDHAEFTNING_CACHE_STOERRELSE = 16  # Antal kodede vedhæftninger der genbruges på tværs af mails
+
+# Beskeder gemmes og sendes med SMTP linjeskift
+SMTP_POLICY = compat32.clone(linesep='\r\n')
+
+# HTML for rapportmails. Skabelonerne kompileres én gang og renderes pr. chauffør
+RAPPORT_HTML = """<html>
+<head>
+    <style>
+        body { 
+            font-family: Arial, sans-serif; 
+            margin: 0; 
+            padding: 20px;
+            line-height: 1.6;
+            color: #333;
+        }
+        .header { 
+            margin-bottom: 30px;
+            border-bottom: 2px solid #1E90FF;
+            padding-bottom: 20px;
+        }
+        .greeting {
+            font-size: 18px;
+            margin-bottom: 20px;
+        }
+        .goals-container {
+            background: #f8f9fa;
+            padding: 20px;
+            border-radius: 8px;
+            margin: 20px 0;
+        }
+        .goal-item {
+            margin: 15px 0;
+            padding: 10px;
+            border-radius: 5px;
+        }
+        .goal-value {
+            font-weight: bold;
+            font-size: 18px;
+        }
+        .goal-target {
+            color: #666;
+            font-size: 14px;
+            margin-top: 5px;
+        }
+        .success {
+            color: #28a745;
+        }
+        .warning {
+            color: #dc3545;
+        }
+        .footer {
+            margin-top: 30px;
+            padding-top: 20px;
+            border-top: 1px solid #dee2e6;
+            color: #666;
+            font-size: 14px;
+        }
+        .contact-info {
+            margin-top: 20px;
+            background: #e9ecef;
+            padding: 15px;
+            border-radius: 5px;
+        }
+    </style>
+</head>
+<body>
+    <div class="header">
+        <h2 style="color: #1E90FF; margin: 0;">Fiskelogistik Rapport</h2>
+    </div>
+
+    <div class="greeting">
+        Kære {{FORNAVN}},
+    </div>
+    <p>Hermed din månedlige kørselsrapport for {{RAPPORT_PERIODE}}.</p>
+    
+    <div class="goals-container">
+        <h3 style="margin-top: 0;">Din performance på de 4 målsætninger:</h3>
+{{MAALSAETNINGER}}
+    </div>
+    
+    <p>Den komplette rapport er vedhæftet som fil, hvor du kan finde flere detaljer om din kørsel.</p>
+    
+    <div class="contact-info">
+        <strong>Har du spørgsmål til rapporten?</strong><br>
+        Kontakt venligst:<br>
+        • Susan<br>
+        • Rasmus
+    </div>
+    
+    <div class="footer">
+        <p>Med venlig hilsen<br>Fiskelogistik</p>
+    </div>
+</body></html>"""
+
+# Én målsætning i RAPPORT_HTML; indsættes som {{MAALSAETNINGER}}
+MAALSAETNING_HTML = """
+        <div class="goal-item">
+            <div>{{NAVN}}</div>
+            <div class="goal-value {{STATUS}}">{{VÆRDI}}%</div>
+            <div class="goal-target">{{MÅL}}</div>
+        </div>"""
+
+# Sentinel der lægges i køen én gang pr. worker for at stoppe den
+_STOP = object()
+
+# Fejl der betyder at sessionen er død og skal genoprettes
+if aiosmtplib:
+    SMTP_AFBRUDT = (smtplib.SMTPServerDisconnected, aiosmtplib.SMTPServerDisconnected)
+else:
+    SMTP_AFBRUDT = (smtplib.SMTPServerDisconnected,)
+
+class TokenBucket:
+    """Trådsikker token-bucket der begrænser antal afsendelser pr. sekund på tværs af workers"""
+    
+    def __init__(self, rate, kapacitet=1):
+        """
+        Args:
+            rate: Tokens pr. sekund (0 eller None betyder ingen begrænsning)
+            kapacitet: Maksimalt antal opsparede tokens (burst)
+        """
+        self.rate = rate
+        self.kapacitet = max(1, kapacitet)
+        self.tokens = float(self.kapacitet)
+        self.sidst = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def _reserver(self):
+        """Bruger et token hvis muligt. Returnerer 0, ellers ventetiden til næste token"""
+        with self.lock:
+            nu = time.monotonic()
+            self.tokens = min(self.kapacitet, self.tokens + (nu - self.sidst) * self.rate)
+            self.sidst = nu
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+    
+    def acquire(self):
+        """Venter til der er et token og bruger det"""
+        if not self.rate:
+            return
+        while True:
+            ventetid = self._reserver()
+            if not ventetid:
+                return
+            time.sleep(ventetid)
+    
+    async def acquire_async(self):
+        """Som acquire, men venter uden at blokere event loopet"""
+        if not self.rate:
+            return
+        while True:
+            ventetid = self._reserver()
+            if not ventetid:
+                return
+            await asyncio.sleep(ventetid)
+
+class AsyncSmtpSession:
+    """Asynkron SMTP session til asyncio-transporten.
+    Bruger aiosmtplib hvis den er installeret, ellers køres en smtplib session i en tråd."""
+    
+    def __init__(self, mail_system, config):
+        self.mail_system = mail_system
+        self.config = config
+        self.smtp = None
+    
+    async def connect(self):
+        if aiosmtplib:
+            port = int(self.config.get('port') or 587)
+            self.smtp = aiosmtplib.SMTP(
+                hostname=self.config['smtp_server'],
+                port=port,
+                timeout=self.mail_system.timeout,
+                use_tls=port == 465,
+                start_tls=port not in (25, 465)
+            )
+            await self.smtp.connect()
+            await self.smtp.login(self.config['email'], self.config['password'])
+        else:
+            self.smtp = await asyncio.to_thread(self.mail_system.create_smtp_connection, self.config)
+        return self
+    
+    async def send_message(self, msg):
+        if aiosmtplib:
+            await self.smtp.send_message(msg)
+        else:
+            await asyncio.to_thread(self.smtp.send_message, msg)
+    
+    async def sendmail(self, afsender, modtagere, raw_message):
+        if aiosmtplib:
+            await self.smtp.sendmail(afsender, modtagere, raw_message)
+        else:
+            await asyncio.to_thread(self.smtp.sendmail, afsender, modtagere, raw_message)
+    
+    async def noop(self):
+        """Returnerer True hvis sessionen stadig svarer"""
+        try:
+            if aiosmtplib:
+                svar = await self.smtp.noop()
+                return svar.code == 250
+            code, _ = await asyncio.to_thread(self.smtp.noop)
+            return code == 250
+        except Exception as e:
+            self.mail_system.logger.warning(f"SMTP session svarer ikke på NOOP: {str(e)}")
+            return False
+    
+    async def quit(self):
+        try:
+            if aiosmtplib:
+                await self.smtp.quit()
+            else:
+                await asyncio.to_thread(self.smtp.quit)
+        except Exception as e:
+            self.mail_system.logger.warning(f"Fejl ved lukning af SMTP forbindelse: {str(e)}")
 
 class MailSystem:
-    def __init__(self, db_connection=None, max_retries=3, timeout=30):
+    def __init__(self, db_connection=None, max_retries=3, timeout=30,
+                 antal_workers=ANTAL_MAIL_WORKERS, mails_pr_minut=MAILS_PR_MINUT,
+                 burst=MAIL_BURST, keepalive_interval=KEEPALIVE_INTERVAL, brug_asyncio=False):
         """
         Initialiserer mail-systemet med database forbindelse og mail kø
         
@@ -27,13 +265,30 @@ class MailSystem:
             db_connection: DatabaseConnection objekt
             max_retries: Maksimalt antal forsøg på at sende en mail
             timeout: Timeout i sekunder for SMTP-operationer
+            antal_workers: Antal worker-tråde der hver holder en SMTP session
+            mails_pr_minut: Samlet rate limit for alle workers (0 = ingen grænse)
+            burst: Antal mails der må sendes i træk før rate limit træder i kraft
+            keepalive_interval: Sekunder en inaktiv session må vente før NOOP
+            brug_asyncio: Send via asyncio-transporten i én event loop tråd i stedet for worker-tråde
         """
         self.db = db_connection
         self.mail_queue = Queue()
         self.queue_processing = False
         self.max_retries = max_retries
         self.timeout = timeout
-        self.queue_thread = None
+        self.antal_workers = max(1, antal_workers)
+        self.keepalive_interval = keepalive_interval
+        self.rate_limiter = TokenBucket(mails_pr_minut / 60 if mails_pr_minut else 0, burst)
+        self.queue_threads = []
+        self.brug_asyncio = brug_asyncio
+        self._antal_forbrugere = 0
+        self._afbryd = threading.Event()
+        
+        # Cache til beskedbygning: afsender-konfiguration og base64-kodede vedhæftninger
+        self._config_cache = None
+        self._config_lock = threading.Lock()
+        self._vedhaeftnings_cache = {}
+        self._vedhaeftnings_lock = threading.Lock()
         
         # Opsæt logging
         logging.basicConfig(
@@ -42,37 +297,81 @@ class MailSystem:
         )
         self.logger = logging.getLogger('MailSystem')
         
+        # Holdbar udbakke; køen bruges kun til at vække workers og til stop-sentinels.
+        # Udbakken er fælles for processen, så kun forbrugeren fra hent_mail_forbruger
+        # har workers; andre instanser bygger og gemmer mails og vækker forbrugeren
+        self.outbox = MailOutbox()
+        
+    def _er_forbruger(self):
+        return _forbruger is self
+    
+    def _genoptag(self):
+        """Rydder op i udbakken og genoptager mails der ikke blev sendt før programmet sidst lukkede"""
+        try:
+            self.outbox.ryd_op()
+        except Exception as e:
+            self.logger.error(f"Kunne ikke rydde op i mail udbakken: {str(e)}")
+        try:
+            ventende = self.outbox.antal_ventende()
+            if ventende:
+                self.logger.info(f"Genoptager {ventende} ikke-sendte mails fra udbakken")
+                self.start_queue_processing()
+        except Exception as e:
+            self.logger.error(f"Kunne ikke læse mail udbakken: {str(e)}")
+    
+    def _vaek(self, message_id):
+        """Vækker en worker og sikrer at kø-processen kører"""
+        self.mail_queue.put(message_id)
+        self.start_queue_processing()
+        
     def get_mail_config(self):
         """
         Henter mail konfiguration fra databasen
         
         Returns:
-            dict: Mail konfiguration med nøglerne email, password, smtp_server, port
+            dict: Mail konfiguration med nøglerne email, password, smtp_server, smtp_port og port
         """
         try:
+            config = None
             if self.db:
-                return self.db.get_mail_config()
+                config = self.db.get_mail_config()
             else:
-                # Fallback til direkte database adgang
-                self.logger.warning("Ingen DatabaseConnection, bruger direkte adgang til databasen")
+                # Direkte database adgang (fx udbakkens forbruger, som ikke har en DatabaseConnection)
                 with sqlite3.connect('databases/settings.db') as conn:
                     cursor = conn.cursor()
-                    cursor.execute('SELECT email, password, smtp_server, port FROM mail_config LIMIT 1')
+                    cursor.execute('SELECT email, password, smtp_server, smtp_port FROM mail_config LIMIT 1')
                     result = cursor.fetchone()
                     if result:
-                        return {
+                        config = {
                             'email': result[0],
                             'password': result[1],
                             'smtp_server': result[2],
-                            'port': int(result[3])
+                            'smtp_port': result[3]
                         }
             
-            self.logger.error("Ingen mail konfiguration fundet")
-            return None
+            if not config:
+                self.logger.error("Ingen mail konfiguration fundet")
+                return None
+            
+            # Tabellen kalder porten smtp_port; afsendelsen og valideringen bruger port
+            config['port'] = int(config['smtp_port']) if config.get('smtp_port') else None
+            return config
         except Exception as e:
             self.logger.error(f"Fejl ved hentning af mail konfiguration: {str(e)}")
             return None
     
+    def _get_cached_mail_config(self):
+        """
+        Henter mail konfigurationen højst én gang pr. CONFIG_CACHE_TID sekunder,
+        så en batch af mails ikke spørger databasen for hver besked
+        """
+        with self._config_lock:
+            if self._config_cache and time.monotonic() - self._config_cache[0] < CONFIG_CACHE_TID:
+                return self._config_cache[1]
+            config = self.get_mail_config()
+            self._config_cache = (time.monotonic(), config) if config else None
+            return config
+    
     def validate_mail_config(self):
         """
         Validerer at mail konfigurationen er komplet
@@ -127,7 +426,7 @@ class MailSystem:
         try:
             # Opret SMTP forbindelse med timeout
             # Brug standard port 587 (TLS) hvis port ikke er angivet
-            port = int(config.get('port', 587))
+            port = int(config.get('port') or 587)
             self.logger.info(f"Opretter forbindelse til {config['smtp_server']}:{port}")
             
             # Vælg SSL eller TLS baseret på port
@@ -164,145 +463,365 @@ class MailSystem:
             raise
             
     def start_queue_processing(self):
-        """Starter en baggrundsproces til at håndtere mail køen"""
-        if self.queue_processing:
-            self.logger.info("Mail kø processor kører allerede")
+        """Starter worker-tråde (eller asyncio-transporten) der blokerer på mail køen.
+        Kun udbakkens forbruger har workers; andre instanser starter forbrugeren."""
+        if not self._er_forbruger():
+            return hent_mail_forbruger().start_queue_processing()
+        
+        self.queue_threads = [t for t in self.queue_threads if t.is_alive()]
+        if self.queue_processing and self.queue_threads:
             return
             
         self.queue_processing = True
+        self._afbryd.clear()
+        self._antal_forbrugere = self.antal_workers
         
-        def process_mail_queue():
-            self.logger.info("Mail kø processor startet")
-            while self.queue_processing:
-                try:
-                    # Behandler mail køen med timeout og lukning
-                    self.process_mail_queue()
-                    # Vent lidt før næste check
-                    time.sleep(2)
-                except Exception as e:
-                    self.logger.error(f"Fejl i mail kø processor: {str(e)}")
-                    time.sleep(5)  # Længere delay efter fejl
+        if self.brug_asyncio:
+            thread = threading.Thread(target=self._run_async_workers, name="MailAsyncLoop")
+            thread.daemon = True
+            thread.start()
+            self.queue_threads = [thread]
+            self.logger.info(f"Mail kø håndtering startet med asyncio transport ({'aiosmtplib' if aiosmtplib else 'smtplib i tråd'}) og {self.antal_workers} workers")
+            return
+        
+        for i in range(self.antal_workers):
+            thread = threading.Thread(target=self.process_mail_queue, name=f"MailWorker-{i + 1}")
+            thread.daemon = True
+            thread.start()
+            self.queue_threads.append(thread)
+        self.logger.info(f"Mail kø håndtering startet med {len(self.queue_threads)} workers")
+        
+    def stop_queue_processing(self, timeout=STOP_DEADLINE):
+        """
+        Stopper mail kø processoren. Mails der er klar til afsendelse sendes først,
+        men højst i timeout sekunder; derefter stoppes workerne uden at tage flere mails.
+        Mails der ikke nåede at blive sendt bliver i udbakken til næste start.
+        
+        Returns:
+            int: Antal mails der stadig venter i udbakken
+        """
+        if not self._er_forbruger():
+            if _forbruger is None:
+                return self.outbox.antal_ventende()
+            return _forbruger.stop_queue_processing(timeout)
+        
+        if self.queue_processing:
+            self.queue_processing = False
+            
+            # Én sentinel pr. worker lægges bag vækkesignalerne, så klare mails sendes først
+            for _ in range(self._antal_forbrugere):
+                self.mail_queue.put(_STOP)
             
+            deadline = time.monotonic() + timeout
+            for thread in self.queue_threads:
+                thread.join(timeout=max(0, deadline - time.monotonic()))
+            
+            if any(thread.is_alive() for thread in self.queue_threads):
+                # Deadline overskredet: workers stopper efter den mail de er i gang med
+                self._afbryd.set()
+                self.logger.warning(f"Mail kø ikke tømt inden for {timeout} sekunder - stopper workers")
+                for thread in self.queue_threads:
+                    thread.join(timeout=self.timeout)
+            
+            self.queue_threads = []
             self.logger.info("Mail kø processor stoppet")
-                
-        # Start tråd hvis den ikke kører
-        if not self.queue_thread or not self.queue_thread.is_alive():
-            self.queue_thread = threading.Thread(target=process_mail_queue)
-            self.queue_thread.daemon = True
-            self.queue_thread.start()
-            self.logger.info("Mail kø håndteringstråd startet")
         
-    def stop_queue_processing(self):
-        """Stopper mail kø processoren"""
-        self.queue_processing = False
-        if self.queue_thread and self.queue_thread.is_alive():
-            self.logger.info("Stopper mail kø processor...")
-            self.queue_thread.join(timeout=5)
-            self.logger.info("Mail kø processor stoppet")
+        try:
+            resterende = self.outbox.antal_ventende()
+        except Exception as e:
+            self.logger.error(f"Kunne ikke læse mail udbakken: {str(e)}")
+            return 0
+        if resterende:
+            self.logger.warning(f"{resterende} mails venter stadig i udbakken")
+        return resterende
     
-    def process_mail_queue(self):
-        """Processor mail køen og sender ventende mails"""
-        if self.mail_queue.empty():
+    def _hent_naeste(self, har_session, last_used):
+        """
+        Blokerer på køen til der kommer et vækkesignal eller en sentinel.
+        Returnerer None når en åben session skal have NOOP eller en planlagt retry er klar.
+        """
+        timeouts = []
+        if har_session:
+            timeouts.append(self.keepalive_interval - (time.monotonic() - last_used))
+        try:
+            naeste_retry = self.outbox.sekunder_til_naeste()
+        except Exception as e:
+            self.logger.error(f"Kunne ikke læse mail udbakken: {str(e)}")
+            naeste_retry = 5
+        if naeste_retry is not None:
+            timeouts.append(naeste_retry)
+        
+        if not timeouts:
+            return self.mail_queue.get()
+        try:
+            return self.mail_queue.get(timeout=max(min(timeouts), 0.01))
+        except Empty:
+            return None
+    
+    def _claim(self, name):
+        """Tager næste klare mail fra udbakken, eller None"""
+        try:
+            return self.outbox.claim(name)
+        except Exception as e:
+            self.logger.error(f"Kunne ikke hente mail fra udbakken: {str(e)}")
+            return None
+    
+    def _registrer_sendt(self, mail_data):
+        """Markerer mailen som sendt i udbakken og logger den for chaufføren"""
+        self.logger.info(f"Mail sendt til {mail_data['to']}")
+        try:
+            self.outbox.marker_sendt(mail_data)
+        except Exception as e:
+            self.logger.error(f"Kunne ikke markere mail som sendt i udbakken: {str(e)}")
+        if mail_data.get('driver_id'):
+            self._log_mail_sent(mail_data['driver_id'])
+    
+    def _registrer_fejl(self, mail_data, fejl):
+        """Registrerer et mislykket forsøg; udbakken planlægger næste forsøg med backoff"""
+        self.logger.error(f"Fejl ved afsendelse af mail til {mail_data['to']} (forsøg {mail_data['attempts'] + 1}): {str(fejl)}")
+        try:
+            opgivet = self.outbox.marker_fejl(mail_data, fejl, self.max_retries)
+        except Exception as e:
+            self.logger.error(f"Kunne ikke registrere mail fejl i udbakken: {str(e)}")
             return
-            
-        self.logger.info(f"Behandler mail kø ({self.mail_queue.qsize()} mails)")
+        if opgivet:
+            self.logger.error(f"Opgiver at sende mail til {mail_data['to']} efter {self.max_retries} forsøg")
+            if mail_data.get('driver_id'):
+                self._log_mail_error(mail_data['driver_id'], str(fejl))
+    
+    def _close_smtp(self, smtp):
+        """Lukker en SMTP session uden at fejle"""
+        try:
+            smtp.quit()
+        except Exception as e:
+            self.logger.warning(f"Fejl ved lukning af SMTP forbindelse: {str(e)}")
+    
+    def _keepalive(self, smtp):
+        """Sender NOOP på en inaktiv session. Returnerer sessionen, eller None hvis den er død"""
+        try:
+            code, _ = smtp.noop()
+            if code == 250:
+                return smtp
+            self.logger.warning(f"NOOP afvist med kode {code} - forbinder igen ved næste mail")
+        except Exception as e:
+            self.logger.warning(f"SMTP session svarer ikke på NOOP: {str(e)}")
+        self._close_smtp(smtp)
+        return None
+    
+    def process_mail_queue(self):
+        """
+        Worker-løkke: claimer mails fra udbakken og sender dem over en genbrugt SMTP
+        session. Når udbakken er tom blokeres der på køen til send_mail vækker workeren,
+        en planlagt retry er klar, eller sessionen skal have NOOP. Løkken stopper på en
+        _STOP sentinel.
+        """
+        name = threading.current_thread().name
+        self.logger.info(f"{name} startet")
+        smtp = None
+        config = None
+        last_used = time.monotonic()
         
         try:
-            # Opret en enkelt forbindelse til alle mails i køen
-            config = self.get_mail_config()
-            if not config:
-                self.logger.error("Kunne ikke sende mails: Ingen konfiguration")
-                return
+            while not self._afbryd.is_set():
+                mail_data = self._claim(name)
+                if mail_data is None:
+                    signal = self._hent_naeste(smtp is not None, last_used)
+                    if signal is _STOP:
+                        self.mail_queue.task_done()
+                        break
+                    if signal is not None:
+                        self.mail_queue.task_done()
+                    elif smtp and time.monotonic() - last_used >= self.keepalive_interval:
+                        # Hold sessionen i live mens udbakken er tom
+                        smtp = self._keepalive(smtp)
+                        last_used = time.monotonic()
+                    continue
                 
-            # Opret SMTP forbindelse
-            smtp = self.create_smtp_connection(config)
-            
-            try:
-                # Proces køen
-                while not self.mail_queue.empty():
-                    mail_data = self.mail_queue.get()
-                    
-                    attempts = 0
-                    while attempts < self.max_retries:
-                        try:
-                            # Send mailen
-                            self.logger.info(f"Sender mail til {mail_data['to']}")
-                            
-                            # Brug MIMEMultipart hvis der er vedhæftninger
-                            if mail_data.get('attachments'):
-                                msg = self._create_mime_message(mail_data)
-                                smtp.send_message(msg)
-                            else:
-                                # Simpel mail uden vedhæftninger
-                                smtp.sendmail(
-                                    config['email'],
-                                    mail_data['to'],
-                                    f"From: {config['email']}\r\n"
-                                    f"To: {mail_data['to']}\r\n"
-                                    f"Subject: {mail_data['subject']}\r\n"
-                                    f"Content-Type: {'text/html; charset=utf-8' if mail_data.get('is_html', False) else 'text/plain; charset=utf-8'}\r\n\r\n"
-                                    f"{mail_data['body']}"
-                                )
-                                
-                            self.logger.info(f"Mail sendt til {mail_data['to']}")
-                            
-                            # Log succes hvis driver_id er angivet
-                            if 'driver_id' in mail_data:
-                                self._log_mail_sent(mail_data['driver_id'])
-                                
-                            # Bryd løkken hvis det lykkedes
-                            break
-                            
-                        except smtplib.SMTPServerDisconnected:
-                            # Server disconnection - forsøg at genoprette forbindelsen
-                            self.logger.warning(f"SMTP server forbindelse afbrudt. Forsøger at genoprette ({attempts+1}/{self.max_retries})")
-                            attempts += 1
-                            try:
-                                # Genopret forbindelse
-                                smtp = self.create_smtp_connection(config)
-                                time.sleep(5)  # Vent 5 sekunder før genoprettelse
-                            except Exception as conn_error:
-                                self.logger.error(f"Fejl ved genoprettelse af SMTP forbindelse: {str(conn_error)}")
-                            
-                        except smtplib.SMTPSenderRefused:
-                            # Server afviser afsender - muligvis for mange mails for hurtigt
-                            self.logger.warning("SMTP server afviser afsender - venter længere mellem forsøg")
-                            attempts += 1
-                            time.sleep(10)  # Længere ventetid ved afsenderafvisning
-                            
-                        except Exception as e:
-                            attempts += 1
-                            self.logger.error(f"Fejl ved afsendelse af mail (forsøg {attempts}): {str(e)}")
-                            if attempts >= self.max_retries:
-                                self.logger.error(f"Opgiver at sende mail til {mail_data['to']} efter {self.max_retries} forsøg")
-                                # Log fejl hvis driver_id er angivet
-                                if 'driver_id' in mail_data:
-                                    self._log_mail_error(mail_data['driver_id'], str(e))
-                            else:
-                                # Vent før næste forsøg - længere ventetid mellem hver forsøg
-                                time.sleep(2 * attempts)  # Stigende ventetid for hvert forsøg
-                                
-                    # Markér mail som håndteret
-                    self.mail_queue.task_done()
+                try:
+                    if smtp is None:
+                        config = self._get_cached_mail_config()
+                        if not config:
+                            self._registrer_fejl(mail_data, "Ingen mail konfiguration")
+                            continue
+                    elif time.monotonic() - last_used >= self.keepalive_interval:
+                        smtp = self._keepalive(smtp)
                     
-                    # Tilføj en kort pause mellem hver mail i køen for at undgå rate limiting
-                    time.sleep(1)  # 1 sekunds pause mellem hver mail
+                    smtp = self._send_mail_data(smtp, config, mail_data)
+                    last_used = time.monotonic()
                     
-            finally:
-                # Luk SMTP forbindelsen
-                try:
-                    smtp.quit()
                 except Exception as e:
-                    self.logger.warning(f"Fejl ved lukning af SMTP forbindelse: {str(e)}")
+                    self.logger.error(f"Fejl i {name}: {str(e)}")
+                    self.logger.error(traceback.format_exc())
+                    self._registrer_fejl(mail_data, e)
+        finally:
+            # Luk SMTP forbindelsen
+            if smtp:
+                self._close_smtp(smtp)
+            self.logger.info(f"{name} stoppet")
+    
+    def _send_mail_data(self, smtp, config, mail_data):
+        """
+        Sender én claimet mail over workerens session. En død genbrugt session
+        genoprettes én gang med det samme; andre fejl registreres i udbakken,
+        som planlægger næste forsøg, så workeren ikke blokeres af ventetid.
+        
+        Returns:
+            Den session der skal genbruges til næste mail (None hvis den er lukket)
+        """
+        fejl = None
+        for _ in range(2):
+            try:
+                if smtp is None:
+                    smtp = self.create_smtp_connection(config)
+                
+                # Vent på et token så samlet afsendelse holder sig under serverens grænse
+                self.rate_limiter.acquire()
                 
+                # Send mailen
+                self.logger.info(f"Sender mail til {mail_data['to']}")
+                
+                # Beskeden er bygget da den blev lagt i udbakken og sendes som den er
+                smtp.sendmail(config['email'], [mail_data['to']], self._hent_raw_message(mail_data, config))
+                
+                self._registrer_sendt(mail_data)
+                return smtp
+                
+            except smtplib.SMTPServerDisconnected as e:
+                # Server disconnection - genopret forbindelsen og prøv igen
+                self.logger.warning(f"SMTP server forbindelse afbrudt: {str(e)}")
+                smtp = None
+                fejl = e
+                
+            except Exception as e:
+                fejl = e
+                break
+        
+        self._registrer_fejl(mail_data, fejl)
+        return smtp
+    
+    def _run_async_workers(self):
+        """Kører asyncio-transporten i sin egen tråd med en event loop"""
+        try:
+            asyncio.run(self._async_main())
         except Exception as e:
-            self.logger.error(f"Fejl ved behandling af mail kø: {str(e)}")
+            self.logger.error(f"Fejl i asyncio mail transport: {str(e)}")
             self.logger.error(traceback.format_exc())
     
-    def _create_mime_message(self, mail_data):
+    async def _async_main(self):
+        # Ventetiden på køen blokerer en tråd pr. worker, så de får deres egen pulje
+        with ThreadPoolExecutor(max_workers=self.antal_workers, thread_name_prefix="MailKoe") as koe_pulje:
+            await asyncio.gather(*(
+                self._async_worker(f"MailAsyncWorker-{i + 1}", koe_pulje)
+                for i in range(self.antal_workers)
+            ))
+    
+    async def _async_worker(self, name, koe_pulje):
+        """Asynkron udgave af process_mail_queue med samme udbakke, kø, sentinels og keepalive"""
+        loop = asyncio.get_running_loop()
+        self.logger.info(f"{name} startet")
+        session = None
+        config = None
+        last_used = time.monotonic()
+        
+        try:
+            while not self._afbryd.is_set():
+                mail_data = await loop.run_in_executor(koe_pulje, self._claim, name)
+                if mail_data is None:
+                    signal = await loop.run_in_executor(koe_pulje, self._hent_naeste, session is not None, last_used)
+                    if signal is _STOP:
+                        self.mail_queue.task_done()
+                        break
+                    if signal is not None:
+                        self.mail_queue.task_done()
+                    elif session and time.monotonic() - last_used >= self.keepalive_interval:
+                        # Hold sessionen i live mens udbakken er tom
+                        if not await session.noop():
+                            await session.quit()
+                            session = None
+                        last_used = time.monotonic()
+                    continue
+                
+                try:
+                    if session is None:
+                        config = self._get_cached_mail_config()
+                        if not config:
+                            self._registrer_fejl(mail_data, "Ingen mail konfiguration")
+                            continue
+                    elif time.monotonic() - last_used >= self.keepalive_interval and not await session.noop():
+                        await session.quit()
+                        session = None
+                    
+                    session = await self._send_mail_data_async(session, config, mail_data)
+                    last_used = time.monotonic()
+                    
+                except Exception as e:
+                    self.logger.error(f"Fejl i {name}: {str(e)}")
+                    self.logger.error(traceback.format_exc())
+                    self._registrer_fejl(mail_data, e)
+        finally:
+            if session:
+                await session.quit()
+            self.logger.info(f"{name} stoppet")
+    
+    async def _send_mail_data_async(self, session, config, mail_data):
+        """Asynkron udgave af _send_mail_data"""
+        fejl = None
+        for _ in range(2):
+            try:
+                if session is None:
+                    session = await AsyncSmtpSession(self, config).connect()
+                
+                await self.rate_limiter.acquire_async()
+                
+                self.logger.info(f"Sender mail til {mail_data['to']}")
+                await session.sendmail(config['email'], [mail_data['to']], self._hent_raw_message(mail_data, config))
+                
+                self._registrer_sendt(mail_data)
+                return session
+                
+            except SMTP_AFBRUDT as e:
+                self.logger.warning(f"SMTP server forbindelse afbrudt: {str(e)}")
+                session = None
+                fejl = e
+                
+            except Exception as e:
+                fejl = e
+                break
+        
+        self._registrer_fejl(mail_data, fejl)
+        return session
+    
+    def _build_message(self, mail_data, config=None):
+        """
+        Bygger den færdige besked for en mail: MIMEText uden vedhæftninger,
+        ellers MIMEMultipart med vedhæftningerne
+        """
+        if mail_data.get('attachments'):
+            return self._create_mime_message(mail_data, config)
+        if config is None:
+            config = self._get_cached_mail_config()
+        msg = MIMEText(mail_data['body'], 'html' if mail_data.get('is_html', False) else 'plain', 'utf-8')
+        msg['From'] = config['email']
+        msg['To'] = mail_data['to']
+        msg['Subject'] = mail_data['subject']
+        return msg
+    
+    def _message_bytes(self, msg):
+        """Serialiserer en bygget besked som bytes klar til SMTP DATA"""
+        return msg.as_bytes(policy=SMTP_POLICY)
+    
+    def _hent_raw_message(self, mail_data, config):
+        """Returnerer den færdigbyggede besked fra udbakken, eller bygger den hvis den mangler"""
+        if mail_data.get('raw_message'):
+            return mail_data['raw_message']
+        return self._message_bytes(self._build_message(mail_data, config))
+    
+    def _create_mime_message(self, mail_data, config=None):
         """Opret et MIME besked objekt med vedhæftninger"""
+        if config is None:
+            config = self._get_cached_mail_config()
         msg = MIMEMultipart()
-        msg['From'] = self.get_mail_config()['email']
+        msg['From'] = config['email']
         msg['To'] = mail_data['to']
         msg['Subject'] = mail_data['subject']
         
@@ -330,6 +849,14 @@ class MailSystem:
             filename: Filnavn til vedhæftningen
         """
         try:
+            # Samme fil til flere modtagere base64-kodes kun én gang
+            noegle = (filename, hashlib.sha1(file_data).hexdigest())
+            with self._vedhaeftnings_lock:
+                part = self._vedhaeftnings_cache.get(noegle)
+            if part is not None:
+                msg.attach(copy.deepcopy(part))
+                return True
+            
             # Bestem MIME-type baseret på filudvidelse
             extension = os.path.splitext(filename)[1].lower()
             
@@ -351,8 +878,14 @@ class MailSystem:
             # Tilføj header
             part.add_header('Content-Disposition', 'attachment', filename=safe_filename)
             
+            # Gem den kodede del til genbrug; workerne deler cachen
+            with self._vedhaeftnings_lock:
+                if len(self._vedhaeftnings_cache) >= VEDHAEFTNING_CACHE_STOERRELSE:
+                    self._vedhaeftnings_cache.clear()
+                self._vedhaeftnings_cache[noegle] = part
+            
             # Vedhæft til beskeden
-            msg.attach(part)
+            msg.attach(copy.deepcopy(part))
             self.logger.info(f"Fil vedhæftet: {safe_filename} ({len(file_data)} bytes)")
             return True
             
@@ -388,36 +921,34 @@ class MailSystem:
     def _log_mail_sent(self, driver_id):
         """Logger en vellykket mail-afsendelse i databasen"""
         try:
-            if self.db:
-                with sqlite3.connect('databases/settings.db') as conn:
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        'INSERT INTO mail_log (driver_id, timestamp, status, message) VALUES (?, ?, ?, ?)',
-                        (driver_id, datetime.now().isoformat(), 'success', 'Mail sendt succesfuldt')
-                    )
-                    conn.commit()
-                    self.logger.info(f"Mail succes logget for chauffør {driver_id}")
+            with sqlite3.connect('databases/settings.db') as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    'INSERT INTO mail_log (driver_id, timestamp, status, message) VALUES (?, ?, ?, ?)',
+                    (driver_id, datetime.now().isoformat(), 'success', 'Mail sendt succesfuldt')
+                )
+                conn.commit()
+                self.logger.info(f"Mail succes logget for chauffør {driver_id}")
         except Exception as e:
             self.logger.error(f"Kunne ikke logge mail succes: {str(e)}")
     
     def _log_mail_error(self, driver_id, error_message):
         """Logger en fejlet mail-afsendelse i databasen"""
         try:
-            if self.db:
-                with sqlite3.connect('databases/settings.db') as conn:
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        'INSERT INTO mail_log (driver_id, timestamp, status, message) VALUES (?, ?, ?, ?)',
-                        (driver_id, datetime.now().isoformat(), 'error', error_message)
-                    )
-                    conn.commit()
-                    self.logger.info(f"Mail fejl logget for chauffør {driver_id}")
+            with sqlite3.connect('databases/settings.db') as conn:
+                cursor = conn.cursor()
+                cursor.execute(
+                    'INSERT INTO mail_log (driver_id, timestamp, status, message) VALUES (?, ?, ?, ?)',
+                    (driver_id, datetime.now().isoformat(), 'error', error_message)
+                )
+                conn.commit()
+                self.logger.info(f"Mail fejl logget for chauffør {driver_id}")
         except Exception as e:
             self.logger.error(f"Kunne ikke logge mail fejl: {str(e)}")
     
     def send_mail(self, to, subject, body, attachments=None, driver_id=None, is_html=False):
         """
-        Tilføjer en mail til sendekøen
+        Tilføjer en mail til udbakken og vækker afsendelsen
         
         Args:
             to: Modtagerens email
@@ -428,7 +959,7 @@ class MailSystem:
             is_html: True hvis body er HTML
             
         Returns:
-            bool: True hvis mail blev tilføjet til køen
+            bool: True hvis mail blev tilføjet til udbakken
         """
         try:
             # Validér input
@@ -440,20 +971,30 @@ class MailSystem:
                 self.logger.error("Emne eller brødtekst mangler")
                 raise ValueError("Emne eller brødtekst mangler")
                 
-            # Tilføj til køen
-            self.mail_queue.put({
+            config = self._get_cached_mail_config()
+            if not config:
+                self.logger.error("Kunne ikke bygge mail: Ingen konfiguration")
+                raise ValueError("Ingen mail konfiguration fundet")
+            
+            mail_data = {
                 'to': to,
                 'subject': subject,
                 'body': body,
                 'attachments': attachments,
                 'driver_id': driver_id,
                 'is_html': is_html
-            })
+            }
+            
+            # Byg den færdige besked nu, så afsendelsen kun skal skrive bytes til serveren
+            raw_message = self._message_bytes(self._build_message(mail_data, config))
+            
+            # Gem i udbakken før afsendelse, så mailen overlever at programmet lukkes
+            message_id = self.outbox.tilfoej(mail_data, raw_message)
             
-            self.logger.info(f"Mail til {to} tilføjet til sendekøen")
+            self.logger.info(f"Mail til {to} tilføjet til udbakken ({message_id})")
             
-            # Sikr at kø-processen kører
-            self.start_queue_processing()
+            # Væk en worker hos udbakkens forbruger
+            hent_mail_forbruger()._vaek(message_id)
             
             return True
             
@@ -479,6 +1020,10 @@ class MailSystem:
         success_count = 0
         error_count = 0
         
+        # Konfigurationen hentes én gang for hele batchen, og vedhæftningerne
+        # kodes kun ved første modtager (se _attach_file_data)
+        self._get_cached_mail_config()
+        
         for recipient in recipients:
             try:
                 if self.send_mail(recipient, subject, body, attachments, is_html=is_html):
@@ -758,84 +1303,6 @@ class MailSystem:
             # Udtræk fornavn fra det fulde navn
             fornavn = self._get_first_name(driver_name)
 
-            # Opret HTML header og styling
-            html_header = f"""<html>
-<head>
-    <style>
-        body {{ 
-            font-family: Arial, sans-serif; 
-            margin: 0; 
-            padding: 20px;
-            line-height: 1.6;
-            color: #333;
-        }}
-        .header {{ 
-            margin-bottom: 30px;
-            border-bottom: 2px solid #1E90FF;
-            padding-bottom: 20px;
-        }}
-        .greeting {{
-            font-size: 18px;
-            margin-bottom: 20px;
-        }}
-        .goals-container {{
-            background: #f8f9fa;
-            padding: 20px;
-            border-radius: 8px;
-            margin: 20px 0;
-        }}
-        .goal-item {{
-            margin: 15px 0;
-            padding: 10px;
-            border-radius: 5px;
-        }}
-        .goal-value {{
-            font-weight: bold;
-            font-size: 18px;
-        }}
-        .goal-target {{
-            color: #666;
-            font-size: 14px;
-            margin-top: 5px;
-        }}
-        .success {{
-            color: #28a745;
-        }}
-        .warning {{
-            color: #dc3545;
-        }}
-        .footer {{
-            margin-top: 30px;
-            padding-top: 20px;
-            border-top: 1px solid #dee2e6;
-            color: #666;
-            font-size: 14px;
-        }}
-        .contact-info {{
-            margin-top: 20px;
-            background: #e9ecef;
-            padding: 15px;
-            border-radius: 5px;
-        }}
-    </style>
-</head>
-<body>
-    <div class="header">
-        <h2 style="color: #1E90FF; margin: 0;">Fiskelogistik Rapport</h2>
-    </div>
-"""
-
-            # Opret personlig hilsen med fornavn
-            html_body = f"""
-    <div class="greeting">
-        Kære {fornavn},
-    </div>
-    <p>Hermed din månedlige kørselsrapport for {statistik.get('date', 'denne periode')}.</p>
-    
-    <div class="goals-container">
-        <h3 style="margin-top: 0;">Din performance på de 4 målsætninger:</h3>
-"""
-            
             # Definer målsætninger og tjek om de er opfyldt
             # Brug værdier fra statistik, eller standardværdier hvis ikke tilgængelige
             goals = {
@@ -869,37 +1336,23 @@ class MailSystem:
                 }
             }
 
-            # Tilføj hver målsætning til HTML
-            for name, goal in goals.items():
-                status_class = 'success' if goal['success'] else 'warning'
-                html_body += f"""
-        <div class="goal-item">
-            <div>{name}</div>
-            <div class="goal-value {status_class}">{goal['value']:.1f}%</div>
-            <div class="goal-target">{goal['text']}</div>
-        </div>"""
-
-            # Tilføj afsluttende tekst og kontaktinformation
-            html_body += f"""
-    </div>
-    
-    <p>Den komplette rapport er vedhæftet som fil, hvor du kan finde flere detaljer om din kørsel.</p>
-    
-    <div class="contact-info">
-        <strong>Har du spørgsmål til rapporten?</strong><br>
-        Kontakt venligst:<br>
-        • Susan<br>
-        • Rasmus
-    </div>
-    
-    <div class="footer">
-        <p>Med venlig hilsen<br>Fiskelogistik</p>
-    </div>
-"""
-
-            html_footer = "</body></html>"
+            # Render hver målsætning og indsæt dem i rapporten
+            maalsaetning = kompiler(MAALSAETNING_HTML)
+            maalsaetninger = ''.join(
+                maalsaetning.render({
+                    'NAVN': name,
+                    'STATUS': 'success' if goal['success'] else 'warning',
+                    'VÆRDI': f"{goal['value']:.1f}",
+                    'MÅL': goal['text']
+                })
+                for name, goal in goals.items()
+            )
 
-            return html_header + html_body + html_footer
+            return kompiler(RAPPORT_HTML).render({
+                'FORNAVN': fornavn,
+                'RAPPORT_PERIODE': statistik.get('date', 'denne periode'),
+                'MAALSAETNINGER': maalsaetninger
+            })
             
         except Exception as e:
             self.logger.error(f"Fejl ved generering af HTML rapport: {str(e)}")
@@ -915,4 +1368,25 @@ class MailSystem:
                 <p><small>Der opstod en fejl ved generering af rapport-indhold.</small></p>
             </body>
             </html>
-            """ 
\ No newline at end of file
+            """ 
+
+
+# Udbakkens eneste forbruger i processen (se hent_mail_forbruger)
+_forbruger = None
+_forbruger_lock = threading.Lock()
+
+
+def hent_mail_forbruger():
+    """
+    Returnerer processens eneste udbakke-forbruger og genoptager ikke-sendte mails
+    første gang. Kun den har workers, SMTP sessioner og rate limiter, så grænsen
+    gælder for hele processen.
+    """
+    global _forbruger
+    with _forbruger_lock:
+        ny = _forbruger is None
+        if ny:
+            _forbruger = MailSystem()
+    if ny:
+        _forbruger._genoptag()
+    return _forbruger
@@ -4,6 +4,7 @@ from tkinter import messagebox
 import logging
 import os
 from database_connection import DatabaseConnection
+from mail_skabelon import kompiler, hent_kompileret
 from datetime import datetime
 import json
 from email.mime.multipart import MIMEMultipart
@@ -434,22 +435,20 @@ class MailTemplateManager:
             # Få template indhold
             body = self.html_editor.get('1.0', 'end').strip()
             
-            # Erstat variabler med eksempel værdier
+            # Eksempel værdier til template variablerne
             preview_data = {
-                "{{CHAUFFØR_NAVN}}": "John Doe",
-                "{{FIRMA_NAVN}}": "Test Firma A/S",
-                "{{DATO}}": datetime.now().strftime("%d-%m-%Y"),
-                "{{RAPPORT_PERIODE}}": "Januar 2024",
-                "{{TOTAL_TURE}}": "42",
-                "{{TOTAL_DISTANCE}}": "1337",
-                "{{TOTAL_TID}}": "24",
-                "{{GNS_TUR_LÆNGDE}}": "31.8",
-                "{{GNS_TUR_TID}}": "0.57"
+                "CHAUFFØR_NAVN": "John Doe",
+                "FIRMA_NAVN": "Test Firma A/S",
+                "DATO": datetime.now().strftime("%d-%m-%Y"),
+                "RAPPORT_PERIODE": "Januar 2024",
+                "TOTAL_TURE": "42",
+                "TOTAL_DISTANCE": "1337",
+                "TOTAL_TID": "24",
+                "GNS_TUR_LÆNGDE": "31.8",
+                "GNS_TUR_TID": "0.57"
             }
             
-            preview_html = body
-            for var, value in preview_data.items():
-                preview_html = preview_html.replace(var, str(value))
+            preview_html = kompiler(body).render(preview_data)
                 
             # Gem preview til temp fil
             preview_path = os.path.join('temp', 'preview.html')
@@ -481,22 +480,20 @@ class MailTemplateManager:
             subject = self.subject_entry.get().strip()
             body = self.html_editor.get('1.0', 'end').strip()
             
-            # Erstat variabler med test værdier
+            # Test værdier til template variablerne
             test_data = {
-                "{{CHAUFFØR_NAVN}}": "Test Chauffør",
-                "{{FIRMA_NAVN}}": "Test Firma A/S",
-                "{{DATO}}": datetime.now().strftime("%d-%m-%Y"),
-                "{{RAPPORT_PERIODE}}": "Test Periode",
-                "{{TOTAL_TURE}}": "10",
-                "{{TOTAL_DISTANCE}}": "500",
-                "{{TOTAL_TID}}": "8",
-                "{{GNS_TUR_LÆNGDE}}": "50",
-                "{{GNS_TUR_TID}}": "0.8"
+                "CHAUFFØR_NAVN": "Test Chauffør",
+                "FIRMA_NAVN": "Test Firma A/S",
+                "DATO": datetime.now().strftime("%d-%m-%Y"),
+                "RAPPORT_PERIODE": "Test Periode",
+                "TOTAL_TURE": "10",
+                "TOTAL_DISTANCE": "500",
+                "TOTAL_TID": "8",
+                "GNS_TUR_LÆNGDE": "50",
+                "GNS_TUR_TID": "0.8"
             }
             
-            test_body = body
-            for var, value in test_data.items():
-                test_body = test_body.replace(var, str(value))
+            test_body = kompiler(body).render(test_data)
                 
             # Send test mail
             from mail_system import MailSystem
@@ -557,10 +554,10 @@ class MailTemplateManager:
             if not template:
                 # Fallback HTML-template
                 template = {
-                    'subject': 'Chauffør Rapport - {driver_name}',
+                    'subject': 'Chauffør Rapport - {{CHAUFFØR_NAVN}}',
                     'body': '''<html><body>
-                        <h1>Rapport for {driver_name}</h1>
-                        <p>Dato: {report_date}</p>
+                        <h1>Rapport for {{CHAUFFØR_NAVN}}</h1>
+                        <p>Dato: {{RAPPORT_PERIODE}}</p>
                         <p>Vedhæftet fil indeholder din månedlige rapport.</p>
                     </body></html>'''
                 }
@@ -572,10 +569,12 @@ class MailTemplateManager:
             
             # Opret meddelelse med korrekt MIME-typer
             msg = MIMEMultipart()
-            msg.attach(MIMEText(template['body'].format(
-                driver_name=driver_name,
-                report_date=report_date
-            ), 'html'))
+            _, broedtekst = hent_kompileret(template)
+            msg.attach(MIMEText(broedtekst.render({
+                'CHAUFFØR_NAVN': driver_name,
+                'RAPPORT_PERIODE': report_date,
+                'DATO': datetime.now().strftime("%d-%m-%Y")
+            }), 'html'))
             
             # Tilføj vedhæftning korrekt
             part = MIMEBase('application', 'octet-stream')
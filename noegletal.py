@@ -0,0 +1,118 @@
+import logging
+import numpy as np
+import pandas as pd
+
+# Nøgletal i den rækkefølge de vises i rapporter og KPI-vinduet
+KPI_NAVNE = [
+    'Tomgangsprocent',
+    'Fartpilot Andel',
+    'Motorbremse Andel',
+    'Påløbsdrift Andel',
+    'Diesel Effektivitet',
+    'Vægtkorrigeret Forbrug',
+    'Overspeed Andel',
+    'CO2 Effektivitet',
+]
+
+# RIO-kolonner som indgår i beregningerne
+MOTOR_TID = 'Motordriftstid [hh:mm:ss]'
+TOMGANG_TID = 'Tomgang / stilstandstid [hh:mm:ss]'
+FARTPILOT_KM = 'Afstand med kørehastighedsregulering (> 50 km/h) [km]'
+UDEN_FARTPILOT_KM = 'Afstand > 50 km/h uden kørehastighedsregulering [km]'
+DRIFTSBREMSE_KM = 'Driftsbremse (km) [km]'
+MOTORBREMSE_KM = 'Afstand motorbremse [km]'
+KORESTRAEKNING_KM = 'Kørestrækning [km]'
+AKTIV_PAALOB_KM = 'Aktiv påløbsdrift (km) [km]'
+PAALOB_KM = 'Afstand i påløbsdrift [km]'
+FORBRUG_L = 'Forbrug [l]'
+TOTALVAEGT_T = 'Ø totalvægt [t]'
+OVERSPEED_KM = 'Overspeed (km uden påløbsdrift) [km]'
+CO2_KG = 'CO₂-emission [kg]'
+
+
+def tid_til_sekunder(serie):
+    """Konverterer en hel kolonne med varigheder til sekunder i ét gennemløb.
+    Accepterer både heltal sekunder (typet skema) og 'tt:mm:ss' tekst fra ældre
+    databaser, også blandet. Ugyldige eller tomme værdier bliver til 0."""
+    serie = pd.Series(serie)
+    if pd.api.types.is_numeric_dtype(serie):
+        return pd.to_numeric(serie, errors='coerce').fillna(0).to_numpy(dtype=float)
+
+    # Værdier der allerede er sekunder
+    sekunder = pd.to_numeric(serie, errors='coerce')
+
+    dele = serie.astype(str).str.split(':', expand=True)
+    if dele.shape[1] == 3:
+        t = pd.to_numeric(dele[0], errors='coerce')
+        m = pd.to_numeric(dele[1], errors='coerce')
+        s = pd.to_numeric(dele[2], errors='coerce')
+        sekunder = sekunder.fillna(t * 3600 + m * 60 + s)
+    return sekunder.fillna(0).to_numpy(dtype=float)
+
+
+def _tal(df, kolonne):
+    """Henter en talkolonne som float-array; manglende kolonner og værdier giver 0"""
+    if kolonne not in df.columns:
+        return np.zeros(len(df), dtype=float)
+    return pd.to_numeric(df[kolonne], errors='coerce').fillna(0).to_numpy(dtype=float)
+
+
+def _del(taeller, naevner, gyldig=None):
+    """Vektoriseret division som giver 0 hvor nævneren er 0 eller rækken er ugyldig"""
+    if gyldig is None:
+        gyldig = naevner > 0
+    resultat = np.zeros(len(taeller), dtype=float)
+    np.divide(taeller, naevner, out=resultat, where=gyldig)
+    return resultat
+
+
+def beregn_noegletal_df(df):
+    """Beregner alle nøgletal for en hel måned (eller flere stablede måneder) på én gang.
+    Returnerer en DataFrame med samme index som df og én kolonne pr. nøgletal."""
+    if df is None or len(df) == 0:
+        return pd.DataFrame(columns=KPI_NAVNE, dtype=float)
+
+    motor_tid = tid_til_sekunder(df[MOTOR_TID]) if MOTOR_TID in df.columns else np.zeros(len(df))
+    tomgangs_tid = tid_til_sekunder(df[TOMGANG_TID]) if TOMGANG_TID in df.columns else np.zeros(len(df))
+
+    fartpilot = _tal(df, FARTPILOT_KM)
+    over_50 = fartpilot + _tal(df, UDEN_FARTPILOT_KM)
+    driftsbremse = _tal(df, DRIFTSBREMSE_KM)
+    motorbremse = _tal(df, MOTORBREMSE_KM)
+    total_bremse = driftsbremse + motorbremse
+    distance = _tal(df, KORESTRAEKNING_KM)
+    paalobsdrift = _tal(df, AKTIV_PAALOB_KM) + _tal(df, PAALOB_KM)
+    forbrug = _tal(df, FORBRUG_L)
+    vaegt = _tal(df, TOTALVAEGT_T)
+    overspeed = _tal(df, OVERSPEED_KM)
+    co2 = _tal(df, CO2_KG)
+
+    # Vægtbaserede nøgletal kræver både distance og vægt
+    vaegt_gyldig = (vaegt > 0) & (distance > 0)
+
+    noegletal = pd.DataFrame({
+        'Tomgangsprocent': _del(tomgangs_tid, motor_tid) * 100,
+        'Fartpilot Andel': _del(fartpilot, over_50) * 100,
+        'Motorbremse Andel': _del(motorbremse, total_bremse) * 100,
+        'Påløbsdrift Andel': _del(paalobsdrift, distance) * 100,
+        'Diesel Effektivitet': _del(distance, forbrug),
+        'Vægtkorrigeret Forbrug': _del(_del(forbrug, distance) * 100, vaegt, vaegt_gyldig),
+        'Overspeed Andel': _del(overspeed, distance) * 100,
+        'CO2 Effektivitet': _del(_del(co2, distance), vaegt, vaegt_gyldig),
+    }, index=df.index)
+
+    logging.debug(f"Nøgletal beregnet for {len(noegletal)} rækker")
+    return noegletal
+
+
+def beregn_noegletal_raekke(data):
+    """Beregner nøgletal for en enkelt række (dict eller Series) og returnerer et dict"""
+    df = pd.DataFrame([dict(data)])
+    return {navn: float(vaerdi) for navn, vaerdi in beregn_noegletal_df(df).iloc[0].items()}
+
+
+def gennemsnit_noegletal(df):
+    """Gennemsnit af nøgletal over alle rækker i df som dict"""
+    if df is None or len(df) == 0:
+        return {}
+    return {navn: float(vaerdi) for navn, vaerdi in beregn_noegletal_df(df).mean().items()}
@@ -0,0 +1,263 @@
+import os
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+import pandas as pd
+from noegletal import KPI_NAVNE, beregn_noegletal_df
+from datavarehus import EXCLUDE_TEXT, MAANEDS_TABEL
+from forbindelser import laese_forbindelse
+from indstillinger import hent_indstillinger
+
+# Hæves når formlerne i noegletal.py ændres, så gemte nøgletal genberegnes
+NOEGLETAL_VERSION = 1
+
+# Tabeller der gemmes ved siden af chauffør_data_data i hver månedsdatabase
+KPI_TABEL = 'driver_kpis'
+FLAADE_TABEL = 'driver_kpis_flaade'
+META_TABEL = 'driver_kpis_meta'
+
+# Om højere værdi er bedre ved rangering af hvert nøgletal
+HOEJERE_ER_BEDRE = {
+    'Tomgangsprocent': False,
+    'Fartpilot Andel': True,
+    'Motorbremse Andel': True,
+    'Påløbsdrift Andel': True,
+    'Diesel Effektivitet': True,
+    'Vægtkorrigeret Forbrug': False,
+    'Overspeed Andel': False,
+    'CO2 Effektivitet': False,
+}
+
+# Nøgletal der indgår i den samlede rangering
+SAMLET_NOEGLETAL = ['Tomgangsprocent', 'Fartpilot Andel', 'Motorbremse Andel', 'Påløbsdrift Andel']
+
+
+def rang_kolonne(noegletal):
+    """Navn på kolonnen med placeringen for et nøgletal"""
+    return f"Rang {noegletal}"
+
+
+def _er_aktuel(conn, min_km):
+    """True hvis de gemte nøgletal er beregnet med aktuel formelversion og min_km"""
+    try:
+        meta = conn.execute(f'SELECT formel_version, min_km FROM "{META_TABEL}"').fetchone()
+    except sqlite3.OperationalError:
+        return False
+    return bool(meta) and meta[0] == NOEGLETAL_VERSION and meta[1] == float(min_km)
+
+
+def _beregn_tabeller(conn, min_km):
+    """
+    Beregner nøgletal, placeringer og flådegennemsnit ud fra månedstabellen i conn.
+
+    Alle rækker får deres otte nøgletal; kvalificerede chauffører (min_km) får desuden
+    placering i hvert nøgletal og i den samlede rangering. Flådegennemsnittet er
+    gennemsnittet over alle kvalificerede rækker.
+
+    Returns:
+        tuple: (rækker til KPI_TABEL som DataFrame, [(nøgletal, gennemsnit)] til FLAADE_TABEL)
+    """
+    df = pd.read_sql_query(f'SELECT rowid AS raekke_nr, * FROM "{MAANEDS_TABEL}"', conn)
+    df = df[df['Chauffør'].notna() & ~df['Chauffør'].astype(str).str.startswith(EXCLUDE_TEXT)]
+
+    noegletal = beregn_noegletal_df(df)
+    km = pd.to_numeric(df['Kørestrækning [km]'], errors='coerce')
+    kvalificeret = (km >= float(min_km)).to_numpy()
+
+    resultat = pd.DataFrame({
+        'raekke_nr': df['raekke_nr'].to_numpy(),
+        'Chauffør': df['Chauffør'].to_numpy(),
+        'Kørestrækning [km]': km.to_numpy(),
+        'kvalificeret': kvalificeret.astype(int),
+    })
+    for navn in KPI_NAVNE:
+        resultat[navn] = noegletal[navn].to_numpy()
+
+    # Placeringer gives til første kvalificerede række pr. chauffør ligesom i rapporterne.
+    # Ved lighed vinder den første række, svarende til en stabil sortering
+    kvalificerede = resultat[kvalificeret]
+    rangerede = kvalificerede[~kvalificerede['Chauffør'].duplicated()]
+    resultat['rangeret'] = resultat.index.isin(rangerede.index).astype(int)
+    for navn in KPI_NAVNE:
+        resultat[rang_kolonne(navn)] = rangerede[navn].rank(
+            method='first', ascending=not HOEJERE_ER_BEDRE[navn]
+        )
+    resultat['samlet_score'] = resultat.loc[rangerede.index, [rang_kolonne(n) for n in SAMLET_NOEGLETAL]].sum(axis=1)
+    samlet_orden = resultat.loc[rangerede.index].sort_values(
+        ['samlet_score', 'Vægtkorrigeret Forbrug'], kind='mergesort'
+    ).index
+    resultat['samlet_placering'] = pd.Series(range(1, len(samlet_orden) + 1), index=samlet_orden)
+
+    flaade = [(navn, float(kvalificerede[navn].mean()) if len(kvalificerede) else None)
+              for navn in KPI_NAVNE]
+    return resultat, flaade
+
+
+def _skriv_tabeller(conn, resultat, flaade, min_km):
+    """Skriver de beregnede tabeller og metadata til conn i én transaktion"""
+    with conn:
+        conn.execute('BEGIN')
+        conn.execute(f'DROP TABLE IF EXISTS "{KPI_TABEL}"')
+        resultat.to_sql(KPI_TABEL, conn, index=False)
+        conn.execute(f'CREATE INDEX IF NOT EXISTS idx_driver_kpis_chauffoer ON "{KPI_TABEL}" ("Chauffør")')
+        conn.execute(f'DROP TABLE IF EXISTS "{FLAADE_TABEL}"')
+        conn.execute(f'CREATE TABLE "{FLAADE_TABEL}" (noegletal TEXT PRIMARY KEY, gennemsnit REAL)')
+        conn.executemany(f'INSERT INTO "{FLAADE_TABEL}" VALUES (?, ?)', flaade)
+        conn.execute(f'DROP TABLE IF EXISTS "{META_TABEL}"')
+        conn.execute(f'''
+            CREATE TABLE "{META_TABEL}" (
+                formel_version INTEGER NOT NULL,
+                min_km REAL NOT NULL,
+                beregnet TIMESTAMP NOT NULL
+            )
+        ''')
+        conn.execute(f'INSERT INTO "{META_TABEL}" VALUES (?, ?, ?)',
+                     (NOEGLETAL_VERSION, float(min_km), datetime.now().isoformat(sep=' ')))
+
+
+def materialiser_noegletal(db_sti, min_km):
+    """Beregner og gemmer nøgletal, placeringer og flådegennemsnit i en månedsdatabase"""
+    conn = sqlite3.connect(db_sti)
+    try:
+        resultat, flaade = _beregn_tabeller(conn, min_km)
+        _skriv_tabeller(conn, resultat, flaade, min_km)
+        logging.info(f"Nøgletal gemt for {len(resultat)} rækker i {db_sti} (min_km={min_km})")
+    finally:
+        conn.close()
+
+
+def _noegletal_forbindelse(db_sti, min_km):
+    """
+    Returnerer en forbindelse hvor de gemte tabeller kan slås op for min_km.
+
+    Opslag skriver aldrig til månedsdatabasen. Er de gemte tabeller forældede (ny
+    formel eller min_km) beregnes de i en midlertidig hukommelsesdatabase, indtil
+    genberegn_noegletal har opdateret filen.
+    """
+    conn = laese_forbindelse(db_sti)
+    if _er_aktuel(conn, min_km):
+        return conn
+    logging.debug(f"Gemte nøgletal i {db_sti} er ikke aktuelle, beregner i hukommelsen")
+    resultat, flaade = _beregn_tabeller(conn, min_km)
+    hukommelse = sqlite3.connect(':memory:')
+    _skriv_tabeller(hukommelse, resultat, flaade, min_km)
+    return hukommelse
+
+
+# Baggrundstråd der genberegner de gemte nøgletal for alle måneder
+_genberegning_traad = None
+_genberegn_igen = False
+_genberegning_lock = threading.Lock()
+
+
+def genberegn_noegletal(database_mappe='databases'):
+    """
+    Genberegner de gemte nøgletal i alle månedsdatabaser der ikke er aktuelle.
+
+    Arbejdet sker i én baggrundstråd; kaldes funktionen mens tråden kører,
+    gennemløbes databaserne igen med den nyeste min_km når den er færdig.
+    """
+    global _genberegning_traad, _genberegn_igen
+    with _genberegning_lock:
+        if _genberegning_traad is not None:
+            _genberegn_igen = True
+            return
+        _genberegning_traad = threading.Thread(
+            target=_koer_genberegning,
+            args=(database_mappe,),
+            name="noegletal-genberegning",
+            daemon=True
+        )
+        _genberegning_traad.start()
+
+
+def _koer_genberegning(database_mappe):
+    global _genberegning_traad, _genberegn_igen
+    while True:
+        min_km = hent_indstillinger().min_km
+        if os.path.exists(database_mappe):
+            for fil in sorted(os.listdir(database_mappe)):
+                if not (fil.startswith('chauffør_data_') and fil.endswith('.db')):
+                    continue
+                sti = os.path.join(database_mappe, fil)
+                try:
+                    if not _er_aktuel(laese_forbindelse(sti), min_km):
+                        materialiser_noegletal(sti, min_km)
+                except Exception as e:
+                    logging.error(f"Fejl ved genberegning af nøgletal for {fil}: {str(e)}")
+
+        with _genberegning_lock:
+            if not _genberegn_igen:
+                _genberegning_traad = None
+                return
+            _genberegn_igen = False
+
+
+def _min_km_aendret(aendringer):
+    """De gemte placeringer afhænger af min_km og genberegnes når indstillingen ændres"""
+    genberegn_noegletal()
+
+
+hent_indstillinger().abonner(_min_km_aendret, noegler=('min_km',))
+
+
+def hent_driver_noegletal(db_sti, min_km, kun_kvalificerede=True):
+    """
+    Slår chaufførernes gemte nøgletal op
+
+    Returns:
+        dict: {chauffør: {nøgletal: værdi}} i tabellens rækkefølge (første række pr. chauffør)
+    """
+    conn = _noegletal_forbindelse(db_sti, min_km)
+    kolonner = ', '.join(f'"{navn}"' for navn in KPI_NAVNE)
+    sql = f'SELECT "Chauffør", {kolonner} FROM "{KPI_TABEL}"'
+    if kun_kvalificerede:
+        sql += ' WHERE kvalificeret = 1'
+    sql += ' ORDER BY raekke_nr'
+
+    resultat = {}
+    for raekke in conn.execute(sql):
+        if raekke[0] not in resultat:
+            resultat[raekke[0]] = dict(zip(KPI_NAVNE, raekke[1:]))
+    return resultat
+
+
+def hent_flaade_noegletal(db_sti, min_km):
+    """Slår flådegennemsnittet af nøgletal for de kvalificerede chauffører op"""
+    return {
+        navn: gennemsnit
+        for navn, gennemsnit in _noegletal_forbindelse(db_sti, min_km).execute(
+            f'SELECT noegletal, gennemsnit FROM "{FLAADE_TABEL}"'
+        )
+        if gennemsnit is not None
+    }
+
+
+def hent_placeringer(db_sti, min_km):
+    """
+    Slår de gemte placeringer for de rangerede chauffører op
+
+    Returns:
+        list: [{'Chauffør', 'samlet_score', 'samlet_placering', 'noegletal', 'placeringer'}]
+              sorteret efter samlet placering
+    """
+    conn = _noegletal_forbindelse(db_sti, min_km)
+    kolonner = ', '.join(f'"{navn}"' for navn in KPI_NAVNE)
+    rang_kolonner = ', '.join(f'"{rang_kolonne(navn)}"' for navn in KPI_NAVNE)
+    resultat = []
+    for raekke in conn.execute(f'''
+        SELECT "Chauffør", samlet_score, samlet_placering, {kolonner}, {rang_kolonner}
+        FROM "{KPI_TABEL}"
+        WHERE rangeret = 1
+        ORDER BY samlet_placering
+    '''):
+        antal = len(KPI_NAVNE)
+        resultat.append({
+            'Chauffør': raekke[0],
+            'samlet_score': int(raekke[1]),
+            'samlet_placering': int(raekke[2]),
+            'noegletal': dict(zip(KPI_NAVNE, raekke[3:3 + antal])),
+            'placeringer': {navn: int(rang) for navn, rang in zip(KPI_NAVNE, raekke[3 + antal:])}
+        })
+    return resultat
@@ -0,0 +1,126 @@
+import os
+import copy
+import logging
+from io import BytesIO
+from docx import Document
+from docx.shared import Pt, RGBColor
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
+
+# Skabelonen gemmes ved siden af datavarehuset og genopbygges når versionen ændres
+SKABELON_STI = os.path.join('databases', 'rapport_skabelon.docx')
+SKABELON_VERSION = 'rapport_skabelon v1'
+
+# Pladsholdere på forsiden
+TITEL_PLADSHOLDER = '{TITEL}'
+PERIODE_PLADSHOLDER = '{PERIODE}'
+GENERERET_PLADSHOLDER = '{GENERERET}'
+
+
+class RapportSkabelon:
+    """Forbygget .docx-skelet med styles og forside som hver rapport kopieres fra.
+    Statiske tekstblokke og tabel-skygge bygges én gang og deep-copies ind i rapporterne."""
+
+    def __init__(self, sti=SKABELON_STI):
+        self.sti = sti
+        self._skabelon_bytes = self._hent_eller_byg()
+        self._blokke = {}
+        self._skygge = parse_xml(r'<w:shd {} w:fill="E0E0E0"/>'.format(nsdecls('w')))
+
+    def _byg_skabelon(self):
+        """Bygger skelettet med forsidens formatering og pladsholdere"""
+        doc = Document()
+        doc.core_properties.comments = SKABELON_VERSION
+
+        titel = doc.add_paragraph()
+        titel_tekst = titel.add_run(TITEL_PLADSHOLDER)
+        titel_tekst.font.size = Pt(36)
+        titel_tekst.font.bold = True
+        titel_tekst.font.color.rgb = RGBColor(30, 144, 255)
+        titel.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+        periode = doc.add_paragraph()
+        periode_tekst = periode.add_run(PERIODE_PLADSHOLDER)
+        periode_tekst.font.size = Pt(24)
+        periode.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+        genereret_dato = doc.add_paragraph()
+        genereret_dato.add_run(GENERERET_PLADSHOLDER)
+        genereret_dato.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+        doc.add_page_break()
+        return doc
+
+    def _hent_eller_byg(self):
+        """Læser skelettet fra disk, eller bygger og gemmer det hvis det mangler eller er forældet"""
+        try:
+            if os.path.exists(self.sti):
+                with open(self.sti, 'rb') as f:
+                    data = f.read()
+                if Document(BytesIO(data)).core_properties.comments == SKABELON_VERSION:
+                    return data
+        except Exception as e:
+            logging.error(f"Kunne ikke læse rapportskabelon, bygger ny: {str(e)}")
+
+        buffer = BytesIO()
+        self._byg_skabelon().save(buffer)
+        data = buffer.getvalue()
+
+        try:
+            os.makedirs(os.path.dirname(self.sti) or '.', exist_ok=True)
+            # Skriv atomisk så parallelle processer aldrig læser en halv fil
+            midlertidig_sti = f"{self.sti}.{os.getpid()}.tmp"
+            with open(midlertidig_sti, 'wb') as f:
+                f.write(data)
+            os.replace(midlertidig_sti, self.sti)
+            logging.info(f"Rapportskabelon gemt: {self.sti}")
+        except Exception as e:
+            logging.error(f"Kunne ikke gemme rapportskabelon: {str(e)}")
+        return data
+
+    def ny_rapport(self, titel, periode, genereret):
+        """Returnerer en ny rapport kopieret fra skelettet med udfyldt forside"""
+        doc = Document(BytesIO(self._skabelon_bytes))
+        doc.core_properties.comments = ''
+
+        vaerdier = {
+            TITEL_PLADSHOLDER: titel,
+            PERIODE_PLADSHOLDER: periode,
+            GENERERET_PLADSHOLDER: genereret
+        }
+        for paragraph in doc.paragraphs[:3]:
+            for run in paragraph.runs:
+                if run.text in vaerdier:
+                    run.text = vaerdier[run.text]
+        return doc
+
+    def indsaet_blok(self, doc, navn, bygger):
+        """Indsætter en statisk blok i slutningen af doc. Blokken bygges første gang
+        med bygger(kladde) og genbruges derefter som deep-copy af XML-elementerne."""
+        if navn not in self._blokke:
+            kladde = Document()
+            body = kladde.element.body
+            for element in list(body):
+                if element is not body.sectPr:
+                    body.remove(element)
+            bygger(kladde)
+            self._blokke[navn] = [element for element in body if element is not body.sectPr]
+
+        body = doc.element.body
+        for element in self._blokke[navn]:
+            body.sectPr.addprevious(copy.deepcopy(element))
+
+    def tilfoej_skygge(self, cell):
+        """Giver en tabelcelle grå baggrund"""
+        cell._tc.get_or_add_tcPr().append(copy.deepcopy(self._skygge))
+
+
+_skabelon = None
+
+def hent_skabelon():
+    """Returnerer den delte rapportskabelon for processen"""
+    global _skabelon
+    if _skabelon is None:
+        _skabelon = RapportSkabelon()
+    return _skabelon
@@ -8,8 +8,8 @@ import os
 from datetime import datetime
 import threading
 from word_report import WordReportGenerator
+from indstillinger import hent_indstillinger
 import sqlite3
-import time
 
 class ReportMailWindow:
     def __init__(self, parent, selected_database, report_type, group_name=None, driver_name=None):
@@ -180,12 +180,8 @@ class ReportMailWindow:
     def load_drivers(self):
         """Indlæser chauffører og deres mail status"""
         try:
-            # Hent minimum kilometer indstilling fra settings databasen
-            with sqlite3.connect('databases/settings.db') as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT value FROM settings WHERE key = "min_km"')
-                result = cursor.fetchone()
-                min_km = float(result[0]) if result else 100.0
+            # Hent minimum kilometer indstilling
+            min_km = hent_indstillinger().min_km
             
             # Hent alle chauffører fra databasen
             with sqlite3.connect(self.selected_database) as conn:
@@ -572,79 +568,78 @@ class ReportMailWindow:
                 
             self.progress_frame.pack(fill="x", padx=20, pady=10)
             self.progress_bar.set(0)
-            total_drivers = len(drivers_with_email)
             
-            # Indsaml alle nødvendige data på forhånd i hovedtråden
-            # Dette løser trådsikkerhedsproblemet med SQLite
-            driver_data = []
-            for i, driver_id in enumerate(drivers_with_email):
-                try:
-                    # Indlæs rapport data
-                    report_data = self.word_report.get_report_data(driver_id)
-                    
-                    # Hent email fra databasen i hovedtråden
-                    email = self.db.get_driver_email(driver_id)
-                    
-                    # Tilføj til liste hvis data findes
-                    if report_data and email:
-                        logging.info(f"Forbereder data for {driver_id} med email {email}")
-                        driver_data.append({
-                            'id': driver_id,
-                            'report_data': report_data,
-                            'email': email
-                        })
-                    else:
-                        if not report_data:
-                            logging.error(f"Ingen rapport data fundet for {driver_id}")
-                        if not email:
-                            logging.error(f"Ingen email fundet for {driver_id}")
-                except Exception as e:
-                    logging.error(f"Fejl ved forberedelse af data for {driver_id}: {str(e)}")
+            # Hent emails i hovedtråden; rapporterne bygges og sendes i baggrunden
+            emails = {}
+            for driver_id in drivers_with_email:
+                email = self.db.get_driver_email(driver_id)
+                if email:
+                    emails[driver_id] = email
+                else:
+                    logging.error(f"Ingen email fundet for {driver_id}")
             
-            # Opdater totalt antal chauffører
-            total_drivers = len(driver_data)
+            total_drivers = len(emails)
             if total_drivers == 0:
-                messagebox.showinfo("Info", "Ingen chauffører med både email og rapport data fundet", parent=self.window)
+                messagebox.showinfo("Info", "Ingen chauffører med email fundet", parent=self.window)
                 self.progress_frame.pack_forget()
                 return
-                
+            
+            self.send_all_button.configure(state="disabled")
+            self.progress_label.configure(text=f"Genererer rapporter... 0/{total_drivers}")
+            
+            def opdater_status(genereret, sendt):
+                # Kaldes i hovedtråden via after
+                self.progress_bar.set(genereret / total_drivers)
+                self.progress_label.configure(
+                    text=f"Genereret {genereret}/{total_drivers} · Sendt {sendt}/{total_drivers}"
+                )
+            
+            def marker_sendt(driver_id):
+                if driver_id in self.driver_rows:
+                    row = self.driver_rows[driver_id]
+                    row['edit_button'].configure(state="disabled", text="Rapport Sendt")
+            
+            def afslut(sendt, fejl):
+                self.send_all_button.configure(state="normal")
+                if fejl:
+                    self.progress_label.configure(text=f"{sendt} af {total_drivers} rapporter sendt")
+                    messagebox.showwarning(
+                        "Advarsel",
+                        f"{sendt} rapporter sendt. {fejl} rapporter kunne ikke genereres eller sendes.",
+                        parent=self.window
+                    )
+                else:
+                    self.progress_label.configure(text="Alle rapporter sendt!")
+                    messagebox.showinfo("Success", "Alle rapporter er blevet sendt!", parent=self.window)
+            
             def send_reports():
-                for i, data in enumerate(driver_data, 1):
-                    try:
-                        progress = i / total_drivers
-                        self.progress_bar.set(progress)
-                        self.progress_label.configure(
-                            text=f"Sender rapporter... {i}/{total_drivers}"
-                        )
-                        
-                        # Send rapporten direkte til MailSystem uden at tilgå databasen igen
-                        # Dette undgår SQLite tråd-fejl
-                        self.mail_handler.send_report_with_email(
-                            data['id'], 
-                            data['report_data'],
-                            data['email']
-                        )
-                        
-                        # Opdater UI
-                        if data['id'] in self.driver_rows:
-                            row = self.driver_rows[data['id']]
-                            row['edit_button'].configure(state="disabled", text="Rapport Sendt")
-                            
-                        # Tilføj forsinkelse mellem hver mail for at undgå SMTP-begrænsninger
-                        # Kun hvis det ikke er den sidste mail
-                        if i < total_drivers:
-                            logging.info(f"Venter 2 sekunder før afsendelse af næste mail ({i}/{total_drivers})")
-                            time.sleep(2)  # 2 sekunders forsinkelse mellem hver mail
-                            
-                    except Exception as e:
-                        logging.error(f"Fejl ved sending af rapport til chauffør {data['id']}: {str(e)}")
-                        if hasattr(e, '__traceback__'):
-                            import traceback
-                            trace = ''.join(traceback.format_tb(e.__traceback__))
-                            logging.error(f"Stacktrace: {trace}")
-                        
-                self.progress_label.configure(text="Alle rapporter sendt!")
-                messagebox.showinfo("Success", "Alle rapporter er blevet sendt!", parent=self.window)
+                # Hver rapport overdrages til MailSystem så snart den er genereret;
+                # iter_rapport_data begrænser hvor mange rapporter der er i hukommelsen
+                genereret = 0
+                sendt = 0
+                try:
+                    for driver_id, report_data in self.word_report.iter_rapport_data(list(emails)):
+                        genereret += 1
+                        if not report_data:
+                            logging.error(f"Ingen rapport data fundet for {driver_id}")
+                        else:
+                            try:
+                                # Send rapporten direkte til MailSystem uden at tilgå databasen igen
+                                # Dette undgår SQLite tråd-fejl
+                                if self.mail_handler.send_report_with_email(driver_id, report_data, emails[driver_id]):
+                                    sendt += 1
+                                    self.window.after(0, marker_sendt, driver_id)
+                            except Exception as e:
+                                logging.error(f"Fejl ved sending af rapport til chauffør {driver_id}: {str(e)}")
+                                if hasattr(e, '__traceback__'):
+                                    import traceback
+                                    trace = ''.join(traceback.format_tb(e.__traceback__))
+                                    logging.error(f"Stacktrace: {trace}")
+                        self.window.after(0, opdater_status, genereret, sendt)
+                except Exception as e:
+                    logging.error(f"Fejl ved generering af rapporter: {str(e)}")
+                
+                self.window.after(0, afslut, sendt, total_drivers - sendt)
             
             thread = threading.Thread(target=send_reports)
             thread.daemon = True
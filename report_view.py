@@ -10,6 +10,9 @@ from tkinter import messagebox
 import matplotlib.pyplot as plt
 from PIL import Image
 import logging
+import queue
+import threading
+import tkinter as tk
 from word_report import WordReportGenerator
 from report_mail_window import ReportMailWindow
 from database_connection import DatabaseConnection
@@ -43,6 +46,10 @@ class ReportWindow:
         self.available_databases = []
         self.selected_database = None
         
+        # Kø fra tråden der genererer individuelle rapporter; None når ingen kører
+        self._rapport_koe = None
+        self._poll_id = None
+        
         self.setup_ui()
         
     def _finalize_window_init(self):
@@ -379,6 +386,12 @@ class ReportWindow:
         self.generate_report()
 
     def generate_report(self):
+        if self._rapport_koe is not None:
+            self.status_label.configure(
+                text="Individuelle rapporter genereres allerede - vent venligst",
+                text_color="orange"
+            )
+            return
         if self.selected_database is None:
             self.status_label.configure(
                 text="Ingen database valgt",
@@ -407,19 +420,19 @@ class ReportWindow:
                 )
                 success_message = "Gruppe rapport genereret"
             elif self.selected_type == "individuel":
-                # Generer individuelle rapporter for alle kvalificerede chauffører
-                generated_filenames = word_generator.generer_individuelle_rapporter()
-                success_message = f"{len(generated_filenames)} individuelle rapporter genereret"
-                
-                if not generated_filenames:
-                    messagebox.showerror("Fejl", "Ingen kvalificerede chauffører fundet")
-                    return
-                    
-                # Vis bekræftelse med antal genererede rapporter
-                messagebox.showinfo(
-                    "Rapporter Genereret",
-                    f"{len(generated_filenames)} individuelle rapporter er blevet gemt i mappen 'rapporter'"
+                # Individuelle rapporter genereres parallelt i en baggrundstråd;
+                # Tk-tråden henter fremskridt og resultat fra køen
+                self._rapport_koe = queue.Queue()
+                threading.Thread(
+                    target=self._generer_individuelle,
+                    args=(word_generator, self._rapport_koe),
+                    daemon=True
+                ).start()
+                self.status_label.configure(
+                    text="Genererer individuelle rapporter...",
+                    text_color=self.colors["text_primary"]
                 )
+                self._poll_id = self.root.after(100, self._behandl_rapport_koe)
                 return
             
             self.status_label.configure(
@@ -440,6 +453,72 @@ class ReportWindow:
             )
             messagebox.showerror("Fejl", f"Kunne ikke generere rapport: {str(e)}")
 
+    def _generer_individuelle(self, word_generator, koe):
+        """Genererer de individuelle rapporter i en baggrundstråd og lægger resultatet i koe"""
+        def fremskridt(faerdige, total, chauffoer):
+            koe.put(('fremskridt', faerdige, total, chauffoer))
+
+        try:
+            koe.put(('faerdig', word_generator.generer_individuelle_rapporter(progress_callback=fremskridt)))
+        except Exception as e:
+            logging.error(f"Fejl under generering af individuelle rapporter: {str(e)}")
+            koe.put(('fejl', str(e)))
+
+    def _behandl_rapport_koe(self):
+        """Henter fremskridt og resultat fra rapporttråden på Tk-tråden"""
+        self._poll_id = None
+        koe = self._rapport_koe
+        if koe is None:
+            return
+        try:
+            while True:
+                try:
+                    besked = koe.get_nowait()
+                except queue.Empty:
+                    break
+                if besked[0] == 'fremskridt':
+                    self.vis_rapport_fremskridt(*besked[1:])
+                else:
+                    self._rapport_koe = None
+                    self._individuelle_faerdige(*besked)
+                    return
+            self._poll_id = self.root.after(100, self._behandl_rapport_koe)
+        except tk.TclError:
+            # Vinduet er lukket mens rapporterne blev genereret
+            self._rapport_koe = None
+
+    def _individuelle_faerdige(self, status, resultat):
+        """Viser resultatet af de individuelle rapporter"""
+        if status == 'fejl':
+            self.status_label.configure(
+                text=f"Fejl under generering af rapport: {resultat}",
+                text_color="red"
+            )
+            messagebox.showerror("Fejl", f"Kunne ikke generere rapport: {resultat}")
+            return
+        
+        if not resultat:
+            self.status_label.configure(text="", text_color=self.colors["text_primary"])
+            messagebox.showerror("Fejl", "Ingen kvalificerede chauffører fundet")
+            return
+        
+        self.status_label.configure(
+            text=f"{len(resultat)} individuelle rapporter genereret",
+            text_color="green"
+        )
+        # Vis bekræftelse med antal genererede rapporter
+        messagebox.showinfo(
+            "Rapporter Genereret",
+            f"{len(resultat)} individuelle rapporter er blevet gemt i mappen 'rapporter'"
+        )
+
+    def vis_rapport_fremskridt(self, faerdige, total, chauffoer):
+        """Viser fremskridt for individuelle rapporter i statuslinjen"""
+        self.status_label.configure(
+            text=f"Genererer individuelle rapporter... {faerdige}/{total} ({chauffoer})",
+            text_color=self.colors["text_primary"]
+        )
+
     def generate_word_report(self, filename, df):
         doc = Document()
         
@@ -695,6 +774,12 @@ class ReportWindow:
     def destroy(self):
         """Lukker vinduet og frigør ressourcer"""
         try:
+            # Stop polling af rapportkøen; igangværende rapporter gøres færdige i baggrunden
+            self._rapport_koe = None
+            if self._poll_id:
+                self.root.after_cancel(self._poll_id)
+                self._poll_id = None
+            
             # Destroy alle child windows først
             for widget in self.root.winfo_children():
                 if isinstance(widget, ctk.CTkToplevel):
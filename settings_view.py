@@ -5,6 +5,7 @@ import logging
 from tkinter import messagebox
 import re
 from database_connection import DatabaseConnection
+from indstillinger import hent_indstillinger
 
 class SettingsWindow:
     def __init__(self):
@@ -64,19 +65,13 @@ class SettingsWindow:
         conn.close()
 
     def load_settings(self):
-        conn = sqlite3.connect('databases/settings.db')
-        cursor = conn.cursor()
-        
-        # Hent alle indstillinger
-        cursor.execute('SELECT key, value FROM settings')
-        settings = dict(cursor.fetchall())
+        indstillinger = hent_indstillinger()
+        min_km = indstillinger.min_km
         
-        conn.close()
-        
-        # Returner indstillinger med standardværdier hvis de ikke findes
+        # Returner indstillingerne som tekst til indtastningsfelterne
         return {
-            'min_km': settings.get('min_km', '100'),
-            'diesel_price': settings.get('diesel_price', '13.50')
+            'min_km': str(int(min_km)) if min_km.is_integer() else str(min_km),
+            'diesel_price': str(indstillinger.diesel_price)
         }
 
     def save_settings(self):
@@ -104,17 +99,8 @@ class SettingsWindow:
             )
             return
 
-        conn = sqlite3.connect('databases/settings.db')
-        cursor = conn.cursor()
-        
-        # Gem indstillinger
-        cursor.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
-                      ('min_km', str(min_km)))
-        cursor.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
-                      ('diesel_price', str(diesel_price)))
-        
-        conn.commit()
-        conn.close()
+        # Gem indstillinger; åbne vinduer og caches får besked om ændringerne
+        hent_indstillinger().gem(min_km=min_km, diesel_price=diesel_price)
         
         self.general_status_label.configure(
             text="Indstillinger gemt succesfuldt!",
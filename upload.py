@@ -1,9 +1,15 @@
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
-import pandas as pd
-import sqlite3
 from datetime import datetime
 import os
+import logging
+import queue
+import threading
+import tkinter as tk
+from datavarehus import hent_varehus
+from indstillinger import hent_indstillinger
+from excel_indlaesning import indlaes_excel
+from noegletal_lager import materialiser_noegletal
 
 class UploadWindow:
     def __init__(self):
@@ -36,6 +42,12 @@ class UploadWindow:
         self.selected_type = None
         self.file_path = None
         
+        # Knapper og dropdowns der låses mens en fil indlæses
+        self._kontroller = []
+        self._upload_koe = None
+        self._poll_id = None
+        self._lukket = False
+        
         self.setup_ui()
         
     def setup_ui(self):
@@ -110,6 +122,7 @@ class UploadWindow:
             width=200
         )
         month_dropdown.grid(row=0, column=1, pady=5)
+        self._kontroller.append(month_dropdown)
         
         # År dropdown
         year_label = ctk.CTkLabel(
@@ -132,6 +145,7 @@ class UploadWindow:
             width=200
         )
         year_dropdown.grid(row=1, column=1, pady=5)
+        self._kontroller.append(year_dropdown)
         
         # Konfigurer grid
         dropdowns_frame.grid_columnconfigure(1, weight=1)
@@ -195,6 +209,7 @@ class UploadWindow:
             command=lambda t=title: self.type_selected(t)
         )
         upload_button.pack(pady=(0, 20))
+        self._kontroller.append(upload_button)
         
     def month_selected(self, month):
         self.selected_month = month
@@ -205,6 +220,9 @@ class UploadWindow:
         self.update_status()
 
     def type_selected(self, type_name):
+        if self._upload_koe is not None:
+            # En indlæsning kører allerede
+            return
         if not self.selected_month or not self.selected_year:
             self.status_label.configure(
                 text="Vælg venligst både måned og år først",
@@ -224,27 +242,11 @@ class UploadWindow:
                 text="Konverterer fil...",
                 text_color=self.colors["text_secondary"]
             )
-            self.root.update()
+            self.root.update_idletasks()
             self.convert_to_sql()
             
     def convert_to_sql(self):
         try:
-            # Læs Excel fil
-            df = pd.read_excel(self.file_path)
-            
-            # Validér at filen indeholder data
-            if df.empty:
-                raise ValueError("Excel filen er tom")
-            
-            # Den specifikke bemærkningstekst vi leder efter
-            bemærkning_tekst = "Bemærk venligst, at en præstationsanalyse kun kan tage hensyn til delvise aspekter vedrørende driftsmåden (f.eks. friløb) og de påvirkningsfaktorer (f.eks. typen af indsættelse). Af denne grund er denne rapport kun en generel hjælp og bør aftales mellem chaufføren og køretræneren/flådechefen. Alvorligheden af brugen bestemt i Service MAN Perform og underklassificeringerne/den samlede vurdering er en MAN-specifik løsning og kan derfor ikke sammenlignes med ratings eller ydeevneindikatorer fra andre producenter"
-            
-            # Tjek om første kolonne indeholder bemærkningsteksten
-            første_kolonne_navn = df.columns[0]
-            if isinstance(første_kolonne_navn, str) and første_kolonne_navn.strip() == bemærkning_tekst.strip():
-                # Hvis ja, fjern første kolonne
-                df = df.iloc[:, 1:]
-            
             # Generer database navn med år
             db_name = f"{self.selected_type.lower().replace(' ', '_')}_{self.selected_month.lower()}_{self.selected_year}.db"
             
@@ -255,13 +257,14 @@ class UploadWindow:
             
             # Sikr at databasefilen ikke allerede eksisterer
             full_db_path = os.path.join(db_path, db_name)
+            backup_path = None
             if os.path.exists(full_db_path):
                 # Opdater status label
                 self.status_label.configure(
                     text=f"En database for {self.selected_month} {self.selected_year} eksisterer allerede",
                     text_color="orange"
                 )
-                self.root.update()
+                self.root.update_idletasks()
                 
                 # Spørg bruger om overskrivning med detaljeret besked
                 if not messagebox.askyesno(
@@ -287,39 +290,118 @@ class UploadWindow:
                 except Exception as e:
                     print(f"Kunne ikke oprette backup: {str(e)}")
             
-            # Opret forbindelse til SQLite database
-            conn = sqlite3.connect(full_db_path)
-            
-            # Konverter dataframe til SQL tabel
             table_name = f"{self.selected_type.lower().replace(' ', '_')}_data"
-            df.to_sql(table_name, conn, if_exists='replace', index=False)
             
-            conn.close()
+            # Indlæsningen kører i baggrunden så brugerfladen ikke fryser.
+            # Baggrundstråden rører ikke Tk; den lægger beskeder i køen som Tk-tråden henter
+            self._upload_koe = queue.Queue()
+            self._saet_kontroller(False)
+            threading.Thread(
+                target=self._koer_indlaesning,
+                args=(full_db_path, table_name, backup_path, self._upload_koe),
+                daemon=True
+            ).start()
+            self._poll_id = self.root.after(100, self._behandl_upload_koe)
+            
+        except Exception as e:
+            self._upload_koe = None
+            self._saet_kontroller(True)
+            self.status_label.configure(
+                text=f"Fejl under konvertering: {str(e)}",
+                text_color="red"
+            )
+
+    def _koer_indlaesning(self, full_db_path, table_name, backup_path, koe):
+        """Indlæser Excel filen i chunks i en baggrundstråd og lægger resultatet i koe"""
+        def rapporter_fremskridt(behandlet, total):
+            if total:
+                tekst = f"Konverterer fil... {min(100, int(behandlet / total * 100))}%"
+            else:
+                tekst = f"Konverterer fil... {behandlet} rækker"
+            koe.put(('fremskridt', tekst))
+
+        try:
+            # Læs Excel filen streamende og skriv den i batches til databasen
+            resultat = indlaes_excel(
+                self.file_path,
+                full_db_path,
+                table_name,
+                progress_callback=rapporter_fremskridt
+            )
+            
+            # Opdater det samlede datavarehus med den nye måned
+            varehus_fejl = None
+            if table_name == 'chauffør_data_data':
+                try:
+                    hent_varehus().indlaes_maanedsfil(full_db_path)
+                except Exception as e:
+                    logging.error(f"Fejl ved opdatering af datavarehus: {str(e)}")
+                    varehus_fejl = str(e)
+                
+                # Gem nøgletal, placeringer og flådegennemsnit så visninger kun skal slå op
+                try:
+                    materialiser_noegletal(full_db_path, hent_indstillinger().min_km)
+                except Exception as e:
+                    logging.error(f"Fejl ved beregning af gemte nøgletal: {str(e)}")
             
             # Hvis vi nåede hertil, var upload succesfuld
-            success_message = "Data er blevet gemt i databasen"
-            if os.path.exists(backup_path) if 'backup_path' in locals() else False:
+            success_message = f"Data er blevet gemt i databasen ({resultat['raekker']} rækker)"
+            if resultat['ugyldige']:
+                success_message += f"\n{resultat['ugyldige']} ugyldige celler blev gemt som tomme"
+            if varehus_fejl:
+                success_message += f"\nDatavarehuset kunne ikke opdateres: {varehus_fejl}"
+            if backup_path and os.path.exists(backup_path):
                 success_message += "\nEn backup af den gamle database blev gemt"
             
-            self.status_label.configure(
-                text=success_message,
-                text_color="green"
-            )
+            koe.put(('faerdig', success_message, True))
             
+        except Exception as e:
+            logging.error(f"Fejl under konvertering: {str(e)}")
+            koe.put(('faerdig', f"Fejl under konvertering: {str(e)}", False))
+
+    def _behandl_upload_koe(self):
+        """Henter beskeder fra indlæsningstråden på Tk-tråden"""
+        self._poll_id = None
+        if self._lukket:
+            return
+        koe = self._upload_koe
+        try:
+            while True:
+                try:
+                    besked = koe.get_nowait()
+                except queue.Empty:
+                    break
+                if besked[0] == 'fremskridt':
+                    self.status_label.configure(
+                        text=besked[1],
+                        text_color=self.colors["text_secondary"]
+                    )
+                else:
+                    self._indlaesning_faerdig(besked[1], besked[2])
+                    return
+            self._poll_id = self.root.after(100, self._behandl_upload_koe)
+        except tk.TclError:
+            # Vinduet er lukket mens indlæsningen kørte
+            pass
+
+    def _saet_kontroller(self, aktive):
+        """Låser eller frigiver måned, år og upload knapperne"""
+        for kontrol in self._kontroller:
+            kontrol.configure(state="normal" if aktive else "disabled")
+
+    def _indlaesning_faerdig(self, besked, succes):
+        """Viser resultatet af indlæsningen på hovedtråden"""
+        self._upload_koe = None
+        self.status_label.configure(
+            text=besked,
+            text_color="green" if succes else "red"
+        )
+        if not succes:
+            self._saet_kontroller(True)
+        else:
             # Luk vinduet efter 2 sekunder (øget fra 1 sekund for at give tid til at læse beskeden)
             self.root.after(2000, self.destroy)
             
-        except pd.errors.EmptyDataError:
-            self.status_label.configure(
-                text="Fejl: Excel filen er tom",
-                text_color="red"
-            )
-        except Exception as e:
-            self.status_label.configure(
-                text=f"Fejl under konvertering: {str(e)}",
-                text_color="red"
-            )
-            
     def update_status(self):
         if self.selected_month and self.selected_year:
             self.status_label.configure(
@@ -341,7 +423,15 @@ class UploadWindow:
 
     def destroy(self):
         """Lukker vinduet og frigør ressourcer"""
+        if self._lukket:
+            return
+        self._lukket = True
         try:
+            # Stop polling af indlæsningskøen; en igangværende indlæsning gør sig færdig i baggrunden
+            if self._poll_id:
+                self.root.after_cancel(self._poll_id)
+                self._poll_id = None
+            
             # Destroy alle child windows først
             for widget in self.root.winfo_children():
                 if isinstance(widget, ctk.CTkToplevel):
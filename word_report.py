@@ -1,28 +1,148 @@
-import sqlite3
 from docx import Document
 from docx.shared import Inches, Pt, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.enum.section import WD_SECTION
-from docx.oxml import parse_xml
-from docx.oxml.ns import nsdecls
 import os
+import io
+import atexit
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
 import calendar
 import logging
+import threading
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from database_connection import DatabaseConnection
+from datavarehus import hent_varehus, EXCLUDE_TEXT, MAANEDER, MAANEDER_REVERSE
+from forbindelser import laese_forbindelse
+from indstillinger import hent_indstillinger
+from noegletal import beregn_noegletal_raekke
+from noegletal_lager import hent_driver_noegletal, hent_placeringer
+from rapport_skabelon import hent_skabelon
+from maanedsskema import er_varighed, sekunder_til_tid, tid_til_sekunder
+
+# Nøgletal i den samlede rangering og om højere værdi er bedre
+SAMLET_RANGERING_NOEGLETAL = {
+    'Tomgangsprocent': False,
+    'Fartpilot Andel': True,
+    'Motorbremse Andel': True,
+    'Påløbsdrift Andel': True
+}
+
+# Nøgletal i performance rangeringen: (titel, højere er bedre, enhed, beskrivelse, mål)
+PERFORMANCE_NOEGLETAL = {
+    'Tomgangsprocent': ('Tomgang', False, '%', 'Lavere er bedre - Mål: Under 5% - Indikerer effektiv udnyttelse af køretøjet', 5),
+    'Fartpilot Andel': ('Fartpilot Anvendelse', True, '%', 'Højere er bedre - Mål: Over 66,5% - Bidrager til jævn og økonomisk kørsel', 66.5),
+    'Motorbremse Andel': ('Brug af Motorbremse', True, '%', 'Højere er bedre - Mål: Over 56% - Sparer på bremserne og reducerer brændstofforbrug', 56),
+    'Påløbsdrift Andel': ('Påløbsdrift', True, '%', 'Højere er bedre - Mål: Over 7% - Indikerer effektiv udnyttelse af motorbremsning', 7),
+    'Diesel Effektivitet': ('Brændstofeffektivitet', True, 'km/l', 'Højere er bedre - Indikerer effektivt brændstofforbrug', None),
+    'Vægtkorrigeret Forbrug': ('Vægtkorrigeret Forbrug', False, 'l/100km/t', 'Lavere er bedre - Indikerer effektivt forbrug i forhold til vægt', None),
+    'Overspeed Andel': ('Overspeed', False, '%', 'Lavere er bedre - Indikerer overholdelse af hastighedsgrænser', None)
+}
+
+# Memo for beregnede rangeringer: {(db_sti, chauffører): (mtime, min_km, rangeringer)}
+_rangerings_cache = {}
+
+# Chaufførstatistik pr. månedsdatabase: {sti: (mtime, min_km, {chauffør: statistik})}.
+# Deles af mailforhåndsvisning, batchafsendelse og HTML-brødteksten
+_statistik_cache = {}
+_statistik_lock = threading.Lock()
+
+
+def _ryd_min_km_caches(aendringer):
+    """Rangeringer og statistik afhænger af min_km og ryddes når indstillingen ændres"""
+    _rangerings_cache.clear()
+    with _statistik_lock:
+        _statistik_cache.clear()
+
+
+hent_indstillinger().abonner(_ryd_min_km_caches, noegler=('min_km',))
+
+
+def hent_driver_statistikker(db_path, min_km):
+    """
+    Returnerer statistikken for alle chauffører i en måned, beregnet med én forespørgsel
+    
+    Resultatet caches pr. (databasefil, mtime, min_km), så gentagne opslag for samme
+    måned ikke rører databasen.
+    
+    Returns:
+        dict: {chauffør: statistik} med første række pr. chauffør
+    """
+    sti = os.path.abspath(db_path)
+    with _statistik_lock:
+        cached = _statistik_cache.get(sti)
+        if cached and cached[0] == os.path.getmtime(sti) and cached[1] == min_km:
+            return cached[2]
+        
+        # Nøgletal slås op i den gemte driver_kpis tabel
+        try:
+            gemte_noegletal = hent_driver_noegletal(sti, min_km, kun_kvalificerede=False)
+        except Exception as e:
+            logging.error(f"Kunne ikke hente gemte nøgletal for {db_path}: {str(e)}")
+            gemte_noegletal = {}
+        
+        cursor = laese_forbindelse(sti).execute('SELECT * FROM chauffør_data_data ORDER BY rowid')
+        kolonner = [col[0] for col in cursor.description]
+        raekker = cursor.fetchall()
+        
+        # Periode fra database navn
+        dele = os.path.basename(sti).replace('.db', '').split('_')
+        periode = f"{dele[2].capitalize()} {dele[3]}"
+        
+        statistikker = {}
+        for raekke in raekker:
+            data = dict(zip(kolonner, raekke))
+            chauffoer = data['Chauffør']
+            if chauffoer is None or chauffoer in statistikker:
+                continue
+            # Spring RIO's bemærkningsrække og rækker uden kørestrækning over
+            if str(chauffoer).startswith(EXCLUDE_TEXT) or data.get('Kørestrækning [km]') is None:
+                continue
+            try:
+                noegletal = gemte_noegletal.get(chauffoer) or beregn_noegletal_raekke(data)
+                statistikker[chauffoer] = _byg_statistik(chauffoer, periode, data, noegletal)
+            except Exception as e:
+                logging.error(f"Fejl ved beregning af statistik for {chauffoer}: {str(e)}")
+        
+        _statistik_cache[sti] = (os.path.getmtime(sti), min_km, statistikker)
+        logging.info(f"Statistik beregnet for {len(statistikker)} chauffører i {db_path}")
+        return statistikker
+
+
+def _byg_statistik(chauffoer_navn, periode, data, noegletal):
+    """Opretter statistik dictionary for én chauffør ud fra rådata og nøgletal"""
+    antal_ture = int(data.get('Antal ture', 0))
+    distance = float(data.get('Kørestrækning [km]', 0))
+    koeretid = data.get('Køretid [hh:mm:ss]', '00:00:00')
+    return {
+        'name': chauffoer_navn,
+        'date': periode,
+        'total_trips': antal_ture,
+        'total_distance': distance,
+        'total_time': sekunder_til_tid(koeretid),
+        'avg_trip_length': distance / antal_ture if antal_ture > 0 else 0,
+        'avg_trip_time': (tid_til_sekunder(koeretid) or 0) / antal_ture / 3600 if antal_ture > 0 else 0,
+        'tomgangsprocent': noegletal.get('Tomgangsprocent', 0),
+        'fartpilot_andel': noegletal.get('Fartpilot Andel', 0),
+        'motorbremse_andel': noegletal.get('Motorbremse Andel', 0),
+        'paalobsdrift_andel': noegletal.get('Påløbsdrift Andel', 0)
+    }
+
 
 class WordReportGenerator:
     def __init__(self, db_path):
         logging.info(f"Initialiserer WordReportGenerator med database: {db_path}")
         self.db_path = db_path
         try:
-            self.min_km = self.get_min_km_setting()
+            self.min_km = hent_indstillinger().min_km
             logging.info(f"Minimum kilometer sat til: {self.min_km}")
         except Exception as e:
             logging.error(f"Fejl ved initialisering af WordReportGenerator: {str(e)}")
             raise
         self.doc = Document()
+        # Rapport-snapshot med kvalificerede rækker og nøgletal (se hent_rapport_snapshot)
+        self.snapshot = None
+        # Alle chaufførers seneste tidligere række: {(periode, måneder tilbage): {chauffør: (data, periode)}}
+        self.tidligere_raekker = {}
         
         # Definer kolonne grupper
         self.driftsdata_kolonner = [
@@ -53,130 +173,108 @@ class WordReportGenerator:
             'Tomgang / stilstandstid [hh:mm:ss]'
         ]
 
-    def get_min_km_setting(self):
-        """Henter minimum kilometer indstilling fra databasen"""
-        try:
-            with DatabaseConnection('databases/settings.db') as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT value FROM settings WHERE key = "min_km"')
-                result = cursor.fetchone()
-                return float(result[0]) if result else 100.0
-        except:
-            return 100.0
-
     def konverter_tid_til_sekunder(self, tid_str):
-        """Konverterer tid i format 'tt:mm:ss' til sekunder"""
-        try:
-            t, m, s = tid_str.split(':')
-            return int(t) * 3600 + int(m) * 60 + int(s)
-        except:
-            return 0
+        """Konverterer tid i sekunder eller format 'tt:mm:ss' til sekunder"""
+        return tid_til_sekunder(tid_str) or 0
 
     def beregn_noegletal(self, data):
         """Beregner nøgletal baseret på kørselsdata"""
         try:
-            noegletal = {}
-            
-            # Beregn tomgangsprocent
-            motor_tid = self.konverter_tid_til_sekunder(data['Motordriftstid [hh:mm:ss]'])
-            tomgangs_tid = self.konverter_tid_til_sekunder(data['Tomgang / stilstandstid [hh:mm:ss]'])
-            noegletal['Tomgangsprocent'] = (tomgangs_tid / motor_tid) * 100 if motor_tid > 0 else 0
-            
-            # Beregn cruise control andel
-            distance_over_50 = float(data['Afstand med kørehastighedsregulering (> 50 km/h) [km]']) + \
-                             float(data['Afstand > 50 km/h uden kørehastighedsregulering [km]'])
-            cruise_distance = float(data['Afstand med kørehastighedsregulering (> 50 km/h) [km]'])
-            noegletal['Fartpilot Andel'] = (cruise_distance / distance_over_50) * 100 if distance_over_50 > 0 else 0
-            
-            # Beregn motorbremse andel
-            driftsbremse = float(data['Driftsbremse (km) [km]'])
-            motorbremse = float(data['Afstand motorbremse [km]'])
-            total_bremse_distance = driftsbremse + motorbremse
-            noegletal['Motorbremse Andel'] = (motorbremse / total_bremse_distance) * 100 if total_bremse_distance > 0 else 0
-            
-            # Beregn diesel forbrug pr. km/l
-            forbrug_liter = float(data['Forbrug [l]'])
-            korestraekning = float(data['Kørestrækning [km]'])
-            if forbrug_liter > 0:
-                noegletal['Diesel Effektivitet'] = korestraekning / forbrug_liter
-            else:
-                noegletal['Diesel Effektivitet'] = 0
-            
-            # Beregn vægtkorrigeret forbrug
-            total_vaegt = float(data.get('Ø totalvægt [t]', 0))
-            if total_vaegt > 0 and forbrug_liter > 0:
-                vaegt_korrigeret_forbrug = (forbrug_liter / korestraekning * 100) / total_vaegt
-                noegletal['Vægtkorrigeret Forbrug'] = vaegt_korrigeret_forbrug
-            else:
-                noegletal['Vægtkorrigeret Forbrug'] = 0
-
-            # Beregn påløbsdrift andel
-            total_distance = float(data['Kørestrækning [km]'])
-            aktiv_paalobsdrift = float(data['Aktiv påløbsdrift (km) [km]'])
-            afstand_paalobsdrift = float(data['Afstand i påløbsdrift [km]'])
-            if total_distance > 0:
-                noegletal['Påløbsdrift Andel'] = ((aktiv_paalobsdrift + afstand_paalobsdrift) / total_distance) * 100
-            else:
-                noegletal['Påløbsdrift Andel'] = 0
-            
-            # Beregn Overspeed andel
-            overspeed = float(data['Overspeed (km uden påløbsdrift) [km]'])
-            if total_distance > 0:
-                noegletal['Overspeed Andel'] = (overspeed / total_distance) * 100
-            else:
-                noegletal['Overspeed Andel'] = 0
-            
+            noegletal = beregn_noegletal_raekke(data)
+            # CO2 Effektivitet vises kun i KPI-vinduet
+            noegletal.pop('CO2 Effektivitet', None)
             return noegletal
             
         except Exception as e:
             print(f"Fejl ved beregning af nøgletal: {str(e)}")
             return {}
 
-    def opret_samlet_rangering(self, kvalificerede_chauffoerer):
-        """Opretter en samlet rangering baseret på de fire hovedparametre"""
-        self.tilfoej_sektion_overskrift("Samlet Performance Rangering")
+    def hent_rapport_snapshot(self, genindlaes=False):
+        """Indlæser alle kvalificerede rækker én gang og slår deres gemte nøgletal op.
+        Alle sektioner i rapporten læser herfra i stedet for at spørge databasen pr. chauffør."""
+        if self.snapshot is not None and not genindlaes:
+            return self.snapshot
+        self.tidligere_raekker = {}
         
-        intro_tekst = self.doc.add_paragraph()
-        intro_run = intro_tekst.add_run(
-            "Den samlede rangering kombinerer præstationen på fire nøgleområder med følgende virksomhedsmål:\n\n"
-            "1. Tomgang: Mål på max 5% - Minimering af unødvendig tomgangskørsel\n"
-            "2. Fartpilot: Mål på minimum 66,5% - Optimal brug af fartpilot ved højere hastigheder\n"
-            "3. Motorbremse: Mål på minimum 56% - Effektiv brug af motorbremsning\n"
-            "4. Påløbsdrift: Mål på minimum 7% - Udnyttelse af køretøjets momentum\n\n"
-            "Hver chauffør får points baseret på deres placering i hver kategori. "
-            "Lavere samlet score er bedre, da det betyder bedre placeringer på tværs af kategorierne. "
-            "De tre bedste chauffører er markeret med grøn for at fremhæve særligt god præstation.\n"
-            "Målene er sat af virksomheden og bruges som reference for optimal kørsel.\n"
-        )
-        intro_run.font.size = Pt(11)
+        cursor = laese_forbindelse(self.db_path).execute('''
+            SELECT * FROM chauffør_data_data 
+            WHERE "Kørestrækning [km]" >= ?
+            ORDER BY rowid
+        ''', (self.min_km,))
+        kolonner = [col[0] for col in cursor.description]
+        raekker = cursor.fetchall()
         
-        # Hent data for alle kvalificerede chauffører
+        kvalificerede = []
+        set_par = set()
         chauffoer_data = {}
-        noegletal_data = {}
+        for raekke in raekker:
+            data = dict(zip(kolonner, raekke))
+            chauffoer = data['Chauffør']
+            par = (chauffoer, data['Kørestrækning [km]'])
+            if par not in set_par:
+                set_par.add(par)
+                kvalificerede.append(par)
+            chauffoer_data.setdefault(chauffoer, data)
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # Nøgletal slås op i den gemte driver_kpis tabel
+        try:
+            gemte_noegletal = hent_driver_noegletal(self.db_path, self.min_km)
+        except Exception as e:
+            logging.error(f"Kunne ikke hente gemte nøgletal, beregner direkte: {str(e)}")
+            gemte_noegletal = {}
+        noegletal_data = {}
+        for chauffoer in chauffoer_data:
+            noegletal = gemte_noegletal.get(chauffoer) or self.beregn_noegletal(chauffoer_data[chauffoer])
+            # CO2 Effektivitet vises kun i KPI-vinduet
+            noegletal_data[chauffoer] = {k: float(v) for k, v in noegletal.items() if k != 'CO2 Effektivitet'}
         
-        for chauffoer, _ in kvalificerede_chauffoerer:
-            cursor.execute('SELECT * FROM chauffør_data_data WHERE Chauffør = ?', (chauffoer,))
-            data = dict(zip([col[0] for col in cursor.description], cursor.fetchone()))
-            chauffoer_data[chauffoer] = data
-            noegletal_data[chauffoer] = self.beregn_noegletal(data)
-        
-        conn.close()
-        
-        # Definer nøgletal til rangering
-        noegletal_ranking = {
-            'Tomgangsprocent': False,
-            'Fartpilot Andel': True,
-            'Motorbremse Andel': True,
-            'Påløbsdrift Andel': True
+        self.snapshot = {
+            'kvalificerede': kvalificerede,
+            'data': chauffoer_data,
+            'noegletal': noegletal_data
         }
+        logging.info(f"Rapport-snapshot indlæst med {len(chauffoer_data)} kvalificerede chauffører")
+        return self.snapshot
+
+    def hent_snapshot_data(self, kvalificerede_chauffoerer):
+        """Returnerer rådata og nøgletal fra snapshottet for de angivne chauffører"""
+        snapshot = self.hent_rapport_snapshot()
+        chauffoer_data = {}
+        noegletal_data = {}
+        for chauffoer, _ in kvalificerede_chauffoerer:
+            if chauffoer not in snapshot['data']:
+                logging.warning(f"Chauffør {chauffoer} findes ikke i rapport-snapshot")
+                continue
+            chauffoer_data[chauffoer] = snapshot['data'][chauffoer]
+            noegletal_data[chauffoer] = snapshot['noegletal'][chauffoer]
+        return chauffoer_data, noegletal_data
+
+    def hent_rangeringer(self, kvalificerede_chauffoerer):
+        """Beregner samlet rangering, kategoriplaceringer og målopfyldelse én gang pr. database.
+        Resultatet genbruges af alle dokumenter indtil databasefilens mtime eller min_km ændres."""
+        db_sti = os.path.abspath(self.db_path)
+        chauffoerer = tuple(chauffoer for chauffoer, _ in kvalificerede_chauffoerer)
+        mtime = os.path.getmtime(self.db_path)
+        
+        cached = _rangerings_cache.get((db_sti, chauffoerer))
+        if cached and cached[0] == mtime and cached[1] == self.min_km:
+            return cached[2]
+        
+        # Fjern forældede rangeringer for samme database
+        for noegle in [n for n, v in _rangerings_cache.items() if n[0] == db_sti and v[:2] != (mtime, self.min_km)]:
+            del _rangerings_cache[noegle]
+        
+        rangeringer = self._gemte_rangeringer(chauffoerer)
+        if rangeringer is not None:
+            _rangerings_cache[(db_sti, chauffoerer)] = (mtime, self.min_km, rangeringer)
+            return rangeringer
+        
+        _, noegletal_data = self.hent_snapshot_data(kvalificerede_chauffoerer)
         
         # Beregn placering for hver chauffør i hver kategori
         placeringer = {chauffoer: {} for chauffoer in noegletal_data.keys()}
         
-        for noegletal, hoejere_er_bedre in noegletal_ranking.items():
+        for noegletal, hoejere_er_bedre in SAMLET_RANGERING_NOEGLETAL.items():
             sorterede_chauffoerer = sorted(
                 noegletal_data.items(),
                 key=lambda x: x[1].get(noegletal, 0),
@@ -196,6 +294,81 @@ class WordReportGenerator:
         # Sorter efter samlet score og derefter vægtkorrigeret forbrug
         samlet_ranking.sort(key=lambda x: (x[1], x[2]))
         
+        # Rangering og målopfyldelse for hvert nøgletal: [(chauffør, score, mål opfyldt)]
+        kategorier = {}
+        for noegletal, (_, hoejere_er_bedre, _, _, maal) in PERFORMANCE_NOEGLETAL.items():
+            sorterede_chauffoerer = sorted(
+                noegletal_data.items(),
+                key=lambda x: x[1].get(noegletal, 0),
+                reverse=hoejere_er_bedre
+            )
+            kategori = []
+            for chauffoer, data in sorterede_chauffoerer:
+                score = data.get(noegletal, 0)
+                maal_opfyldt = maal is not None and (
+                    (hoejere_er_bedre and score >= maal) or (not hoejere_er_bedre and score <= maal)
+                )
+                kategori.append((chauffoer, score, maal_opfyldt))
+            kategorier[noegletal] = kategori
+        
+        rangeringer = {
+            'placeringer': placeringer,
+            'samlet': samlet_ranking,
+            'kategorier': kategorier
+        }
+        _rangerings_cache[(db_sti, chauffoerer)] = (mtime, self.min_km, rangeringer)
+        logging.info(f"Rangeringer beregnet for {len(placeringer)} chauffører")
+        return rangeringer
+
+    def _gemte_rangeringer(self, chauffoerer):
+        """Bygger rangeringerne fra de gemte placeringer i driver_kpis.
+        Returnerer None hvis chaufførerne ikke er hele den rangerede flåde (fx en gruppe)."""
+        try:
+            gemte = hent_placeringer(self.db_path, self.min_km)
+        except Exception as e:
+            logging.error(f"Kunne ikke hente gemte placeringer: {str(e)}")
+            return None
+        if not gemte or {raekke['Chauffør'] for raekke in gemte} != set(chauffoerer):
+            return None
+        
+        placeringer = {
+            raekke['Chauffør']: {noegletal: raekke['placeringer'][noegletal] for noegletal in SAMLET_RANGERING_NOEGLETAL}
+            for raekke in gemte
+        }
+        samlet_ranking = [
+            (raekke['Chauffør'], raekke['samlet_score'], raekke['noegletal']['Vægtkorrigeret Forbrug'])
+            for raekke in gemte
+        ]
+        
+        kategorier = {}
+        for noegletal, (_, hoejere_er_bedre, _, _, maal) in PERFORMANCE_NOEGLETAL.items():
+            kategori = []
+            for raekke in sorted(gemte, key=lambda r: r['placeringer'][noegletal]):
+                score = raekke['noegletal'][noegletal]
+                maal_opfyldt = maal is not None and (
+                    (hoejere_er_bedre and score >= maal) or (not hoejere_er_bedre and score <= maal)
+                )
+                kategori.append((raekke['Chauffør'], score, maal_opfyldt))
+            kategorier[noegletal] = kategori
+        
+        logging.info(f"Rangeringer hentet fra driver_kpis for {len(placeringer)} chauffører")
+        return {
+            'placeringer': placeringer,
+            'samlet': samlet_ranking,
+            'kategorier': kategorier
+        }
+
+    def opret_samlet_rangering(self, kvalificerede_chauffoerer):
+        """Opretter en samlet rangering baseret på de fire hovedparametre"""
+        self.tilfoej_sektion_overskrift("Samlet Performance Rangering")
+        
+        hent_skabelon().indsaet_blok(self.doc, 'samlet_intro', self._byg_samlet_intro)
+        
+        # Hent rangeringer (beregnes én gang pr. database)
+        rangeringer = self.hent_rangeringer(kvalificerede_chauffoerer)
+        placeringer = rangeringer['placeringer']
+        samlet_ranking = rangeringer['samlet']
+        
         # Opret tabel for samlet rangering
         tabel = self.doc.add_table(rows=1, cols=7)
         tabel.style = 'Table Grid'
@@ -203,7 +376,7 @@ class WordReportGenerator:
         # Formater header
         header_celler = tabel.rows[0].cells
         for cell in header_celler:
-            cell._tc.get_or_add_tcPr().append(parse_xml(r'<w:shd {} w:fill="E0E0E0"/>'.format(nsdecls('w'))))
+            hent_skabelon().tilfoej_skygge(cell)
         
         headers = ['Placering', 'Chauffør', 'Samlet Score', 'Tomgang', 'Fartpilot', 'Motorbremse', 'Påløbsdrift']
         for i, header in enumerate(headers):
@@ -231,32 +404,23 @@ class WordReportGenerator:
         self.doc.add_page_break()
 
     def opret_forside(self, group_name=None):
-        """Opretter rapportens forside med titel og dato"""
+        """Opretter rapportens forside med titel og dato i et nyt dokument"""
         db_navn = os.path.basename(self.db_path)
         dele = db_navn.replace('.db', '').split('_')
         maaned = dele[2].capitalize()
         aar = dele[3]
         
-        titel = self.doc.add_paragraph()
         if group_name:
-            titel_tekst = titel.add_run(f'Fiskelogistik\nChaufførrapport\n{group_name}')
+            titel = f'Fiskelogistik\nChaufførrapport\n{group_name}'
         else:
-            titel_tekst = titel.add_run('Fiskelogistik\nChaufførrapport')
-        titel_tekst.font.size = Pt(36)
-        titel_tekst.font.bold = True
-        titel_tekst.font.color.rgb = RGBColor(30, 144, 255)
-        titel.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        
-        periode = self.doc.add_paragraph()
-        periode_tekst = periode.add_run(f'{maaned} {aar}')
-        periode_tekst.font.size = Pt(24)
-        periode.alignment = WD_ALIGN_PARAGRAPH.CENTER
+            titel = 'Fiskelogistik\nChaufførrapport'
         
-        genereret_dato = self.doc.add_paragraph()
-        genereret_tekst = genereret_dato.add_run(f'Genereret: {datetime.now().strftime("%d-%m-%Y %H:%M")}')
-        genereret_dato.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        
-        self.doc.add_page_break()
+        # Ny rapport kopieres fra det forbyggede skelet med styles og forside
+        self.doc = hent_skabelon().ny_rapport(
+            titel,
+            f'{maaned} {aar}',
+            f'Genereret: {datetime.now().strftime("%d-%m-%Y %H:%M")}'
+        )
 
     def tilfoej_sektion_overskrift(self, tekst):
         """Tilføjer en formateret sektionsoverskrift"""
@@ -282,18 +446,20 @@ class WordReportGenerator:
         
         # Formater headers med grå baggrund
         for cell in header_celler:
-            cell._tc.get_or_add_tcPr().append(parse_xml(r'<w:shd {} w:fill="E0E0E0"/>'.format(nsdecls('w'))))
+            hent_skabelon().tilfoej_skygge(cell)
         
         # Tilføj data
         for kolonne in kolonner:
             række_celler = tabel.add_row().cells
             række_celler[0].text = kolonne
             værdi = data.get(kolonne, 'N/A')
+            if er_varighed(kolonne):
+                værdi = sekunder_til_tid(værdi)
             række_celler[1].text = str(værdi)
         
         self.doc.add_paragraph()
 
-    def opret_noegletal_tabel(self, data, include_explanations=True):
+    def opret_noegletal_tabel(self, data, include_explanations=True, noegletal=None):
         """Opretter en tabel med nøgletal og deres forklaringer"""
         self.tilfoej_sektion_overskrift("Nøgletal")
         
@@ -343,7 +509,8 @@ class WordReportGenerator:
             }
         }
         
-        noegletal = self.beregn_noegletal(data)
+        if noegletal is None:
+            noegletal = self.beregn_noegletal(data)
         if not noegletal:
             return
         
@@ -380,7 +547,7 @@ class WordReportGenerator:
         
         # Formater headers med grå baggrund
         for cell in header_celler:
-            cell._tc.get_or_add_tcPr().append(parse_xml(r'<w:shd {} w:fill="E0E0E0"/>'.format(nsdecls('w'))))
+            hent_skabelon().tilfoej_skygge(cell)
         
         # Tilføj nøgletal til tabellen med ny rækkefølge
         for noegletal_navn, config in noegletal_config.items():
@@ -429,29 +596,29 @@ class WordReportGenerator:
         
         # Kun tilføj forklaringer hvis det er specificeret
         if include_explanations:
-            forklaring = self.doc.add_paragraph()
-            forklaring_tekst = forklaring.add_run(
-                "Nøgletallene giver et overblik over de vigtigste præstationsindikatorer:\n\n"
-            )
-            forklaring_tekst.font.size = Pt(12)
-            forklaring_tekst.font.bold = True
-            
-            detaljer = forklaring.add_run(
-                "• Påløbsdrift: Kørsels distance uden at bruge bremser eller speeder. Dette er når køretøjet ruller frit, hvilket sparer brændstof. En højere procent er bedre, da det viser effektiv udnyttelse af køretøjets momentum. Mål: Over 7%. God påløbsdrift opnås ved at rulle og begrænse pedalbrug.\n\n"
-                "• Fartpilot Anvendelse: Hvor meget fartpiloten bruges ved hastigheder over 50 km/t. En højere procent er bedre, da det giver mere jævn og økonomisk kørsel. Mål: Over 66,5%.\n\n"
-                "• Brug af Motorbremse: Forholdet mellem brug af motorbremse og pedalbremse i forhold til total kørselsafstand. En højere procent er bedre, da det reducerer slid på bremserne og kan genindvinde energi. Mål: Under 5%.\n\n"
-                "• Diesel Effektivitet: Antal kilometer kørt per liter diesel. En højere værdi er bedre, da det betyder lavere brændstofforbrug. Dette påvirkes direkte af kørestil, brug af fartpilot og påløbsdrift.\n\n"
-                "• Vægtkorrigeret Forbrug: Brændstofforbrug justeret efter køretøjets vægt. Giver mulighed for fair sammenligning mellem forskellige læs og kørselstyper.\n\n"
-                "• Overspeed: Hvor meget der køres over hastighedsgrænsen på 85 km/t. En lavere procent er bedre af hensyn til sikkerhed og brændstofforbrug.\n"
-            )
-            detaljer.font.size = Pt(11)
-            detaljer.font.italic = True
+            hent_skabelon().indsaet_blok(self.doc, 'noegletal_forklaring', self._byg_noegletal_forklaring)
 
-    def opret_performance_rangering(self, kvalificerede_chauffoerer):
-        """Opretter performancerangering for hver nøgletalskategori"""
-        self.tilfoej_sektion_overskrift("Performance Rangering")
-        
-        intro_tekst = self.doc.add_paragraph()
+    @staticmethod
+    def _byg_samlet_intro(doc):
+        """Statisk introduktion til den samlede rangering"""
+        intro_tekst = doc.add_paragraph()
+        intro_run = intro_tekst.add_run(
+            "Den samlede rangering kombinerer præstationen på fire nøgleområder med følgende virksomhedsmål:\n\n"
+            "1. Tomgang: Mål på max 5% - Minimering af unødvendig tomgangskørsel\n"
+            "2. Fartpilot: Mål på minimum 66,5% - Optimal brug af fartpilot ved højere hastigheder\n"
+            "3. Motorbremse: Mål på minimum 56% - Effektiv brug af motorbremsning\n"
+            "4. Påløbsdrift: Mål på minimum 7% - Udnyttelse af køretøjets momentum\n\n"
+            "Hver chauffør får points baseret på deres placering i hver kategori. "
+            "Lavere samlet score er bedre, da det betyder bedre placeringer på tværs af kategorierne. "
+            "De tre bedste chauffører er markeret med grøn for at fremhæve særligt god præstation.\n"
+            "Målene er sat af virksomheden og bruges som reference for optimal kørsel.\n"
+        )
+        intro_run.font.size = Pt(11)
+
+    @staticmethod
+    def _byg_performance_intro(doc):
+        """Statisk introduktion til performance rangeringen"""
+        intro_tekst = doc.add_paragraph()
         intro_run = intro_tekst.add_run(
             "Nedenstående tabeller viser rangeringen af chauffører baseret på forskellige "
             "performancemålinger. Rangeringen tager højde for om højere eller lavere værdier "
@@ -459,34 +626,38 @@ class WordReportGenerator:
         )
         intro_run.font.size = Pt(12)
 
-        # Hent data for alle kvalificerede chauffører
-        chauffoer_data = {}
-        noegletal_data = {}
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    @staticmethod
+    def _byg_noegletal_forklaring(doc):
+        """Statiske forklaringer under nøgletalstabellen"""
+        forklaring = doc.add_paragraph()
+        forklaring_tekst = forklaring.add_run(
+            "Nøgletallene giver et overblik over de vigtigste præstationsindikatorer:\n\n"
+        )
+        forklaring_tekst.font.size = Pt(12)
+        forklaring_tekst.font.bold = True
+
+        detaljer = forklaring.add_run(
+            "• Påløbsdrift: Kørsels distance uden at bruge bremser eller speeder. Dette er når køretøjet ruller frit, hvilket sparer brændstof. En højere procent er bedre, da det viser effektiv udnyttelse af køretøjets momentum. Mål: Over 7%. God påløbsdrift opnås ved at rulle og begrænse pedalbrug.\n\n"
+            "• Fartpilot Anvendelse: Hvor meget fartpiloten bruges ved hastigheder over 50 km/t. En højere procent er bedre, da det giver mere jævn og økonomisk kørsel. Mål: Over 66,5%.\n\n"
+            "• Brug af Motorbremse: Forholdet mellem brug af motorbremse og pedalbremse i forhold til total kørselsafstand. En højere procent er bedre, da det reducerer slid på bremserne og kan genindvinde energi. Mål: Under 5%.\n\n"
+            "• Diesel Effektivitet: Antal kilometer kørt per liter diesel. En højere værdi er bedre, da det betyder lavere brændstofforbrug. Dette påvirkes direkte af kørestil, brug af fartpilot og påløbsdrift.\n\n"
+            "• Vægtkorrigeret Forbrug: Brændstofforbrug justeret efter køretøjets vægt. Giver mulighed for fair sammenligning mellem forskellige læs og kørselstyper.\n\n"
+            "• Overspeed: Hvor meget der køres over hastighedsgrænsen på 85 km/t. En lavere procent er bedre af hensyn til sikkerhed og brændstofforbrug.\n"
+        )
+        detaljer.font.size = Pt(11)
+        detaljer.font.italic = True
+
+    def opret_performance_rangering(self, kvalificerede_chauffoerer):
+        """Opretter performancerangering for hver nøgletalskategori"""
+        self.tilfoej_sektion_overskrift("Performance Rangering")
         
-        for chauffoer, _ in kvalificerede_chauffoerer:
-            cursor.execute('SELECT * FROM chauffør_data_data WHERE Chauffør = ?', (chauffoer,))
-            data = dict(zip([col[0] for col in cursor.description], cursor.fetchone()))
-            chauffoer_data[chauffoer] = data
-            noegletal_data[chauffoer] = self.beregn_noegletal(data)
-        
-        conn.close()
-        
-        # Definer nøgletal og deres optimeringsmål
-        noegletal_optimering = {
-            'Tomgangsprocent': ('Tomgang', False, '%', 'Lavere er bedre - Mål: Under 5% - Indikerer effektiv udnyttelse af køretøjet', 5),
-            'Fartpilot Andel': ('Fartpilot Anvendelse', True, '%', 'Højere er bedre - Mål: Over 66,5% - Bidrager til jævn og økonomisk kørsel', 66.5),
-            'Motorbremse Andel': ('Brug af Motorbremse', True, '%', 'Højere er bedre - Mål: Over 56% - Sparer på bremserne og reducerer brændstofforbrug', 56),
-            'Påløbsdrift Andel': ('Påløbsdrift', True, '%', 'Højere er bedre - Mål: Over 7% - Indikerer effektiv udnyttelse af motorbremsning', 7),
-            'Diesel Effektivitet': ('Brændstofeffektivitet', True, 'km/l', 'Højere er bedre - Indikerer effektivt brændstofforbrug', None),
-            'Vægtkorrigeret Forbrug': ('Vægtkorrigeret Forbrug', False, 'l/100km/t', 'Lavere er bedre - Indikerer effektivt forbrug i forhold til vægt', None),
-            'Overspeed Andel': ('Overspeed', False, '%', 'Lavere er bedre - Indikerer overholdelse af hastighedsgrænser', None)
-        }
+        hent_skabelon().indsaet_blok(self.doc, 'performance_intro', self._byg_performance_intro)
+
+        # Hent rangeringer (beregnes én gang pr. database)
+        rangeringer = self.hent_rangeringer(kvalificerede_chauffoerer)
         
         # Opret en tabel for hvert nøgletal på en ny side
-        for noegletal, (titel, hoejere_er_bedre, enhed, beskrivelse, maal) in noegletal_optimering.items():
+        for noegletal, (titel, hoejere_er_bedre, enhed, beskrivelse, maal) in PERFORMANCE_NOEGLETAL.items():
             # Tilføj titel og beskrivelse
             self.doc.add_paragraph().add_run(f"\n{titel}").bold = True
             beskrivelse_para = self.doc.add_paragraph()
@@ -494,13 +665,6 @@ class WordReportGenerator:
             beskrivelse_run.font.size = Pt(11)
             beskrivelse_run.font.italic = True
             
-            # Sorter chauffører efter nøgletal
-            sorterede_chauffoerer = sorted(
-                noegletal_data.items(),
-                key=lambda x: x[1].get(noegletal, 0),
-                reverse=hoejere_er_bedre
-            )
-            
             # Opret tabel
             tabel = self.doc.add_table(rows=1, cols=3)
             tabel.style = 'Table Grid'
@@ -508,89 +672,52 @@ class WordReportGenerator:
             # Formater header
             header_celler = tabel.rows[0].cells
             for cell in header_celler:
-                cell._tc.get_or_add_tcPr().append(parse_xml(r'<w:shd {} w:fill="E0E0E0"/>'.format(nsdecls('w'))))
+                hent_skabelon().tilfoej_skygge(cell)
             
             header_celler[0].text = 'Placering'
             header_celler[1].text = 'Chauffør'
             header_celler[2].text = f'Score ({enhed})'
             
             # Tilføj data med farvemarkering
-            for index, (chauffoer, data) in enumerate(sorterede_chauffoerer, 1):
+            for index, (chauffoer, score, maal_opfyldt) in enumerate(rangeringer['kategorier'][noegletal], 1):
                 row_cells = tabel.add_row().cells
                 row_cells[0].text = str(index)
                 row_cells[1].text = chauffoer
                 
-                score = data.get(noegletal, 0)
                 score_tekst = f"{score:.1f}{enhed}"
                 
                 score_para = row_cells[2].paragraphs[0]
                 score_run = score_para.add_run(score_tekst)
                 
                 # Marker med grøn hvis målet er opfyldt
-                if maal is not None:
-                    if (hoejere_er_bedre and score >= maal) or (not hoejere_er_bedre and score <= maal):
-                        score_run.font.color.rgb = RGBColor(0, 128, 0)  # Grøn for opfyldt mål
+                if maal_opfyldt:
+                    score_run.font.color.rgb = RGBColor(0, 128, 0)  # Grøn for opfyldt mål
             
             self.doc.add_paragraph()
             self.doc.add_page_break()  # Tilføj sideskift efter hver rangeringstabel
 
     def find_tidligere_database_og_data(self, aktuel_maaned, aktuel_aar, chauffoer, max_maaneder_tilbage=12):
-        """Finder den seneste tidligere database hvor chaufføren findes"""
+        """Finder den seneste tidligere måned hvor chaufføren findes via et opslag i flådens tidligere rækker"""
         try:
-            # Dansk til nummer konvertering for måneder
-            maaneder = {
-                'januar': 1, 'februar': 2, 'marts': 3, 'april': 4, 
-                'maj': 5, 'juni': 6, 'juli': 7, 'august': 8, 
-                'september': 9, 'oktober': 10, 'november': 11, 'december': 12
-            }
-            
-            # Nummer til dansk konvertering
-            maaneder_reverse = {v: k for k, v in maaneder.items()}
-            
-            # Konverter aktuel måned til nummer
-            aktuel_maaned_num = maaneder[aktuel_maaned.lower()]
-            aktuel_dato = datetime(int(aktuel_aar), aktuel_maaned_num, 1)
-            
-            # Gennemgå de sidste 12 måneder
-            for i in range(1, max_maaneder_tilbage + 1):
-                tidligere_dato = aktuel_dato - relativedelta(months=i)
-                tidligere_maaned = maaneder_reverse[tidligere_dato.month]
-                tidligere_aar = str(tidligere_dato.year)
-                
-                # Tjek alle potentielle database navne
-                database_navne = [
-                    f"chauffør_data_{tidligere_maaned}_{tidligere_aar}.db",
-                    f"chaufførdata_{tidligere_maaned}_{tidligere_aar}.db",
-                    f"chauffør_{tidligere_maaned}_{tidligere_aar}.db"
-                ]
-                
-                for db_navn in database_navne:
-                    db_sti = os.path.join('databases', db_navn)
-                    if os.path.exists(db_sti):
-                        try:
-                            conn = sqlite3.connect(db_sti)
-                            cursor = conn.cursor()
-                            
-                            # Prøv forskellige tabelnavne
-                            tabel_navne = ['chauffør_data_data', 'chaufførdata', 'chauffør_data']
-                            
-                            for tabel in tabel_navne:
-                                try:
-                                    cursor.execute(f'SELECT * FROM {tabel} WHERE Chauffør = ?', (chauffoer,))
-                                    tidligere_data = cursor.fetchone()
-                                    if tidligere_data:
-                                        tidligere_data_dict = dict(zip([col[0] for col in cursor.description], tidligere_data))
-                                        conn.close()
-                                        return db_sti, tidligere_data_dict, tidligere_maaned.capitalize(), tidligere_aar
-                                except sqlite3.OperationalError:
-                                    continue
-                                    
-                            conn.close()
-                        except Exception as e:
-                            print(f"Fejl ved læsning af database {db_navn}: {str(e)}")
-                            continue
-                            
-            return None, None, None, None
+            # Konverter aktuel måned til periode (aar * 100 + maaned)
+            aktuel_periode = int(aktuel_aar) * 100 + MAANEDER[aktuel_maaned.lower()]
+            
+            # Hele flådens tidligere rækker hentes med én forespørgsel pr. rapport
+            noegle = (aktuel_periode, max_maaneder_tilbage)
+            if noegle not in self.tidligere_raekker:
+                self.tidligere_raekker[noegle] = hent_varehus().hent_tidligere_raekker(
+                    aktuel_periode, max_maaneder_tilbage
+                )
+            
+            tidligere = self.tidligere_raekker[noegle].get(chauffoer)
+            if not tidligere:
+                return None, None, None, None
+            tidligere_data, tidligere_periode = tidligere
+            
+            tidligere_maaned = MAANEDER_REVERSE[tidligere_periode % 100]
+            tidligere_aar = str(tidligere_periode // 100)
+            db_sti = os.path.join('databases', f"chauffør_data_{tidligere_maaned}_{tidligere_aar}.db")
+            return db_sti, tidligere_data, tidligere_maaned.capitalize(), tidligere_aar
             
         except Exception as e:
             print(f"Fejl ved søgning efter tidligere database: {str(e)}")
@@ -599,21 +726,13 @@ class WordReportGenerator:
     def generer_rapport(self):
         """Hovedfunktion til generering af rapporten"""
         try:
-            # Opret forbindelse til databasen
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            # Indlæs kvalificerede chauffører og nøgletal én gang for hele rapporten
+            snapshot = self.hent_rapport_snapshot(genindlaes=True)
             
             # Opret forside
             self.opret_forside()
             
-            # Find kvalificerede chauffører
-            cursor.execute(f'''
-                SELECT DISTINCT Chauffør, "Kørestrækning [km]"
-                FROM chauffør_data_data 
-                WHERE "Kørestrækning [km]" >= ?
-            ''', (self.min_km,))
-            
-            kvalificerede_chauffoerer = cursor.fetchall()
+            kvalificerede_chauffoerer = snapshot['kvalificerede']
             
             # Tilføj samlet rangering efter forsiden
             self.opret_samlet_rangering(kvalificerede_chauffoerer)
@@ -623,13 +742,8 @@ class WordReportGenerator:
             
             # Tilføj data for hver chauffør
             for chauffoer, distance in kvalificerede_chauffoerer:
-                # Hent chaufførens data
-                cursor.execute('''
-                    SELECT * FROM chauffør_data_data 
-                    WHERE Chauffør = ?
-                ''', (chauffoer,))
-                
-                chauffoer_data = dict(zip([col[0] for col in cursor.description], cursor.fetchone()))
+                # Hent chaufførens data fra snapshottet
+                chauffoer_data = snapshot['data'][chauffoer]
                 
                 # Tilføj chaufførnavn som overskrift
                 chauffoer_overskrift = self.doc.add_heading(chauffoer, level=1)
@@ -641,14 +755,11 @@ class WordReportGenerator:
                 self.opret_data_tabel(chauffoer_data, self.tomgangsdata_kolonner, "Tomgangsdata")
                 
                 # Tilføj nøgletal
-                self.opret_noegletal_tabel(chauffoer_data)
+                self.opret_noegletal_tabel(chauffoer_data, noegletal=snapshot['noegletal'][chauffoer])
                 
                 # Tilføj sideskift mellem chauffører
                 self.doc.add_page_break()
             
-            # Luk databaseforbindelsen
-            conn.close()
-            
             # Generer filnavn og gem
             db_navn = os.path.basename(self.db_path)
             dele = db_navn.replace('.db', '').split('_')
@@ -706,16 +817,9 @@ class WordReportGenerator:
             
             # Log hver handling i processen
             logging.info("Henter kvalificerede chauffører fra databasen")
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute(f'''
-                SELECT DISTINCT Chauffør 
-                FROM chauffør_data_data 
-                WHERE "Kørestrækning [km]" >= ?
-            ''', (self.min_km,))
+            snapshot = self.hent_rapport_snapshot(genindlaes=True)
             
-            qualified_drivers = [row[0] for row in cursor.fetchall()]
+            qualified_drivers = list(snapshot['data'].keys())
             logging.info(f"Fandt {len(qualified_drivers)} kvalificerede chauffører")
             
             # Find kvalificerede gruppe medlemmer
@@ -725,9 +829,6 @@ class WordReportGenerator:
             if not valid_members:
                 raise Exception("Ingen kvalificerede chauffører i gruppen for denne periode")
             
-            # Opret rapport med kun gruppe medlemmer
-            self.doc = Document()
-            
             # Opret forside med gruppe information
             self.opret_forside(group_name=group_name)
             
@@ -743,13 +844,7 @@ class WordReportGenerator:
             
             # Tilføj individuelle chauffør sider
             for chauffoer in valid_members:
-                cursor.execute('''
-                    SELECT * FROM chauffør_data_data 
-                    WHERE Chauffør = ?
-                ''', (chauffoer,))
-                
-                chauffoer_data = dict(zip([col[0] for col in cursor.description], 
-                                        cursor.fetchone()))
+                chauffoer_data = snapshot['data'][chauffoer]
                 
                 # Tilføj chaufførnavn som overskrift
                 chauffoer_overskrift = self.doc.add_heading(chauffoer, level=1)
@@ -764,13 +859,11 @@ class WordReportGenerator:
                                     "Tomgangsdata")
                 
                 # Tilføj nøgletal
-                self.opret_noegletal_tabel(chauffoer_data)
+                self.opret_noegletal_tabel(chauffoer_data, noegletal=snapshot['noegletal'][chauffoer])
                 
                 # Tilføj sideskift mellem chauffører
                 self.doc.add_page_break()
             
-            conn.close()
-            
             # Generer filnavn med gruppe navn
             db_navn = os.path.basename(self.db_path)
             dele = db_navn.replace('.db', '').split('_')
@@ -793,169 +886,207 @@ class WordReportGenerator:
             logging.error(f"Fejl ved generering af gruppe rapport: {str(e)}")
             raise
 
+    def _byg_individuelt_dokument(self, chauffoer_navn):
+        """Bygger rapporten for én chauffør i self.doc ud fra det indlæste rapport-snapshot"""
+        snapshot = self.hent_rapport_snapshot()
+        kvalificerede_chauffoerer = snapshot['kvalificerede']
+        
+        # Tjek om den valgte chauffør er kvalificeret
+        if chauffoer_navn not in snapshot['data']:
+            raise Exception(f"Ingen kvalificeret data fundet for {chauffoer_navn} i denne periode")
+        
+        # Hent chaufførens data
+        chauffoer_data = snapshot['data'][chauffoer_navn]
+        
+        # Opret forside med chauffør navn
+        self.opret_forside(chauffoer_navn)
+        
+        # Tilføj samlet rangering med alle kvalificerede chauffører
+        self.opret_samlet_rangering(kvalificerede_chauffoerer)
+        
+        # Tilføj performance rangering med alle kvalificerede chauffører
+        self.opret_performance_rangering(kvalificerede_chauffoerer)
+        
+        # Tilføj den individuelle chaufførs data
+        chauffoer_overskrift = self.doc.add_heading(chauffoer_navn, level=1)
+        chauffoer_overskrift.runs[0].font.color.rgb = RGBColor(30, 144, 255)
+        
+        # Opret tabeller for hver datasektion
+        self.opret_data_tabel(chauffoer_data, self.driftsdata_kolonner, "Driftsdata")
+        self.opret_data_tabel(chauffoer_data, self.korselsdata_kolonner, "Kørselsdata")
+        self.opret_data_tabel(chauffoer_data, self.tomgangsdata_kolonner, "Tomgangsdata")
+        
+        # Tilføj nøgletal
+        self.opret_noegletal_tabel(chauffoer_data, noegletal=snapshot['noegletal'][chauffoer_navn])
+        
+        # Tilføj sideskift mellem chauffører
+        self.doc.add_page_break()
+
+    def _individuelt_filnavn(self, chauffoer_navn):
+        """Genererer filnavnet for en individuel rapport ud fra database og tidspunkt"""
+        db_navn = os.path.basename(self.db_path)
+        dele = db_navn.replace('.db', '').split('_')
+        maaned = dele[2].capitalize()
+        aar = dele[3]
+        tidsstempel = datetime.now().strftime("%Y%m%d_%H%M%S")
+        
+        # Fjern ugyldige filnavn karakterer fra chaufførnavn
+        sikkert_navn = "".join(c for c in chauffoer_navn if c.isalnum() or c in (' ', '-', '_'))
+        
+        return f"Fiskelogistik_Chauffør_{sikkert_navn}_{maaned}_{aar}_{tidsstempel}.docx"
+
+    def byg_individuel_rapport(self, chauffoer_navn):
+        """Bygger og gemmer rapporten for én chauffør ud fra det indlæste rapport-snapshot"""
+        self._byg_individuelt_dokument(chauffoer_navn)
+        filnavn = self._individuelt_filnavn(chauffoer_navn)
+        
+        # Gem dokumentet
+        if not os.path.exists('rapporter'):
+            os.makedirs('rapporter')
+        
+        fuld_sti = os.path.join('rapporter', filnavn)
+        self.doc.save(fuld_sti)
+        
+        return filnavn
+
+    def render_individuel_rapport(self, chauffoer_navn):
+        """Bygger rapporten for én chauffør og returnerer dokumentet som bytes uden at skrive til disk"""
+        self._byg_individuelt_dokument(chauffoer_navn)
+        buffer = io.BytesIO()
+        self.doc.save(buffer)
+        return buffer.getvalue()
+
     def generer_individuel_rapport(self, chauffoer_navn):
         """Genererer rapport for en specifik chauffør"""
         try:
             # Hent alle kvalificerede chauffører
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT DISTINCT Chauffør, "Kørestrækning [km]"
-                FROM chauffør_data_data 
-                WHERE "Kørestrækning [km]" >= ?
-            ''', (self.min_km,))
-            
-            kvalificerede_chauffoerer = cursor.fetchall()
-            
-            # Tjek om den valgte chauffør er kvalificeret
-            if chauffoer_navn not in [c[0] for c in kvalificerede_chauffoerer]:
-                raise Exception(f"Ingen kvalificeret data fundet for {chauffoer_navn} i denne periode")
-            
-            # Hent chaufførens data
-            cursor.execute('''
-                SELECT * FROM chauffør_data_data 
-                WHERE Chauffør = ?
-            ''', (chauffoer_navn,))
-            
-            chauffoer_data = dict(zip([col[0] for col in cursor.description], cursor.fetchone()))
-            
-            # Opret ny rapport
-            self.doc = Document()
-            
-            # Opret forside med chauffør navn
-            self.opret_forside(chauffoer_navn)
-            
-            # Tilføj samlet rangering med alle kvalificerede chauffører
-            self.opret_samlet_rangering(kvalificerede_chauffoerer)
-            
-            # Tilføj performance rangering med alle kvalificerede chauffører
-            self.opret_performance_rangering(kvalificerede_chauffoerer)
-            
-            # Tilføj den individuelle chaufførs data
-            chauffoer_overskrift = self.doc.add_heading(chauffoer_navn, level=1)
-            chauffoer_overskrift.runs[0].font.color.rgb = RGBColor(30, 144, 255)
-            
-            # Opret tabeller for hver datasektion
-            self.opret_data_tabel(chauffoer_data, self.driftsdata_kolonner, "Driftsdata")
-            self.opret_data_tabel(chauffoer_data, self.korselsdata_kolonner, "Kørselsdata")
-            self.opret_data_tabel(chauffoer_data, self.tomgangsdata_kolonner, "Tomgangsdata")
-            
-            # Tilføj nøgletal
-            self.opret_noegletal_tabel(chauffoer_data)
-            
-            # Tilføj sideskift mellem chauffører
-            self.doc.add_page_break()
-            
-            # Generer filnavn automatisk
-            db_navn = os.path.basename(self.db_path)
-            dele = db_navn.replace('.db', '').split('_')
-            maaned = dele[2].capitalize()
-            aar = dele[3]
-            tidsstempel = datetime.now().strftime("%Y%m%d_%H%M%S")
-            
-            # Fjern ugyldige filnavn karakterer fra chaufførnavn
-            sikkert_navn = "".join(c for c in chauffoer_navn if c.isalnum() or c in (' ', '-', '_'))
-            
-            filnavn = f"Fiskelogistik_Chauffør_{sikkert_navn}_{maaned}_{aar}_{tidsstempel}.docx"
-            
-            # Gem dokumentet
-            if not os.path.exists('rapporter'):
-                os.makedirs('rapporter')
-            
-            fuld_sti = os.path.join('rapporter', filnavn)
-            self.doc.save(fuld_sti)
-            
-            conn.close()
-            return filnavn  # Returnerer automatisk genereret filnavn
+            self.hent_rapport_snapshot(genindlaes=True)
+            return self.byg_individuel_rapport(chauffoer_navn)  # Returnerer automatisk genereret filnavn
         except Exception as e:
             logging.error(f"Fejl ved generering af individuel rapport: {str(e)}")
             raise
 
-    def generer_individuelle_rapporter(self):
-        """Genererer individuelle rapporter for alle kvalificerede chauffører"""
+    def generer_individuelle_rapporter(self, antal_workers=None, progress_callback=None):
+        """Genererer individuelle rapporter for alle kvalificerede chauffører.
+        
+        Dokumenterne bygges parallelt i en ProcessPoolExecutor med antal_workers processer
+        (standard: antal kerner minus én). progress_callback kaldes med
+        (færdige, total, chauffør) efter hver rapport. Filnavnene returneres i samme
+        rækkefølge som de kvalificerede chauffører uanset hvornår de bliver færdige.
+        """
         try:
-            # Hent alle kvalificerede chauffører
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute(f'''
-                SELECT DISTINCT Chauffør, "Kørestrækning [km]"
-                FROM chauffør_data_data 
-                WHERE "Kørestrækning [km]" >= ?
-            ''', (self.min_km,))
-            
-            kvalificerede_chauffoerer = cursor.fetchall()
+            # Hent alle kvalificerede chauffører én gang for hele kørslen
+            snapshot = self.hent_rapport_snapshot(genindlaes=True)
+            chauffoerer = [chauffoer for chauffoer, _ in snapshot['kvalificerede']]
             
-            if not kvalificerede_chauffoerer:
+            if not chauffoerer:
                 raise Exception("Ingen kvalificerede chauffører fundet")
             
-            generated_filenames = []
+            if antal_workers is None:
+                antal_workers = max(1, (os.cpu_count() or 2) - 1)
+            antal_workers = max(1, min(antal_workers, len(chauffoerer)))
+            
+            # Byg skelettet på disk før arbejdsprocesserne starter, så de kan genbruge det
+            hent_skabelon()
+            
+            if antal_workers == 1:
+                return self._generer_rapporter_sekventielt(chauffoerer, progress_callback)
+            
+            logging.info(f"Genererer {len(chauffoerer)} individuelle rapporter med {antal_workers} processer")
+            generated_filenames = [None] * len(chauffoerer)
+            faerdige = 0
+            
+            with ProcessPoolExecutor(
+                max_workers=antal_workers,
+                initializer=_init_rapport_worker,
+                initargs=(self.db_path, self.min_km)
+            ) as executor:
+                futures = {
+                    executor.submit(_generer_rapport_i_worker, chauffoer): index
+                    for index, chauffoer in enumerate(chauffoerer)
+                }
+                for future in as_completed(futures):
+                    index = futures[future]
+                    generated_filenames[index] = future.result()
+                    faerdige += 1
+                    if progress_callback:
+                        progress_callback(faerdige, len(chauffoerer), chauffoerer[index])
             
-            # Generer rapport for hver kvalificeret chauffør
-            for chauffoer, _ in kvalificerede_chauffoerer:
-                # Hent chaufførens data
-                cursor.execute('''
-                    SELECT * FROM chauffør_data_data 
-                    WHERE Chauffør = ?
-                ''', (chauffoer,))
-                
-                chauffoer_data = dict(zip([col[0] for col in cursor.description], cursor.fetchone()))
-                
-                # Opret ny rapport
-                self.doc = Document()
-                
-                # Opret forside med chauffør navn
-                self.opret_forside(chauffoer)
-                
-                # Tilføj samlet rangering med alle kvalificerede chauffører
-                self.opret_samlet_rangering(kvalificerede_chauffoerer)
-                
-                # Tilføj performance rangering med alle kvalificerede chauffører
-                self.opret_performance_rangering(kvalificerede_chauffoerer)
-                
-                # Tilføj den individuelle chaufførs data
-                chauffoer_overskrift = self.doc.add_heading(chauffoer, level=1)
-                chauffoer_overskrift.runs[0].font.color.rgb = RGBColor(30, 144, 255)
-                
-                # Opret tabeller for hver datasektion
-                self.opret_data_tabel(chauffoer_data, self.driftsdata_kolonner, "Driftsdata")
-                self.opret_data_tabel(chauffoer_data, self.korselsdata_kolonner, "Kørselsdata")
-                self.opret_data_tabel(chauffoer_data, self.tomgangsdata_kolonner, "Tomgangsdata")
-                
-                # Tilføj nøgletal
-                self.opret_noegletal_tabel(chauffoer_data)
-                
-                # Tilføj sideskift mellem chauffører
-                self.doc.add_page_break()
-                
-                # Generer filnavn
-                db_navn = os.path.basename(self.db_path)
-                dele = db_navn.replace('.db', '').split('_')
-                maaned = dele[2].capitalize()
-                aar = dele[3]
-                tidsstempel = datetime.now().strftime("%Y%m%d_%H%M%S")
-                
-                # Fjern ugyldige filnavn karakterer fra chaufførnavn
-                sikkert_navn = "".join(c for c in chauffoer if c.isalnum() or c in (' ', '-', '_'))
-                
-                filnavn = f"Fiskelogistik_Chauffør_{sikkert_navn}_{maaned}_{aar}_{tidsstempel}.docx"
-                
-                # Gem dokumentet
-                if not os.path.exists('rapporter'):
-                    os.makedirs('rapporter')
-                
-                fuld_sti = os.path.join('rapporter', filnavn)
-                self.doc.save(fuld_sti)
-                
-                generated_filenames.append(filnavn)
-            
-            conn.close()
             return generated_filenames
             
         except Exception as e:
             raise Exception(f"Fejl ved generering af individuelle rapporter: {str(e)}")
 
+    def iter_rapport_data(self, chauffoerer, antal_workers=None, max_undervejs=None):
+        """Bygger rapport data for chaufførerne og leverer hver rapport så snart den er færdig.
+        
+        Rapporterne bygges i en ProcessPoolExecutor ligesom i generer_individuelle_rapporter,
+        men højst max_undervejs rapporter (standard: to pr. proces) er bestilt eller venter på
+        forbrugeren ad gangen, så hukommelsen er begrænset selvom afsendelsen er langsommere
+        end genereringen. Giver (chauffør, rapport_data) i færdiggørelsesrækkefølge;
+        rapport_data er None hvis rapporten ikke kunne bygges.
+        """
+        chauffoerer = list(chauffoerer)
+        if not chauffoerer:
+            return
+        
+        self.hent_rapport_snapshot(genindlaes=True)
+        
+        if antal_workers is None:
+            antal_workers = max(1, (os.cpu_count() or 2) - 1)
+        antal_workers = max(1, min(antal_workers, len(chauffoerer)))
+        
+        # Byg skelettet på disk før arbejdsprocesserne starter, så de kan genbruge det
+        hent_skabelon()
+        
+        if antal_workers == 1:
+            for chauffoer in chauffoerer:
+                try:
+                    yield chauffoer, self.byg_rapport_data(chauffoer)
+                except Exception as e:
+                    logging.error(f"Fejl ved generering af rapportdata for {chauffoer}: {str(e)}")
+                    yield chauffoer, None
+            return
+        
+        max_undervejs = max_undervejs or antal_workers * 2
+        logging.info(f"Genererer {len(chauffoerer)} rapporter med {antal_workers} processer "
+                     f"(højst {max_undervejs} undervejs)")
+        resterende = iter(chauffoerer)
+        
+        with ProcessPoolExecutor(
+            max_workers=antal_workers,
+            initializer=_init_rapport_worker,
+            initargs=(self.db_path, self.min_km)
+        ) as executor:
+            undervejs = {}
+            
+            def bestil():
+                for chauffoer in islice(resterende, max_undervejs - len(undervejs)):
+                    undervejs[executor.submit(_byg_rapport_data_i_worker, chauffoer)] = chauffoer
+            
+            bestil()
+            while undervejs:
+                faerdige, _ = wait(undervejs, return_when=FIRST_COMPLETED)
+                for future in faerdige:
+                    chauffoer = undervejs.pop(future)
+                    try:
+                        rapport_data = future.result()
+                    except Exception as e:
+                        logging.error(f"Fejl ved generering af rapportdata for {chauffoer}: {str(e)}")
+                        rapport_data = None
+                    yield chauffoer, rapport_data
+                # Nye rapporter bestilles først når forbrugeren har taget de færdige
+                bestil()
+
+    def _generer_rapporter_sekventielt(self, chauffoerer, progress_callback=None):
+        """Genererer individuelle rapporter én ad gangen i den aktuelle proces"""
+        generated_filenames = []
+        for chauffoer in chauffoerer:
+            generated_filenames.append(self.byg_individuel_rapport(chauffoer))
+            if progress_callback:
+                progress_callback(len(generated_filenames), len(chauffoerer), chauffoer)
+        return generated_filenames
+
     def tilfoej_forklaringer(self):
         """Tilføjer forklaringer til rapporten"""
         forklaring = self.doc.add_paragraph()
@@ -974,77 +1105,84 @@ class WordReportGenerator:
     def get_driver_statistics(self, chauffoer_navn):
         """Henter statistikker for en specifik chauffør"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Hent chaufførens data
-            cursor.execute('''
-                SELECT * FROM chauffør_data_data 
-                WHERE Chauffør = ?
-            ''', (chauffoer_navn,))
-            
-            row = cursor.fetchone()
-            if not row:
+            statistik = hent_driver_statistikker(self.db_path, self.min_km).get(chauffoer_navn)
+            if statistik is None:
                 raise Exception(f"Ingen data fundet for {chauffoer_navn}")
-                
-            # Konverter til dictionary
-            data = dict(zip([col[0] for col in cursor.description], row))
-            
-            # Beregn nøgletal
-            noegletal = self.beregn_noegletal(data)
-            
-            # Hent periode fra database navn
-            db_navn = os.path.basename(self.db_path)
-            dele = db_navn.replace('.db', '').split('_')
-            maaned = dele[2].capitalize()
-            aar = dele[3]
-            
-            # Opret statistik dictionary
-            statistik = {
-                'name': chauffoer_navn,
-                'date': f"{maaned} {aar}",
-                'total_trips': int(data.get('Antal ture', 0)),
-                'total_distance': float(data.get('Kørestrækning [km]', 0)),
-                'total_time': data.get('Køretid [hh:mm:ss]', '00:00:00'),
-                'avg_trip_length': float(data.get('Kørestrækning [km]', 0)) / int(data.get('Antal ture', 1)) if int(data.get('Antal ture', 0)) > 0 else 0,
-                'avg_trip_time': self.konverter_tid_til_sekunder(data.get('Køretid [hh:mm:ss]', '00:00:00')) / int(data.get('Antal ture', 1)) / 3600 if int(data.get('Antal ture', 0)) > 0 else 0,
-                'tomgangsprocent': noegletal.get('Tomgangsprocent', 0),
-                'fartpilot_andel': noegletal.get('Fartpilot Andel', 0),
-                'motorbremse_andel': noegletal.get('Motorbremse Andel', 0),
-                'paalobsdrift_andel': noegletal.get('Påløbsdrift Andel', 0)
-            }
-            
-            conn.close()
-            return statistik
+            # Kopi så kalderen ikke ændrer den delte cache
+            return dict(statistik)
             
         except Exception as e:
             logging.error(f"Fejl ved hentning af statistik for {chauffoer_navn}: {str(e)}")
             return None
 
-    def get_report_data(self, chauffoer_navn):
+    def byg_rapport_data(self, chauffoer_navn, gem_paa_disk=False):
+        """Bygger rapporten for én chauffør ud fra snapshottet og returnerer statistik og dokumentets bytes.
+        
+        Dokumentet renderes direkte i hukommelsen. Med gem_paa_disk gemmes en kopi i
+        rapporter/ i baggrunden, uden at kalderen venter på skrivningen.
+        """
+        statistik = self.get_driver_statistics(chauffoer_navn)
+        if not statistik:
+            raise Exception(f"Kunne ikke hente statistik for {chauffoer_navn}")
+        
+        data = self.render_individuel_rapport(chauffoer_navn)
+        logging.info(f"Rapport genereret for {chauffoer_navn} ({len(data)} bytes)")
+        
+        if gem_paa_disk:
+            gem_rapport_async(self._individuelt_filnavn(chauffoer_navn), data)
+        return {'statistik': statistik, 'rapport': data}  # Returnerer både statistik og binære data
+
+    def get_report_data(self, chauffoer_navn, gem_paa_disk=False):
         """Henter rapport data og statistik for en specifik chauffør"""
         try:
-            # Hent statistik først
-            statistik = self.get_driver_statistics(chauffoer_navn)
-            if not statistik:
-                raise Exception(f"Kunne ikke hente statistik for {chauffoer_navn}")
-            
-            # Generer rapporten med standard filnavn via den eksisterende metode
-            generated_filename = self.generer_individuel_rapport(chauffoer_navn)
-            fuld_sti = os.path.join('rapporter', generated_filename)
-            # Debug print for filsti
-            logging.info(f"Rapport genereret for {chauffoer_navn}: {fuld_sti}")
-            
-            if os.path.exists(fuld_sti):
-                with open(fuld_sti, 'rb') as f:
-                    data = f.read()
-                return {'statistik': statistik, 'rapport': data}  # Returnerer både statistik og binære data
-            else:
-                raise Exception(f"Kunne ikke finde rapport fil: {fuld_sti}")
+            # Genindlæs snapshottet så rapporten altid bygges på aktuelle data
+            self.hent_rapport_snapshot(genindlaes=True)
+            return self.byg_rapport_data(chauffoer_navn, gem_paa_disk)
         except Exception as e:
             logging.error(f"Fejl ved generering af rapportdata for {chauffoer_navn}: {str(e)}")
             return None
 
+# Én skrivetråd gemmer rapportkopier på disk i baggrunden (se gem_rapport_async)
+_gem_executor = None
+
+def gem_rapport_async(filnavn, data, mappe='rapporter'):
+    """Gemmer en renderet rapport i mappe i en baggrundstråd og returnerer en Future med stien"""
+    global _gem_executor
+    if _gem_executor is None:
+        _gem_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rapport_gem')
+        atexit.register(_gem_executor.shutdown)
+    return _gem_executor.submit(_gem_rapport, filnavn, data, mappe)
+
+def _gem_rapport(filnavn, data, mappe):
+    try:
+        os.makedirs(mappe, exist_ok=True)
+        fuld_sti = os.path.join(mappe, filnavn)
+        with open(fuld_sti, 'wb') as f:
+            f.write(data)
+        logging.info(f"Rapport gemt: {fuld_sti}")
+        return fuld_sti
+    except Exception as e:
+        logging.error(f"Fejl ved gemning af rapport {filnavn}: {str(e)}")
+        raise
+
+# Generator pr. arbejdsproces ved parallel generering af individuelle rapporter
+_worker_generator = None
+
+def _init_rapport_worker(db_path, min_km):
+    """Initialiserer en arbejdsproces med egen generator og indlæst snapshot"""
+    global _worker_generator
+    _worker_generator = WordReportGenerator(db_path)
+    _worker_generator.min_km = min_km
+    _worker_generator.hent_rapport_snapshot()
+
+def _generer_rapport_i_worker(chauffoer):
+    """Bygger og gemmer én individuel rapport i en arbejdsproces"""
+    return _worker_generator.byg_individuel_rapport(chauffoer)
+
+def _byg_rapport_data_i_worker(chauffoer):
+    """Bygger rapport data (statistik og dokument) for én chauffør i en arbejdsproces"""
+    return _worker_generator.byg_rapport_data(chauffoer)
+
 if __name__ == "__main__":
     # Test kode
     generator = WordReportGenerator("databases/chauffør_data_marts_2024.db")